@@ -0,0 +1,236 @@
+"""
+Results model for the dashboard: precomputed, memoized aggregates of a scan.
+
+A scan's product frame is reduced once to a cube: one row per observed
+combination of the dimensions (platform, canonical seller, availability,
+price band, currency) with listing counts and price sums / minima / maxima.
+Breakdowns, pivots and filtered totals are rolled up from the cube (far
+fewer rows than listings whenever sellers repeat) instead of re-scanning the
+listings, and each distinct (breakdown, filters) result is memoized. Dimension values
+are categorical codes, so filters are integer lookups.
+
+    model = ResultsModel(df)   # df from app.results_frame
+    model.aggregate(["Platform"], {"Availability": ["In Stock"]})
+    model.pivot("Canonical Seller", "Platform")
+
+platform_overview() turns the per-domain scan summaries into one table with
+the domains grouped by status, for the dashboard's paginated overview.
+"""
+import functools
+
+import numpy as np
+import pandas as pd
+
+from outliers import PRICE_OUTLIER
+from prices import PRICE_MIN
+from sellers import CANONICAL_SELLER
+
+PRICE_BAND = "Price Band"
+# Same edges for every currency: bands are only compared within one currency
+PRICE_BAND_EDGES = (0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000)
+NO_VALUE = "(none)"
+NO_PRICE = "(no price)"
+
+# Breakdown dimensions, in display order; "Seller" stands in when sellers are not canonicalized
+DIMENSIONS = ("Platform", CANONICAL_SELLER, "Availability", PRICE_BAND, "Currency")
+MEASURES = ("Listings", "Sellers", "Avg Price", "Min Price", "Max Price", "Outliers")
+MEMO_SIZE = 256
+
+STATUS_GROUP = "Status Group"
+STATUS_GROUPS = ("Found", "Blocked", "Not Found")
+# Engine statuses (detect_brand_products) per overview group; anything else is "Not Found"
+_STATUS_GROUP_OF = {
+    "Found": "Found", "Found (AI)": "Found", "Text Match": "Found",
+    "Blocked": "Blocked", "Blocked/Error": "Blocked", "Error": "Blocked"
+}
+
+
+def _short_number(value):
+    return f"{value / 1000:g}k" if value >= 1000 else f"{value:g}"
+
+
+def price_band_labels(edges=PRICE_BAND_EDGES):
+    labels = [f"{_short_number(a)}–{_short_number(b)}" for a, b in zip(edges, edges[1:])]
+    return labels + [f"{_short_number(edges[-1])}+", NO_PRICE]
+
+
+def price_bands(prices, edges=PRICE_BAND_EDGES):
+    """ Categorical price band of each price (NaN -> NO_PRICE), ordered low to high. """
+    prices = np.asarray(prices, dtype=np.float64)
+    labels = price_band_labels(edges)
+    codes = np.searchsorted(np.asarray(edges, dtype=np.float64), prices, side="right") - 1
+    codes = np.where(np.isnan(prices) | (codes < 0), len(labels) - 1, codes)
+    return pd.Categorical.from_codes(codes, categories=labels, ordered=True)
+
+
+def _categorical(values):
+    """ Categorical with missing / empty values as NO_VALUE. """
+    values = pd.Series(values).astype(object)
+    values = values.where(values.notna() & (values.astype(str).str.strip() != ""), NO_VALUE)
+    return pd.Categorical(values.astype(str))
+
+
+def _freeze(filters):
+    # Hashable memo key: only dimensions with a selection count
+    return tuple(sorted((dim, tuple(sorted(map(str, values)))) for dim, values in (filters or {}).items() if values))
+
+
+class ResultsModel:
+    """
+    Cube of a product frame (see results_frame) plus memoized roll-ups.
+    Read-only once built, so one model can be shared by every session.
+    """
+
+    def __init__(self, df):
+        if "Detection Method" in df.columns:
+            df = df[df["Detection Method"] != "Summary Only"]
+        self.frame = df.reset_index(drop=True)
+        self.total = len(self.frame)
+
+        columns = {}
+        for dim in DIMENSIONS:
+            if dim == PRICE_BAND:
+                if PRICE_MIN in self.frame.columns:
+                    columns[dim] = price_bands(self.frame[PRICE_MIN])
+            elif dim == CANONICAL_SELLER and dim not in self.frame.columns:
+                if "Seller" in self.frame.columns:
+                    columns["Seller"] = _categorical(self.frame["Seller"])
+            elif dim in self.frame.columns:
+                column = self.frame[dim]
+                ordered = isinstance(column.dtype, pd.CategoricalDtype) and column.cat.ordered
+                columns[dim] = column.array if ordered else _categorical(column)
+        self.dimensions = list(columns)
+        self.seller_dimension = CANONICAL_SELLER if CANONICAL_SELLER in columns else ("Seller" if "Seller" in columns else None)
+        self.categories = {dim: np.asarray(columns[dim].categories, dtype=object) for dim in self.dimensions}
+        self.codes = {dim: np.asarray(columns[dim].codes, dtype=np.int64) for dim in self.dimensions}
+
+        price = self.frame[PRICE_MIN].to_numpy(dtype=np.float64) if PRICE_MIN in self.frame.columns else np.full(self.total, np.nan)
+        outlier = self.frame[PRICE_OUTLIER].to_numpy(dtype=bool) if PRICE_OUTLIER in self.frame.columns else np.zeros(self.total, dtype=bool)
+        self.cube = self._build_cube(price, outlier)
+        self._rollup = functools.lru_cache(maxsize=MEMO_SIZE)(self._compute_rollup)
+
+    def _build_cube(self, price, outlier):
+        facts = pd.DataFrame({dim: self.codes[dim] for dim in self.dimensions})
+        priced = ~np.isnan(price)
+        facts["Listings"] = 1
+        facts["Priced"] = priced.astype(np.int64)
+        facts["Price Sum"] = np.where(priced, price, 0.0)
+        facts["Min Price"] = price
+        facts["Max Price"] = price
+        facts["Outliers"] = outlier.astype(np.int64)
+        if not self.dimensions:
+            facts["_all"] = 0
+        keys = self.dimensions or ["_all"]
+        return facts.groupby(keys, sort=False).agg({
+            "Listings": "sum", "Priced": "sum", "Price Sum": "sum",
+            "Min Price": "min", "Max Price": "max", "Outliers": "sum"
+        }).reset_index()
+
+    # --- Filters ---
+
+    def options(self, dim):
+        """ Values of a dimension, most listings first (price bands in band order). """
+        if dim not in self.dimensions:
+            return []
+        counts = np.bincount(self.codes[dim], minlength=len(self.categories[dim]))
+        present = np.flatnonzero(counts)
+        if dim != PRICE_BAND:
+            present = present[np.argsort(-counts[present], kind="stable")]
+        return self.categories[dim][present].tolist()
+
+    def _mask(self, codes, frozen):
+        mask = np.ones(len(next(iter(codes.values()))) if codes else 0, dtype=bool)
+        for dim, values in frozen:
+            if dim not in self.dimensions:
+                continue
+            wanted = np.flatnonzero(np.isin(self.categories[dim].astype(str), values))
+            mask &= np.isin(codes[dim], wanted)
+        return mask
+
+    # --- Roll-ups ---
+
+    def _compute_rollup(self, by, frozen):
+        cube = self.cube[self._mask({dim: self.cube[dim].to_numpy() for dim in self.dimensions}, frozen)] if self.dimensions else self.cube
+        by = [dim for dim in by if dim in self.dimensions]
+        seller = self.seller_dimension
+        if by:
+            grouped = cube.groupby(by, sort=True)
+            table = grouped.agg({
+                "Listings": "sum", "Priced": "sum", "Price Sum": "sum",
+                "Min Price": "min", "Max Price": "max", "Outliers": "sum"
+            })
+            # Distinct sellers are exact: the seller is one of the cube's dimensions
+            known = cube[cube[seller] != self._code(seller, NO_VALUE)] if seller else cube.iloc[:0]
+            table["Sellers"] = known.groupby(by)[seller].nunique() if seller else 0
+            table = table.reset_index()
+            for dim in by:
+                table[dim] = pd.Categorical.from_codes(
+                    table[dim].to_numpy(), categories=self.categories[dim], ordered=dim == PRICE_BAND
+                )
+        else:
+            table = pd.DataFrame([{
+                "Listings": int(cube["Listings"].sum()), "Priced": int(cube["Priced"].sum()),
+                "Price Sum": float(cube["Price Sum"].sum()), "Outliers": int(cube["Outliers"].sum()),
+                "Min Price": cube["Min Price"].min(), "Max Price": cube["Max Price"].max(),
+                "Sellers": cube.loc[cube[seller] != self._code(seller, NO_VALUE), seller].nunique() if seller else 0
+            }])
+        table["Sellers"] = table["Sellers"].fillna(0).astype(np.int64)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            table["Avg Price"] = np.round(table["Price Sum"] / table["Priced"].where(table["Priced"] > 0), 2)
+        return table[by + list(MEASURES)].sort_values("Listings", ascending=False, kind="stable").reset_index(drop=True)
+
+    def _code(self, dim, value):
+        matches = np.flatnonzero(self.categories[dim] == value)
+        return matches[0] if len(matches) else -1
+
+    def aggregate(self, by=(), filters=None):
+        """
+        One row per combination of the `by` dimensions (filtered by {dim: [values]}), with
+        MEASURES. Prices are only comparable within one currency: break down or filter by it.
+        Memoized; the returned frame is shared, don't modify it.
+        """
+        if isinstance(by, str):
+            by = [by]
+        return self._rollup(tuple(by), _freeze(filters))
+
+    def totals(self, filters=None):
+        """ {measure: value} over the filtered listings. """
+        row = self.aggregate((), filters)
+        return {m: row[m].iloc[0] for m in MEASURES} if len(row) else {m: 0 for m in MEASURES}
+
+    def pivot(self, rows, columns=None, filters=None, value="Listings"):
+        """ rows x columns table of one measure (columns=None: a single column). """
+        if not columns or columns == rows:
+            table = self.aggregate([rows], filters)
+            if rows == PRICE_BAND:
+                table = table.sort_values(rows)
+            return table.set_index(rows)[[value]]
+        # One aggregate row per (rows, columns) pair, so this is a reshape, not another aggregation
+        table = self.aggregate([rows, columns], filters).pivot(index=rows, columns=columns, values=value)
+        if value in ("Listings", "Sellers", "Outliers"):
+            table = table.fillna(0).astype(np.int64)
+        # Price bands in band order, anything else largest first
+        order = self.options(rows) if rows == PRICE_BAND else self.aggregate([rows], filters)[rows].tolist()
+        table.index = table.index.astype(object)
+        return table.loc[[r for r in order if r in table.index]]
+
+    def rows(self, filters=None, limit=None):
+        """ Listings matching the filters (first `limit` rows) and the total match count. """
+        frozen = _freeze(filters)
+        if not frozen:
+            return (self.frame if limit is None else self.frame.head(limit)), self.total
+        mask = self._mask(self.codes, frozen)
+        positions = np.flatnonzero(mask)
+        if limit is not None:
+            positions = positions[:limit]
+        return self.frame.iloc[positions], int(mask.sum())
+
+
+def platform_overview(scan_summary):
+    """ One row per scanned domain (summarize_domain_result rows) with an ordered categorical Status Group. """
+    df = pd.DataFrame(scan_summary, columns=["Domain", "Status", "ProductCount", "Details", "URL"])
+    df = df.rename(columns={"ProductCount": "Products"})
+    df["Products"] = pd.to_numeric(df["Products"], errors="coerce").fillna(0).astype(np.int64)
+    groups = df["Status"].map(_STATUS_GROUP_OF).fillna("Not Found")
+    df.insert(1, STATUS_GROUP, pd.Categorical(groups, categories=STATUS_GROUPS, ordered=True))
+    return df
@@ -1,17 +1,33 @@
 import streamlit as st
 import pandas as pd
-from curl_cffi import requests
-import extruct
-from bs4 import BeautifulSoup
 import time
 import json
-import io
-import re
-from urllib.parse import quote, urlparse
-import google.generativeai as genai
-import concurrent.futures
 import os
 
+# Scanning engine (Streamlit-independent); re-exported here for existing scripts
+from engine import (
+    ScanConfig,
+    construct_search_url,
+    normalize_product_data,
+    detect_brand_products,
+    fetch_product_details,
+    extract_from_amazon_containers,
+    summarize_domain_result,
+    scan_domains,
+    scan_brand,
+    estimate_seller_mix
+)
+from jobs import JobStore, JOB_POLL_SECONDS, SECRET_OPTIONS, ensure_workers, replay_events
+from monitor import MonitorStore, DEFAULT_INTERVAL_HOURS
+from exports import EXPORT_FORMATS, download_name, read_export
+from records import records_to_frame
+from prices import normalize_prices
+from outliers import PRICE_OUTLIER, PRICE_Z, flag_price_outliers, price_stats_table
+from dedup import CLUSTER_SIZE, dedupe_frame
+from history import ScanHistory
+from sellers import SellerRegistry
+from aggregates import MEASURES, PRICE_BAND, STATUS_GROUP, STATUS_GROUPS, ResultsModel, platform_overview
+
 # --- Configuration & Constants ---
 DEFAULT_DOMAINS = [
     "amazon.com",
@@ -38,1139 +54,22 @@ def save_domains(domains):
     except:
         pass
 
+def parse_domains(text):
+    """ Domains pasted one per line or comma-separated, in order, without duplicates. """
+    domains = [d.strip() for d in text.replace(",", "\n").splitlines()]
+    return list(dict.fromkeys(d for d in domains if d))
+
+def remove_domains(domains):
+    removed = set(domains)
+    st.session_state.domains_list = [d for d in st.session_state.domains_list if d not in removed]
+    save_domains(st.session_state.domains_list)
+
 ST_PAGE_CONFIG = {
     "page_title": "Brand Presence Monitor",
     "page_icon": "🔍",
     "layout": "wide"
 }
 
-# --- AI Extraction Logic ---
-def extract_with_gemini(text_content, domain, brand_name):
-    """
-    Uses Google Gemini 1.5 Flash to intelligently extract product data from raw text.
-    """
-    try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        prompt = f"""
-        You are a product extraction expert. Analyze the following text content from a search result page on {domain} for the brand "{brand_name}".
-        
-        Extract a list of products that match the brand "{brand_name}".
-        Ignore "Sponsored" or "Recommended" items if they are clearly for other brands.
-        
-        For each product, extract:
-        - name: The full product title.
-        - price: The price with currency symbol.
-        - seller: The name of the seller or store (e.g. "Sold by XYZ", "Visit the ABC Store"). If implied to be the brand itself, use "{brand_name}".
-        - url: The product URL (relative or absolute). If not found, use "".
-        
-        Return ONLY valid JSON in the following format:
-        [
-            {{
-                "name": "Product Name",
-                "price": "$100",
-                "seller": "Seller Name",
-                "url": "/link/to/product"
-            }}
-        ]
-        
-        If no products found, return [].
-        
-        search_result_page_content_start:
-        {text_content[:30000]} 
-        search_result_page_content_end
-        """
-        
-        response = model.generate_content(prompt)
-        text_resp = response.text.strip()
-        
-        # Clean markdown
-        if text_resp.startswith("```json"):
-            text_resp = text_resp.replace("```json", "").replace("```", "")
-            
-        data = json.loads(text_resp)
-        normalized = []
-        for item in data:
-            # Post-process URL
-            u = item.get('url', '')
-            if u and not u.startswith('http'):
-                if u.startswith('/'):
-                    u = f"https://{domain}{u}"
-                else:
-                    u = f"https://{domain}/{u}"
-            
-            normalized.append(normalize_product_data({
-                "name": item.get('name'),
-                "price": item.get('price'),
-                "seller": item.get('seller', 'N/A'),
-                "url": u or f"https://{domain}",
-                "method": "AI Vision (Text)"
-            }, domain))
-            
-        return normalized
-        
-    except Exception as e:
-        print(f"Gemini Extraction Error: {e}")
-        return []
-
-# --- Helper Functions ---
-
-def construct_search_url(domain, brand_name):
-    """
-    Dynamically generates the search URL based on the domain.
-    """
-    brand_encoded = quote(brand_name)
-    
-    # Ensure protocol
-    if not domain.startswith("http"):
-        base_url = f"https://{domain}"
-    else:
-        base_url = domain
-    
-    # Clean domain for matching
-    domain_clean = urlparse(base_url).netloc.lower()
-    
-    # Domain specific logic
-    if "amazon" in domain_clean:
-         # Force www for Amazon to reduce redirects/bot checks
-        if "www." not in base_url:
-            base_url = base_url.replace("://", "://www.")
-        return f"{base_url}/s?k={brand_encoded}"
-    elif "nykaa" in domain_clean:
-        return f"https://www.nykaa.com/search/result/?q={brand_encoded}"
-    elif "flipkart" in domain_clean:
-         return f"{base_url}/search?q={brand_encoded}"
-    elif "ebay" in domain_clean:
-        return f"https://www.ebay.com/sch/i.html?_nkw={brand_encoded}"
-    else:
-        # Default fallback
-        return f"{base_url}/search?q={brand_encoded}"
-
-def normalize_product_data(item, source_domain):
-    """ Standardize product dict from various sources """
-    return {
-        "Platform": source_domain,
-        "Product Name": item.get("name", "Unknown Product"),
-        "Price": item.get("price", "N/A"),
-        "Currency": item.get("priceCurrency", ""),
-        "Seller": item.get("seller", "N/A"), # Often hard to get on search pages
-        "Availability": item.get("availability", "Unknown"), # e.g. InStock
-        "Product URL": item.get("url", "N/A"),
-        "Detection Method": item.get("method", "Generic")
-    }
-
-def extract_from_json_ld(json_ld, domain, brand_name=None):
-    """
-    Extracts product list from Schema.org ItemList or Product definitions.
-    """
-    products = []
-    
-    def parse_single_product(node):
-        # Flatten Schema.org product object
-        name = node.get("name")
-        image = node.get("image")
-        url = node.get("url")
-
-        # Brand Filter
-        if name and brand_name:
-             if brand_name.lower() not in name.lower():
-                  brand_parts = [b for b in brand_name.lower().split() if len(b) > 2]
-                  if brand_parts and not any(part in name.lower() for part in brand_parts):
-                       return # Skip this product
-
-        # Offers (Price/Availability)
-        offers = node.get("offers", {})
-        # Offers can be a list or dict
-        if isinstance(offers, list) and offers:
-            offers = offers[0] # Take first offer
-        
-        price = offers.get("price")
-        currency = offers.get("priceCurrency")
-        availability = offers.get("availability", "").replace("http://schema.org/", "")
-        
-        seller = offers.get("seller", {}).get("name") if isinstance(offers.get("seller"), dict) else "N/A"
-        
-        # Fallback seller from brand name if explicit seller missing
-        if seller == "N/A" and brand_name and name and brand_name.lower() in name.lower():
-             seller = brand_name.title()
-        
-        if name:
-             products.append(normalize_product_data({
-                "name": name,
-                "price": price,
-                "priceCurrency": currency,
-                "availability": availability,
-                "seller": seller,
-                "url": url,
-                "method": "JSON-LD"
-             }, domain))
-
-    # Search for ItemList or Direct Products
-    # Recursive search helper could be useful but we look for specific types
-    def recursive_find_products(node):
-        if isinstance(node, dict):
-            if node.get("@type") in ["Product", "Offer"]:
-                parse_single_product(node)
-            # Handle ItemList
-            elif node.get("@type") == "ItemList" and "itemListElement" in node:
-                for item in node["itemListElement"]:
-                    recursive_find_products(item)
-                    # Sometimes item is just a wrapper like ListItem with 'item' property
-                    if isinstance(item, dict) and "item" in item:
-                         recursive_find_products(item["item"])
-            else:
-                for k, v in node.items():
-                    recursive_find_products(v)
-        elif isinstance(node, list):
-            for item in node:
-                recursive_find_products(item)
-
-    recursive_find_products(json_ld)
-    return products
-
-
-def identify_availability(card):
-    """
-    Identifies availability status from a product card or page.
-    """
-    text = card.get_text(separator=" ", strip=True).lower()
-    
-    # Positive signals
-    if re.search(r"\bin stock\b", text):
-        return "In Stock"
-    if re.search(r"\bonly \d+ left\b", text):
-        return "Low Stock"
-    if re.search(r"\bavailable\b", text):
-        return "Available"
-        
-    # Negative signals
-    if re.search(r"\bout of stock\b", text):
-        return "Out of Stock"
-    if re.search(r"\bcurrently unavailable\b", text):
-        return "Unavailable"
-    if re.search(r"\bsold out\b", text):
-        return "Sold Out"
-        
-    return "Unknown"
-
-def identify_seller_from_card(card, domain, brand_name):
-    """
-    Advanced Logic to identify the Transacting Entity (Seller).
-    Priorities:
-    1. Text nodes following 'Sold by', 'Merchant', etc.
-    2. Hyperlinks to Storefronts/Profiles.
-    3. Proximity to Price (implied by card structure).
-    """
-    seller_candidates = []
-    text_nodes = list(card.stripped_strings)
-    
-    # Regex Extraction (Priority 1 - Visual Scanning)
-    # "See through" the page text for common patterns
-    full_text = " ".join(text_nodes)
-    regex_patterns = [
-        # Priority 1: Stop before "and Fulfilled" or similar common separators
-        r"(?i)(?:sold by|seller|courtesy of|merchant|importer|marketed by)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+?)(?=\s+(?:and|is|ships|fulfilled|payment)|$)",
-        # Priority 2: Standard greedy match (fallback)
-        r"(?i)(?:sold by|seller|courtesy of|merchant|importer|marketed by)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+)",
-        r"(?i)(?:brand)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+)"
-    ]
-    
-    for pattern in regex_patterns:
-        match = re.search(pattern, full_text)
-        if match:
-            candidate = match.group(1).strip()
-            # Validation: Seller name shouldn't be too long or garbage
-            if 2 < len(candidate) < 60:
-                 # Clean up common garbage at the end of strings
-                 candidate = re.sub(r"(?i)(\d+(\.\d+)?\s?(stars?|ratings?|reviews?))", "", candidate).strip()
-                 # Clean up colors in parentheses (e.g. "(Black)", "(Grey)")
-                 candidate = re.sub(r"(?i)\s*\((black|grey|gray|white|blue|red|green|silver|gold)\)", "", candidate).strip()
-                 
-                 candidate_lower = candidate.lower()
-                 
-                 # --- FIX for "Seller Name Seller Name Sold by..." and "Name Name" ---
-                 # 1. Internal Keyword Cleanup
-                 for kw in ["sold by", "ships from", "distributed by"]:
-                      if kw in candidate_lower:
-                           idx = candidate_lower.find(kw)
-                           if idx > 2: # Ignore if it's at the very start
-                                candidate = candidate[:idx].strip()
-                                candidate_lower = candidate.lower()
-                                
-                 # 2. Deduplication check (e.g. "Cocoblu Retail Cocoblu Retail")
-                 words = candidate.split()
-                 if len(words) >= 4 and len(words) % 2 == 0:
-                      mid = len(words) // 2
-                      first_half = " ".join(words[:mid])
-                      second_half = " ".join(words[mid:])
-                      if first_half.lower() == second_half.lower():
-                           candidate = first_half
-                           candidate_lower = candidate.lower() # update
-                 
-                 # 0. WORD COUNT CHECK (Sellers are rarely > 6 words, Titles are long)
-                 if len(candidate.split()) > 6:
-                      continue
-
-                 # 1. START-OF-STRING BLOCKERS (Garbage text phrases)
-                 if candidate_lower.startswith(("who offers", "that you chose", "items that", "customers who", "ozone")):
-                      # Blocking "Ozone" starting match IF it's long (likely a title), but allow if short (official seller)
-                      if "ozone" in candidate_lower and len(candidate.split()) > 3:
-                           continue
-                      if candidate_lower.startswith(("who offers", "that you chose", "items that", "customers who")):
-                           continue
-
-                 # 2. SUBSTRING BLOCKERS (Common non-seller keywords)
-                 # Note: "plan" matching "Plantex" and "protection" matching generally. "protection plan" is safer.
-                 block_list_substrings = [
-                     "amazon", "available", "more buying", "details", 
-                     "installation", "add to cart", "warranty",
-                     "protection plan", "service", "get it", "tomorrow",
-                     "free delivery", "days", "replacement", "dispatched",
-                     "customer service", "that you chose", "often"
-                 ]
-                 
-                 if any(w in candidate_lower for w in block_list_substrings):
-                      continue
-                      
-                 # 3. EXACT WORD BLOCKERS (Strict blocking for short common words)
-                 block_list_exact = ["cart", "plan", "here", "brand", "unknown"]
-                 if candidate_lower in block_list_exact:
-                      continue
-
-                 return candidate.title()
-    
-    # Text Analysis (Priority 2)
-    seller_triggers = [
-        "sold by", "merchant", "importer", "vendor", "shop name", 
-        "fulfilled by", "distributed by", "dispatcher", "by "
-    ]
-    
-    # text_nodes already defined above
-    
-    for i, text in enumerate(text_nodes):
-        text_lower = text.lower()
-        
-        # 0. Direct Brand Match (DTC/Brand Check)
-        # If the brand name appears in a short text node (likely a label), assume Brand is Seller
-        if brand_name and len(text) < 50:
-             # Check for "By [Brand]" or just "[Brand]"
-             if text_lower == brand_name.lower() or text_lower == f"by {brand_name.lower()}":
-                 return brand_name.title()
-             # If brand name is in the text but not exact match, check if it looks like a brand label
-             if brand_name.lower() in text_lower:
-                  # Avoid catching the Title as the Seller
-                  # Heuristic: If text is short and contains brand, it might be "Visit the Chanel Store" or "Brand: Chanel" being split
-                  if "brand" in text_lower:
-                       return brand_name.title()
-
-        for trigger in seller_triggers:
-            if trigger in text_lower:
-                # Case A: "Sold by: SellerName"
-                if len(text) > len(trigger) + 2:
-                    candidate = text_lower.split(trigger)[-1].strip(": -").title()
-                # Case B: "Sold by" ...next node... "SellerName" (handled in next iteration effectively)
-                elif i + 1 < len(text_nodes):
-                    candidate = text_nodes[i+1].strip()
-                else:
-                    candidate = None
-                
-                if candidate:
-                    # Clean garbage again
-                    candidate = re.sub(r"(?i)(\d+(\.\d+)?\s?(stars?|ratings?|reviews?))", "", candidate).strip()
-                    if len(candidate) > 60: continue 
-                    # Filter out platform names UNLESS they are explicitly the seller (e.g. "Sold by Amazon")
-                    # If text says "Sold by Amazon", we KEEP it.
-                    # The previous logic excluded them. User wants "Transacting Entity".
-                    # If valid name, return it.
-                    return candidate
-
-
-    # Link Analysis (Priority 3)
-    links = card.find_all("a", href=True)
-    main_link_href = None
-    if links: main_link_href = links[0]['href']
-        
-    for link in links:
-        href = link['href']
-        text = link.get_text(strip=True)
-        if not text: continue
-        
-        if href == main_link_href: continue
-        
-        # Heuristics for seller links (Generic + Specific Platforms)
-        href_lower = href.lower()
-        
-        # eBay users/stores
-        if "ebay" in domain and ("/usr/" in href_lower or "/str/" in href_lower):
-             return text
-             
-        # Amazon stores
-        if "amazon" in domain and ("/ws/" in href_lower or "/stores/" in href_lower):
-             return text
-             
-        # Generic "Store" links
-        if "store" in text.lower() or "seller" in href_lower or "profile" in href_lower or "shop" in href_lower:
-            clean_text = text.replace("Visit the", "").replace("Store", "").strip()
-            return clean_text
-            
-    # Final Fallback: If we assume DTC (Direct to Consumer) site structure
-    # The domain itself might be the seller if no other info found
-    # But for marketplaces (Amazon/eBay), we return N/A if we can't find a 3rd party
-    # Final Fallback: If we assume DTC (Direct to Consumer) site structure
-    if brand_name and brand_name.lower() in domain:
-        return brand_name.title()
-
-    # User Request: Explicitly attribute to Brand if brand name appears in text
-    # This acts as a catch-all to prevent "N/A" when the brand is mentioned.
-    if brand_name:
-         # Check if brand name is in the full text of the card
-         full_text = " ".join(text_nodes).lower()
-         if brand_name.lower() in full_text:
-              return brand_name.title()
-
-    return "N/A"
-
-def extract_from_ebay_dom(soup, domain, brand_name):
-    products = []
-    # eBay list view or grid view
-    # Common container: ul.srp-results or ul.b-list__items_nofooter
-    items = []
-    ul = soup.select_one("ul.srp-results, ul.b-list__items_nofooter")
-    if ul:
-        items = ul.find_all("li", recursive=False)
-    
-    if not items:
-         # Fallback to search all s-item (generic)
-         items = soup.find_all(class_="s-item")
-    
-    for item in items:
-        try:
-            # Skip "Shop on eBay" pseudo items
-            classes = item.get("class", [])
-            if "s-item__pl-on-bottom" in classes: continue
-            
-            # Title
-            # Could be s-item__title, s-card__title, or just h3
-            title_tag = item.select_one(".s-item__title, .s-card__title, h3.s-item__title")
-            if not title_tag:
-                 # Try finding just text in the first link?
-                 link = item.select_one("a")
-                 if link and len(link.get_text(strip=True)) > 10:
-                      pass # Potential candidate, but let's stick to title classes first
-                 else:
-                      continue
-            else:
-                 pass
-            
-            if not title_tag: continue
-            name = title_tag.get_text(strip=True)
-            if "Shop on eBay" in name: continue
-            
-            # Price
-            price_tag = item.select_one(".s-item__price, .s-card__price")
-            price = price_tag.get_text(strip=True) if price_tag else "N/A"
-            
-            # Link
-            link_tag = item.select_one("a.s-item__link, a.s-card__link, a")
-            url = link_tag.get("href") if link_tag else ""
-            
-            # Seller
-            seller = "N/A"
-            seller_tag = item.select_one(".s-item__seller-info-text, .s-item__seller-info")
-            if seller_tag:
-                 seller = seller_tag.get_text(strip=True)
-            
-            # Robust Brand Check
-            if brand_name and brand_name.lower() not in name.lower():
-                 # Maybe allow if valid structure but missed name match?
-                 # For now, strict but allow if we found a valid price
-                 if price == "N/A": continue
-                 pass 
-            
-            products.append(normalize_product_data({
-                "name": name,
-                "price": price,
-                "seller": seller,
-                "url": url,
-                "method": "eBay DOM"
-            }, domain))
-        except: continue
-        
-    return products
-
-def extract_from_hidden_data(soup, domain, brand_name):
-    """
-    Extracts data from <script> tags:
-    1. Manual JSON-LD parsing (backup to extruct)
-    2. Redux/State variables (window.__PRELOADED_STATE__)
-    """
-    products = []
-    
-    # 1. Manual JSON-LD
-    scripts = soup.find_all('script', type='application/ld+json')
-    for script in scripts:
-        if not script.string: continue
-        try:
-            data = json.loads(script.string)
-            # JSON-LD can be a list or dict
-            if isinstance(data, list):
-                products.extend(extract_from_json_ld(data, domain, brand_name))
-            else:
-                products.extend(extract_from_json_ld([data], domain, brand_name))
-        except:
-            pass
-            
-    if products: return products
-
-    # 2. State Variables (Nykaa, Flipkart, etc.)
-    # Look for scripts containing specific keywords
-    state_scripts = soup.find_all('script')
-    for script in state_scripts:
-        if not script.string: continue
-        content = script.string
-        
-        # Nykaa / General Redux
-        if "window.__PRELOADED_STATE__" in content or "window.__INITIAL_STATE__" in content:
-            try:
-                # Extract JSON string: variable = { ... }
-                # Regex to grab the JSON object, using DOTALL for multi-line support
-                match = re.search(r"window\.__[A-Z_]+__\s*=\s*({.*});?", content, re.DOTALL)
-                if match:
-                    json_str = match.group(1)
-                    # Often ends with ; or similar, simple cleanup
-                    if json_str.endswith(";"): json_str = json_str[:-1]
-                    
-                    try:
-                        data = json.loads(json_str)
-                        print(f"DEBUG APP: Successfully loaded JSON for {domain}. Keys: {list(data.keys())[:5]}")
-                        
-                        # Direct Slot Extraction for Flipkart (bypass recursion limits)
-                        if 'pageDataV4' in data:
-                             print("DEBUG APP: Using Flipkart pageDataV4 specific extraction")
-                             pdata = data.get('pageDataV4', {}).get('page', {}).get('data', {})
-                             for slot_key, slot_val in pdata.items():
-                                  if isinstance(slot_val, list):
-                                       for widget in slot_val:
-                                            # Pattern 1: widget.widget.data.products (e.g. Recently Viewed)
-                                            ws = widget.get('widget', {}).get('data', {}).get('products', [])
-                                            
-                                            # Pattern 2: element.productInfo (Main Search Results)
-                                            # slot items might be just wrappers passed as 'widget'
-                                            if not ws and 'widget' in widget and 'data' in widget['widget']:
-                                                  # Sometimes results are in 'data' directly if it's a specific widget type?
-                                                  pass
-                                            
-                                            # Checking specific known structure from debug file:
-                                            # Slot lists contain dictionary items which have 'productInfo' inside 'element' or top level
-                                            
-                                            candidates = []
-                                            if isinstance(widget, dict):
-                                                 # Try direct productInfo
-                                                 if 'productInfo' in widget:
-                                                      candidates.append(widget)
-                                                 # Try nested in element
-                                                 elif 'element' in widget and 'productInfo' in widget['element']:
-                                                      candidates.append(widget['element'])
-                                                 
-                                            # Also check if slot_val itself is a list of product-like items?
-                                            # In debug file: "10003": [ { "productInfo": {...} }, ... ]
-                                            
-                                            for item in candidates:
-                                                p_info = item.get('productInfo', {}).get('value', {})
-                                                titles = p_info.get('titles', {})
-                                                pricing = p_info.get('pricing', {})
-                                                
-                                                name = titles.get('title')
-                                                price = None
-                                                if pricing:
-                                                     price = pricing.get('finalPrice', {}).get('value')
-                                                
-                                                # Fallback price from array
-                                                if not price and pricing and 'prices' in pricing:
-                                                     for p_opt in pricing['prices']:
-                                                          if not p_opt.get('strikeOff'):
-                                                               price = p_opt.get('value')
-                                                               break
-                                                
-                                                if name and price:
-                                                     # Brand check
-                                                     is_match = True
-                                                     if brand_name:
-                                                          b_lower = brand_name.lower()
-                                                          n_lower = name.lower()
-                                                          if b_lower not in n_lower:
-                                                               brand_parts = [b for b in b_lower.split() if len(b) > 2]
-                                                               if brand_parts:
-                                                                    if not any(part in n_lower for part in brand_parts):
-                                                                         is_match = False
-                                                               else:
-                                                                    is_match = False
-                                                     
-                                                     if is_match:
-                                                          # URL
-                                                          slug = p_info.get('baseUrl')
-                                                          url = f"https://{domain}{slug}" if slug else ""
-                                                          
-                                                          products.append(normalize_product_data({
-                                                              "name": name,
-                                                              "price": price,
-                                                              "seller": "N/A",
-                                                              "url": url,
-                                                              "method": "Flipkart Redux V4"
-                                                          }, domain))
-
-                    except Exception as e:
-                        print(f"DEBUG APP: Failed to load JSON from {domain}: {e}")
-                        continue
-                    
-                    # Search recursively for KEYWORDS-based extraction (Backup)
-                    # Heuristic: Objects with 'name', 'price', 'imageUrl' or 'sku'
-                    
-                    def find_products_in_state(node, depth=0):
-                        found = []
-                        if depth > 100: return found # Safety
-                        if isinstance(node, dict):
-                             # Check if this node is a product
-                             # Nykaa: 'name', 'finalPrice', 'slug'
-                             # Flipkart: 'titles': {'title': '...'}, 'pricing': {'finalPrice':...}
-                             
-                             name = node.get('name') or node.get('title')
-                             if not name and 'titles' in node and isinstance(node['titles'], dict):
-                                  name = node['titles'].get('title')
-                             
-                             price = node.get('price') or node.get('finalPrice') or node.get('offerPrice') or node.get('displayPrice') or node.get('listingPrice')
-                             # Flipkart deeper nesting for price
-                             if not price and 'pricing' in node and isinstance(node['pricing'], dict):
-                                  price = node['pricing'].get('finalPrice', {}).get('value') or node['pricing'].get('displayPrice', {}).get('value')
-                             
-                             # Formatting price
-                             if isinstance(price, int) or isinstance(price, float): price = str(price)
-                             if isinstance(price, dict): price = str(price) # Fallback if price is complex object
-                             
-                             slug = node.get('slug') or node.get('productUrl')
-                             
-                             if name and price:
-                                  # Validate Brand (Relaxed)
-                                  is_match = True
-                                  if brand_name:
-                                       b_lower = brand_name.lower()
-                                       n_lower = name.lower()
-                                       if b_lower not in n_lower:
-                                            # Fuzzy check: verify if meaningful parts of brand are present
-                                            brand_parts = [b for b in b_lower.split() if len(b) > 2]
-                                            if brand_parts:
-                                                 if not any(part in n_lower for part in brand_parts):
-                                                      is_match = False
-                                            else:
-                                                 is_match = False
-                                  
-                                  if is_match:
-                                      url = ""
-                                      if slug: 
-                                          url = f"https://{domain}/{slug}" if not slug.startswith("http") else slug
-                                      
-                                      found.append(normalize_product_data({
-                                          "name": name,
-                                          "price": price,
-                                          "seller": "N/A", # State usually has seller buried deeper, assume N/A for now
-                                          "url": url,
-                                          "method": "Hidden State (Redux)"
-                                      }, domain))
-                                        
-                             # Recurse
-                             for k, v in node.items():
-                                 found.extend(find_products_in_state(v, depth+1))
-                                 
-                        elif isinstance(node, list):
-                            for item in node:
-                                found.extend(find_products_in_state(item, depth+1))
-                        return found
-
-                    state_products = find_products_in_state(data)
-                    print(f"DEBUG APP: Found {len(state_products)} hidden products in {domain}")
-                    
-                    if not state_products:
-                         try:
-                             if brand_name and len(data) > 0:
-                                  with open(f"debug_failed_{domain}_hidden.json", "w", encoding="utf-8") as f:
-                                      json.dump(data, f, indent=2)
-                         except: pass
-
-                    products.extend(state_products)
-            except Exception as e:
-                print(f"DEBUG APP: Extraction Error: {e}")
-                pass
-
-    # Deduplicate
-    unique_products = []
-    seen = set()
-    for p in products:
-        k = p['Product Name'] + str(p['Price'])
-        if k not in seen:
-            seen.add(k)
-            unique_products.append(p)
-            
-    return unique_products
-
-def extract_from_generic_dom(soup, domain, brand_name):
-    """
-    Universal Extractor
-    """
-    products = []
-    seen_urls = set()
-    
-    # Currency symbols to look for
-    symbols = ['₹', '$', '€', '£', 'Rs', 'USD', 'INR', 'MRP']
-    
-    # Secure Text Node Finding: Ignore Scripts/Styles
-    all_text_nodes = soup.find_all(string=True)
-    price_nodes = []
-    
-    for t in all_text_nodes:
-         if t.parent.name in ['script', 'style', 'noscript', 'head', 'meta', 'link', 'title']: continue
-         if any(s in str(t) for s in symbols):
-              clean_t = t.strip()
-              # Heuristic: Price text shouldn't be too long or look like code
-              if len(clean_t) > 40: continue 
-              if any(bad in clean_t for bad in ['{', '}', ';', 'var ', 'function', '=']): continue
-              price_nodes.append(t)
-    
-    for node in price_nodes:
-        try:
-            # Walk up to find a container with a link
-            parent = node.parent
-            card = None
-            for _ in range(7): # Reduced range to avoid grabbing too big containers
-                if parent is None or parent.name in ['body', 'html', 'header', 'footer', 'nav', 'aside']: break
-                # Check if this container looks like a header or extraneous section
-                cls = " ".join(parent.get("class", [])).lower()
-                if "header" in cls or "menu" in cls or "search-summary" in cls or "filter" in cls:
-                    break
-                    
-                if parent.find("a", href=True):
-                    card = parent
-                    break
-                parent = parent.parent
-            
-            if not card: continue
-            
-            # Validation: Product Name Validation
-            raw_title = link_node.get_text(separator=" ", strip=True)
-            
-            # Depop/Image-heavy sites often have empty link text but valid Alt text or H-tags
-            # Check for better title immediately if the raw link text is weak
-            if len(raw_title) < 4:
-                 title_tag = card.find(['h2', 'h3', 'h4', 'span'])
-                 if title_tag and len(title_tag.get_text(strip=True)) > 5:
-                      raw_title = title_tag.get_text(strip=True)
-                 else:
-                      img = card.find('img', alt=True)
-                      if img: raw_title = img['alt']
-
-            # --- Robust Title Cleaning ---
-            # 1. Check for Search Header patterns
-            clean_title_lower = raw_title.lower()
-            if re.search(r"(\d+k?|\d{1,3}(,\d{3})*) results", clean_title_lower) or "items found" in clean_title_lower:
-                  continue
-                  
-            # Filter out generic link texts
-            if len(raw_title) < 4 or clean_title_lower in ["view", "details", "shop now", "click here", "buy now"]:
-                 continue
-
-            # Double check title after fallback (Relaxed: Only block if it strictly looks like a stats line)
-            if re.search(r"^\d.*\sresults?$", raw_title.lower().strip()):
-                 continue
-
-            # 2. Container Safety Check
-            # If the 'card' text contains "Sort By", "Filter", "Refine", it's likely the whole page wrapper, NOT a product card.
-            card_text = card.get_text(separator=" ", strip=True).lower()
-            if any(x in card_text for x in ["sort by:", "filter by", "refine search", "relevant matches"]):
-                 # Use a stricter heuristic: The card text shouldn't be HUGE
-                 if len(card_text) > 2000: 
-                      continue
-            
-            href = link_node['href']
-            
-            href = link_node['href']
-            if href.startswith(("javascript:", "#")): continue
-            url = f"https://{domain}{href}" if href.startswith("/") else href
-            
-            if url in seen_urls: continue
-            
-            name = link_node.get_text(strip=True)
-            if len(name) < 3:
-                    h_tag = card.find(['h1','h2','h3','h4'])
-                    if h_tag: name = h_tag.get_text(strip=True)
-            if len(name) < 3: continue
-
-            # Quality Check: Name matches Brand
-            # This prevents capturing "Recommended" or "Ad" items inconsistent with search
-            if brand_name and brand_name.lower() not in name.lower():
-                 # Fuzzy fallback: If multi-word brand (e.g. "Hugo Boss"), check if at least one main part exists
-                 brand_parts = [b for b in brand_name.lower().split() if len(b) > 2]
-                 if brand_parts and not any(part in name.lower() for part in brand_parts):
-                      continue
-
-
-            price = node.strip()
-            
-            # Identify Seller with Domain+Brand context
-            seller = identify_seller_from_card(card, domain, brand_name)
-            availability = identify_availability(card)
-            
-            products.append(normalize_product_data({
-                "name": name,
-                "price": price,
-                "seller": seller,
-                "availability": availability,
-                "url": url,
-                "method": "Generic Bottom-Up"
-            }, domain))
-            seen_urls.add(url)
-        except: continue
-
-    return products
-
-def detect_brand_products(url, brand_name, deep_scan=False):
-    """
-    Scans URL and returns a LIST of products found.
-    Generic implementation for ANY website.
-    """
-    status_summary = "Unknown"
-    found_products = []
-    details = ""
-    
-    # Generic "Real User" Headers
-    # Randomized standard user agents are handled by impersonate, but extra headers help
-    headers = {
-        "Accept-Language": "en-US,en;q=0.9",
-        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-        "Upgrade-Insecure-Requests": "1",
-        "Referer": "https://www.google.com/",
-        "Sec-Fetch-Dest": "document",
-        "Sec-Fetch-Mode": "navigate",
-        "Sec-Fetch-Site": "cross-site",
-        "Sec-Fetch-User": "?1",
-        "Cache-Control": "max-age=0"
-    }
-
-    # Implement Retry/Rotation for robust connections
-    # Use newer browser versions for better impersonation success
-    impersonate_profiles = ["chrome120", "chrome110", "safari15_3", "edge101"]
-    
-    # Special Handling for known tough sites (Depop, etc)
-    if "depop" in url:
-         headers["Referer"] = "https://www.depop.com/"
-         headers["Origin"] = "https://www.depop.com"
-    
-    # Custom Cookie Injection
-    if "custom_cookies" in st.session_state and st.session_state.custom_cookies:
-         headers["Cookie"] = st.session_state.custom_cookies.strip()
-
-    response = None
-    last_error = None
-
-    for profile in impersonate_profiles:
-        try:
-            response = requests.get(
-                url, 
-                impersonate=profile, 
-                headers=headers,
-                timeout=20
-            )
-            # Check for soft blocks / challenges before accepting
-            if response.status_code == 200:
-                 r_text = response.text
-                 if "Pardon Our Interruption" in r_text or "Checking your browser" in r_text or "<title>Security Measure</title>" in r_text:
-                      last_error = "Soft Block (Challenge)"
-                      time.sleep(2)
-                      continue
-                 break # Success
-        except Exception as e:
-            last_error = e
-            time.sleep(1) # Brief pause before retry
-            continue
-    
-    # Final check for block state to avoid downstream parsing errors
-    if response and response.status_code == 200:
-          if "Pardon Our Interruption" in response.text or "Checking your browser" in response.text:
-               return {
-                    "status": "Blocked",
-                    "details": "Access Denied by Anti-Bot (Challenge Page)",
-                    "products": [],
-                    "scan_url": url
-               }
-
-    if not response or response.status_code != 200:
-        error_details = f"HTTP {response.status_code}" if response else str(last_error)
-        return {
-            "status": "Blocked/Error",
-            "details": f"Failed after retries: {error_details}",
-            "products": [],
-            "scan_url": url
-        }
-            
-    try:
-        soup = BeautifulSoup(response.text, 'html.parser')
-        domain = urlparse(url).netloc
-        text_content = soup.get_text(separator=' ', strip=True).lower()
-
-        # 0. Early Negative Signal Check
-        # If the page explicitly says "No results", stop immediately to avoid scraping "Recommendations"
-        # Use regex to avoid false positives like "1,000 results for" matching "0 results for"
-        negative_signals = [
-            r"no results found", 
-            r"did not match any products", 
-            r"\b0 results for", 
-            r"we couldn't find any results",
-            r"nothing matches your search"
-        ]
-        
-        if any(re.search(ns, text_content) for ns in negative_signals):
-             return {
-                "status": "Not Found",
-                "details": "Page explicitly states no results found.",
-                "products": [],
-                "scan_url": url
-            }
-            
-        # --- AI Simplification ---
-        # If API Key is present, use AI to parse text instead of complex DOM logic
-        if st.session_state.get("google_api_key"):
-             ai_products = extract_with_gemini(text_content, domain, brand_name)
-             if ai_products:
-                  return {
-                    "status": "Found (AI)",
-                    "details": f"AI Extracted {len(ai_products)} products.",
-                    "products": ai_products,
-                    "scan_url": url
-                }
-             # If AI fails, fall back to standard logic below
-             
-        # 1. Strategy A: Structured Data (JSON-LD)
-        try:
-            data = extruct.extract(response.text, base_url=url, syntaxes=['json-ld'])
-            json_ld_list = data.get('json-ld', [])
-            found_products.extend(extract_from_json_ld(json_ld_list, domain, brand_name))
-        except Exception:
-            pass
-
-        if not found_products:
-             found_products.extend(extract_from_amazon_containers(soup, domain, brand_name))
-
-        # 1.5 Strategy A2: Manual Script/State Extraction (For SPA sites like Nykaa/Flipkart)
-        if not found_products:
-             found_products.extend(extract_from_hidden_data(soup, domain, brand_name))
-        
-        # 1.6 Strategy A3: eBay Specific DOM
-        if "ebay" in domain:
-             found_products.extend(extract_from_ebay_dom(soup, domain, brand_name))
-
-        # 2. Strategy B: Generic DOM Clustering / Bottom Up (Combined)
-        if not found_products:
-             # Scan using generic methods, passing brand name for better context
-             found_products.extend(extract_from_generic_dom(soup, domain, brand_name))
-
-        # 3. Strategy C: Text Fallback (Status determination only)
-        if not found_products:
-              # For long search queries, exact match of the whole string usually fails.
-              # Check for token overlap instead.
-              tokens = [t for t in brand_name.lower().split() if len(t) > 2]
-              token_match = False
-              if tokens:
-                   # If significant number of tokens are present
-                   present_count = sum(1 for t in tokens if t in text_content)
-                   if present_count / len(tokens) >= 0.5: # 50% match
-                        token_match = True
-              elif brand_name.lower() in text_content:
-                   token_match = True
-
-              if token_match:
-                    status_summary = "Text Match"
-                    details = "Brand name/tokens found in text, but product cards could not be identified automatically."
-              else:
-                  status_summary = "Not Found"
-                  details = "Brand name not found in visible text."
-        else:
-            status_summary = "Found"
-            details = f"Extracted {len(found_products)} products."
-            
-            # --- Deep Scan Logic (Parallelized) ---
-            if deep_scan and found_products:
-                 # Filter items that need scanning (N/A or Brand Name placeholders)
-                 # Limit to top 50 to allow thorough checking without waiting forever
-                 candidates_indices = []
-                 for i, p in enumerate(found_products[:50]):
-                      if p["Seller"] == "N/A" or p["Seller"] == brand_name.title():
-                           if "http" in p["Product URL"]:
-                                candidates_indices.append(i)
-                 
-                 details += f" [Deep Scan: Processing {len(candidates_indices)} items...]"
-                 
-                 def process_item(index):
-                      try:
-                           p = found_products[index]
-                           new_seller, new_avail = fetch_product_details(p["Product URL"], brand_name)
-                           return index, new_seller, new_avail
-                      except:
-                           return index, "N/A", "Unknown"
-
-                 # Run in parallel to speed up
-                 with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                      future_to_index = {executor.submit(process_item, i): i for i in candidates_indices}
-                      for future in concurrent.futures.as_completed(future_to_index):
-                           idx, seller_result, avail_result = future.result()
-                           if seller_result and seller_result != "N/A":
-                                found_products[idx]["Seller"] = seller_result
-                           if avail_result and avail_result != "Unknown":
-                                found_products[idx]["Availability"] = avail_result
-            
-    except Exception as e:
-        return {"status": "Error", "details": str(e), "products": [], "scan_url": url}
-
-    return {
-        "status": status_summary,
-        "details": details,
-        "products": found_products,
-        "scan_url": url
-    }
-
-def fetch_product_details(product_url, brand_name):
-    """
-    Visits the product page to find the seller and availability.
-    Returns: (seller, availability)
-    """
-    try:
-        # Same headers/impersonation
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
-            "Referer": "https://www.google.com/"
-        }
-        response = requests.get(product_url, impersonate="chrome110", headers=headers, timeout=10)
-        if response.status_code != 200: return "N/A", "Unknown"
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        domain = urlparse(product_url).netloc
-        
-        seller = "N/A"
-        
-        # 1. Target Specific Boxes (Amazon)
-        buybox = soup.find(id="merchant-info")
-        if buybox:
-             s = identify_seller_from_card(buybox, domain, brand_name)
-             if s != "N/A": seller = s
-
-        if seller == "N/A":
-             tabular = soup.find(id="tabular-buybox")
-             if tabular:
-                  s = identify_seller_from_card(tabular, domain, brand_name)
-                  if s != "N/A": seller = s
-             
-             # New "Accordion" style buyboxes
-             if seller == "N/A":
-                  for bid in ["buybox-accordion", "exports_desktop_qualifiedBuybox_buyNow_feature_div", "fresh-merchant-info", "n3_buybox"]:
-                       box = soup.find(id=bid)
-                       if box:
-                            s = identify_seller_from_card(box, domain, brand_name)
-                            if s != "N/A": 
-                                 seller = s
-                                 break
-
-        # 2. Generic: Scan Full Body Content (Fallback)
-        if seller == "N/A" and soup.body:
-             s = identify_seller_from_card(soup.body, domain, brand_name)
-             if s != "N/A": seller = s
-
-        # 3. Identify Availability
-        availability = "Unknown"
-        if soup.body:
-             availability = identify_availability(soup.body)
-
-        return seller, availability
-    except:
-        return "N/A", "Unknown"
-
-
-
-def extract_from_amazon_containers(soup, domain, brand_name):
-    """
-    Dedicated strategy for Amazon search results using reliable data attributes.
-    """
-    products = []
-    # Search for standard result containers
-    cards = soup.find_all("div", attrs={"data-component-type": "s-search-result"})
-    
-    for card in cards:
-        try:
-            # Title extraction:
-            # 1. Try finding link inside h2 (standard)
-            # 2. Try identifying 'a-text-normal' link (often used for titles)
-            title_node = None
-            link_node = None
-            
-            # Strategy 1: Link inside H2
-            h2_candidates = card.find_all("h2")
-            for h2 in h2_candidates:
-                possible_link = h2.find("a", href=True)
-                if possible_link:
-                    link_node = possible_link
-                    break
-            
-            # Strategy 2: Look for standard title class if H2 failed
-            if not link_node:
-                 link_node = card.find("a", class_=lambda x: x and "a-text-normal" in x, href=True)
-            
-            # Strategy 3: Look for link containing span with a-text-normal
-            if not link_node:
-                 span_text = card.find("span", class_=lambda x: x and "a-text-normal" in x)
-                 if span_text and span_text.parent.name == "a":
-                      link_node = span_text.parent
-
-            if not link_node: continue
-            
-            name = link_node.get_text(strip=True)
-            if len(name) < 5: continue # Too short to be a title
-
-            href = link_node['href']
-            url = f"https://{domain}{href}" if href.startswith("/") else href
-            
-            # Quality Check: Name matches Brand (borrowed from generic)
-            if brand_name:
-                 # Normalize brand name: remove hyphens/slugs to ensure tokens match
-                 brand_clean = brand_name.lower().replace("-", " ").replace("_", " ")
-                 name_clean = name.lower()
-                 
-                 if brand_clean not in name_clean:
-                      brand_parts = [b for b in brand_clean.split() if len(b) > 2]
-                      if brand_parts and not any(part in name_clean for part in brand_parts):
-                           continue
-
-            # Price extraction (look for a-price)
-            price = "N/A"
-            price_node = card.find(class_="a-price")
-            if price_node:
-                offscreen = price_node.find(class_="a-offscreen")
-                if offscreen:
-                    price = offscreen.get_text(strip=True)
-                else:
-                    price = price_node.get_text(separator="", strip=True) 
-            
-            # Seller identification
-            seller = identify_seller_from_card(card, domain, brand_name)
-            availability = identify_availability(card)
-            
-            products.append(normalize_product_data({
-                "name": name,
-                "price": price,
-                "seller": seller,
-                "availability": availability,
-                "url": url,
-                "method": "Amazon Structure"
-            }, domain))
-        except:
-            continue
-            
-    return products
-
 # --- Main App ---
 
 def main():
@@ -1188,14 +87,6 @@ def main():
             box-shadow: 0 4px 15px rgba(0,0,0,0.1);
         }
         .main-header h1 { margin: 0; font-size: 2.2rem; font-weight: 700; }
-        .result-card {
-            background-color: #ffffff; border: 1px solid #e0e0e0;
-            border-radius: 10px; padding: 1.5rem; margin-bottom: 1rem;
-            box-shadow: 0 2px 5px rgba(0,0,0,0.05);
-        }
-        .badge-found { background-color: #d1fae5; color: #065f46; border: 1px solid #34d399; padding: 4px 12px; border-radius: 20px; font-weight:600;}
-        .badge-blocked { background-color: #fee2e2; color: #991b1b; border: 1px solid #f87171; padding: 4px 12px; border-radius: 20px; font-weight:600;}
-        .badge-missing { background-color: #f3f4f6; color: #374151; border: 1px solid #d1d5db; padding: 4px 12px; border-radius: 20px; font-weight:600;}
         .stButton button.primary-btn { background-color: #FF4B4B; color: white; font-size: 1.1rem; padding: 0.75rem 0; }
         </style>
         """, unsafe_allow_html=True)
@@ -1214,26 +105,29 @@ def main():
             saved = load_domains()
             st.session_state.domains_list = saved if saved else DEFAULT_DOMAINS.copy()
 
-        with st.expander("➕ Add Target Domain"):
-            new_domain = st.text_input("Domain URL", placeholder="e.g. target.com", label_visibility="collapsed")
+        with st.expander("➕ Add Target Domains"):
+            new_domains = st.text_area(
+                "Domains", placeholder="e.g. target.com\nOne per line or comma-separated", label_visibility="collapsed"
+            )
             if st.button("Add to List", use_container_width=True):
-                if new_domain and new_domain not in st.session_state.domains_list:
-                    st.session_state.domains_list.append(new_domain.strip())
+                added = [d for d in parse_domains(new_domains) if d not in st.session_state.domains_list]
+                if added:
+                    st.session_state.domains_list.extend(added)
                     save_domains(st.session_state.domains_list)
                     st.rerun()
 
-        st.markdown(f"**Active Targets ({len(st.session_state.domains_list)})**")
-        domains_to_remove = []
-        for domain in st.session_state.domains_list:
-            c1, c2 = st.columns([0.85, 0.15])
-            c1.caption(f"🌐 {domain}")
-            if c2.button("×", key=f"del_{domain}"):
-                domains_to_remove.append(domain)
-        if domains_to_remove:
-            for d in domains_to_remove:
-                st.session_state.domains_list.remove(d)
-            save_domains(st.session_state.domains_list)
-            st.rerun()
+        # One table and one multiselect however many domains there are (no widget per domain)
+        with st.expander(f"🌐 Active Targets ({len(st.session_state.domains_list)})"):
+            st.dataframe(
+                pd.DataFrame({"Domain": st.session_state.domains_list}),
+                hide_index=True, use_container_width=True, height=min(35 * len(st.session_state.domains_list) + 38, 300)
+            )
+            domains_to_remove = st.multiselect(
+                "Remove domains", st.session_state.domains_list, placeholder="Pick domains to remove", key="domains_to_remove"
+            )
+            if st.button("Remove Selected", use_container_width=True, disabled=not domains_to_remove):
+                remove_domains(domains_to_remove)
+                st.rerun()
 
         st.markdown("---")
         with st.expander("🔐 Advanced Settings (Anti-Bot Bypass)"):
@@ -1246,19 +140,92 @@ def main():
              if google_key:
                   st.session_state.google_api_key = google_key
 
+             st.text_input(
+                  "Distributed Broker URL",
+                  value=os.environ.get("SCAN_BROKER_URL", ""),
+                  placeholder="sqlite:///scan_broker.db",
+                  help="Run scans on `python distributed.py worker` nodes sharing this broker. Leave empty to scan on this host.",
+                  key="broker_url"
+             )
+             st.number_input("Result Pages per Domain", min_value=1, max_value=20, value=1, key="search_pages",
+                             help="Only used with a distributed broker.")
+
         if st.button("🔄 Reset Defaults"):
             st.session_state.domains_list = DEFAULT_DOMAINS.copy()
             save_domains(st.session_state.domains_list)
             st.rerun()
 
+        st.markdown("---")
+        with st.expander("🗂️ Scan Jobs"):
+            recent_jobs = get_job_store().recent_jobs()
+            if not recent_jobs:
+                st.caption("No scan jobs yet.")
+            else:
+                job_labels = {
+                    j["job_id"]: f"{j['brand']} · {j['status']} · {time.strftime('%d %b %H:%M', time.localtime(j['created_at']))}"
+                    for j in recent_jobs
+                }
+                picked_job = st.selectbox("Job", list(job_labels), format_func=job_labels.get, label_visibility="collapsed")
+                if st.button("Open Job", use_container_width=True):
+                    open_job(picked_job)
+                    st.rerun()
+
+        with st.expander("📡 Monitoring"):
+            st.caption("Brands re-scanned on a schedule by `python monitor.py run`; only new or changed listings are deep-scanned.")
+            monitor_brand = st.text_input("Brand", key="monitor_brand")
+            monitor_hours = st.number_input("Every (hours)", min_value=1, max_value=168, value=DEFAULT_INTERVAL_HOURS, key="monitor_hours")
+            monitor_deep = st.checkbox("Deep-scan changes", value=True, key="monitor_deep")
+            if st.button("Add Monitor", use_container_width=True) and monitor_brand.strip():
+                options = ScanConfig(deep_scan=monitor_deep).to_options()
+                for key in SECRET_OPTIONS:
+                    options.pop(key, None)
+                get_monitor_store().add_monitor(monitor_brand.strip(), st.session_state.domains_list, monitor_hours, options)
+                st.toast(f"Monitoring {monitor_brand.strip()}")
+
+            for m in get_monitor_store().monitors():
+                last = get_monitor_store().runs(m["brand"], limit=1)
+                c_m1, c_m2 = st.columns([5, 1])
+                if last:
+                    r = last[0]
+                    c_m1.markdown(
+                        f"**{m['brand']}** · every {m['interval_seconds'] / 3600:g}h  \n"
+                        f"<small>{time.strftime('%d %b %H:%M', time.localtime(r['finished_at']))}: "
+                        f"+{r['new']} / -{r['removed']} listings, {r['price_changes']} price, {r['seller_changes']} seller changes</small>",
+                        unsafe_allow_html=True
+                    )
+                else:
+                    c_m1.markdown(f"**{m['brand']}** · every {m['interval_seconds'] / 3600:g}h  \n<small>waiting for first run</small>", unsafe_allow_html=True)
+                if c_m2.button("×", key=f"unmonitor_{m['brand']}"):
+                    get_monitor_store().remove_monitor(m["brand"])
+                    st.rerun()
+
     # Main Inputs
     col_input, col_action = st.columns([3, 1])
     with col_input:
         brand_name_input = st.text_input("Brand to Monitor", placeholder="Enter brand name...", label_visibility="collapsed")
-        deep_scan_mode = st.checkbox("Enable Deep Scan (Slower, visits product pages)", value=False, help="Checking this will visit the top 3 product pages individually to find the 'Sold by' information, which is often hidden on the search results page.")
+        brand_aliases_input = st.text_input("Also listed as (comma separated)", placeholder="e.g. L'Oreal, Loreal Paris", help="Other names or spellings of the brand; product titles matching any of them are kept.")
+        deep_scan_mode = st.checkbox("Enable Deep Scan (Slower, visits product pages)", value=False, help="Checking this will visit product pages individually to find the 'Sold by' information, which is often hidden on the search results page. Rows most likely to be unauthorized resellers are visited first.")
+        deep_scan_budget = st.number_input("Deep Scan time budget per domain (seconds, 0 = no limit)", min_value=0, max_value=600, value=30, step=5, disabled=not deep_scan_mode)
+        deep_scan_source = st.radio(
+            "Deep Scan Source",
+            ["product", "offers"],
+            format_func=lambda s: "Product page (buybox seller)" if s == "product" else "All offers (Amazon / eBay, one row per seller)",
+            horizontal=True,
+            disabled=not deep_scan_mode
+        )
+        force_refresh = st.checkbox("Force refresh", value=False, help="Scan again even if another session scanned the same brand in the last few minutes (scans already in progress are still shared).")
+        sampling_mode = st.checkbox("Estimate Seller Mix (Sampling)", value=False, help="Visits a stratified random sample of product pages per marketplace and estimates the share of unauthorized and unknown sellers, instead of checking every listing.")
+        if sampling_mode:
+            c_s1, c_s2 = st.columns([3, 1])
+            authorized_input = c_s1.text_input("Authorized Sellers (comma separated)", placeholder="e.g. Cocoblu Retail, Appario Retail")
+            target_margin_pct = c_s2.number_input("Target margin (±%)", min_value=1, max_value=25, value=5)
     with col_action:
         start_btn = st.button("🚀 Start Scan", type="primary", use_container_width=True)
 
+    # Re-attach to a job after a refresh / in another tab
+    if "job_id" not in st.session_state and st.query_params.get("job"):
+        open_job(st.query_params["job"])
+
     # Initialize State
     if "all_products" not in st.session_state:
         st.session_state.all_products = [] # List of all product dicts
@@ -1273,132 +240,427 @@ def main():
         elif not st.session_state.domains_list:
             st.error("⚠️ No domains configured.")
         else:
-            # Reset
-            st.session_state.all_products = []
-            st.session_state.scan_summary = []
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            target_len = len(st.session_state.domains_list)
-            
-            status_text = st.empty()
-            target_len = len(st.session_state.domains_list)
-            
-            # Helper for parallel execution
-            def scan_domain(domain):
-                # UI updates not allowed in thread
-                search_url = construct_search_url(domain, brand_name_input)
-                return {
-                    "domain": domain, 
-                    "result": detect_brand_products(search_url, brand_name_input, deep_scan=deep_scan_mode)
-                }
+            # Queue the scan as a background job; worker processes run it
+            # so it survives reruns, refreshes and disconnects
+            config = ScanConfig(
+                custom_cookies=st.session_state.get("custom_cookies") or "",
+                google_api_key=st.session_state.get("google_api_key") or "",
+                deep_scan=deep_scan_mode,
+                deep_scan_budget=deep_scan_budget or None,
+                deep_scan_source=deep_scan_source,
+                estimate_seller_mix=sampling_mode,
+                authorized_sellers=tuple(s.strip() for s in authorized_input.split(",") if s.strip()) if sampling_mode else (),
+                sampling_target_margin=target_margin_pct / 100 if sampling_mode else ScanConfig.sampling_target_margin,
+                # Parse pages on every core; fetch threads only wait on the network
+                parse_processes=os.cpu_count() or 1,
+                broker_url=(st.session_state.get("broker_url") or "").strip(),
+                search_pages=int(st.session_state.get("search_pages") or 1),
+                force_refresh=force_refresh,
+                brand_aliases=tuple(a.strip() for a in brand_aliases_input.split(",") if a.strip())
+            )
+            job_id = get_job_store().submit(brand_name_input, st.session_state.domains_list, config.to_options())
+            open_job(job_id)
+
+    # --- Active Job (live progress) ---
+    job_id = st.session_state.get("job_id")
+    job = get_job_store().get_job(job_id) if job_id else None
+    if job:
+        sync_job_state(job_id)
 
-            # Parallel Execution
-            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
-                completed_count = 0
-                futures = {executor.submit(scan_domain, d): d for d in st.session_state.domains_list}
-                
-                for future in concurrent.futures.as_completed(futures):
-                    data = future.result()
-                    domain = data["domain"]
-                    result = data["result"]
-                    
-                    completed_count += 1
-                    status_text.caption(f"Finished {domain} ({completed_count}/{target_len})")
-                    progress_bar.progress(completed_count / target_len)
-                    
-                    # Store Summary
-                    st.session_state.scan_summary.append({
-                        "Domain": domain,
-                        "Status": result["status"],
-                        "Details": result["details"],
-                        "URL": result["scan_url"],
-                        "ProductCount": len(result["products"])
-                    })
-                    
-                    # Store Products
-                    if result["products"]:
-                        st.session_state.all_products.extend(result["products"])
-                    else:
-                        st.session_state.all_products.append(normalize_product_data({
-                            "name": f"Scan Summary: {result['status']}",
-                            "price": "-",
-                            "seller": "-",
-                            "url": result["scan_url"],
-                            "method": "Summary Only"
-                        }, domain))
-
-            progress_bar.empty()
-            status_text.empty()
-            st.success(f"🎉 Scan Complete for **{brand_name_input}**")
+    if job and job["status"] in ("queued", "running"):
+        render_job_progress(job_id)
 
     # --- Results Dashboard ---
-    if st.session_state.scan_summary:
-        st.markdown("### 📊 Scan Summary")
-        
-        # Calculate Metrics
-        total_prods = len([p for p in st.session_state.all_products if p["Detection Method"] != "Summary Only"])
-        blocked_cnt = len([s for s in st.session_state.scan_summary if s["Status"] == "Blocked"])
-        
-        m1, m2, m3 = st.columns(3)
-        m1.metric("Domains Scanned", len(st.session_state.scan_summary))
-        m2.metric("Total Products Found", total_prods)
-        m3.metric("Blocked/Errors", blocked_cnt)
-        
+    elif st.session_state.scan_summary:
+        if job and job["status"] == "failed":
+            st.error(f"⚠️ Scan job {job_id} failed: {job['error']}")
+        render_results_dashboard()
+
+    render_history_search()
+    render_archive_view()
+
+@st.cache_resource
+def get_job_store():
+    """ Job store shared by every session; also makes sure worker processes are running. """
+    store = JobStore()
+    ensure_workers()
+    return store
+
+@st.cache_resource
+def get_history():
+    return ScanHistory()
+
+@st.cache_resource
+def get_archive():
+    """ Parquet scan archive, or None when pyarrow is not installed. """
+    try:
+        from archive import ScanArchive
+    except ImportError:
+        return None
+    return ScanArchive()
+
+@st.cache_resource
+def get_seller_registry():
+    return SellerRegistry()
+
+@st.cache_resource
+def get_monitor_store():
+    return MonitorStore()
+
+def open_job(job_id):
+    """
+    Attaches this session to a job and records the ID in the URL
+    so a refresh or another tab can re-attach.
+    """
+    st.session_state.job_id = job_id
+    st.session_state.job_state = None
+    st.query_params["job"] = job_id
+    sync_job_state(job_id)
+
+def sync_job_state(job_id):
+    """
+    Applies the job's new events to the session's results.
+    """
+    state = st.session_state.get("job_state")
+    cursor = state["cursor"] if state else 0
+    state = replay_events(get_job_store().events_since(job_id, cursor), state)
+    st.session_state.job_state = state
+    st.session_state.scan_summary = state["scan_summary"]
+    st.session_state.all_products = state["all_products"]
+    st.session_state.seller_mix = state["seller_mix"]
+    st.session_state.pipeline_stats = state.get("pipeline")
+    return state
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def render_job_progress(job_id):
+    """
+    Polls the job store and renders partial results. Runs as a fragment so
+    only this section refreshes while the job is in flight.
+    """
+    job = get_job_store().get_job(job_id)
+    state = sync_job_state(job_id)
+
+    if job["status"] not in ("queued", "running"):
+        # Finished: hand over to the full dashboard
+        st.rerun(scope="app")
+
+    # Keep workers alive (e.g. after a server restart)
+    if job["status"] == "queued":
+        ensure_workers()
+
+    done_count = len(state["scan_summary"])
+    target_len = len(job["domains"])
+    st.progress(done_count / target_len if target_len else 0.0)
+    if job["status"] == "queued":
+        st.caption(f"Job {job_id} queued, waiting for a worker...")
+    else:
+        st.caption(f"Job {job_id}: finished {done_count}/{target_len} domains, {len(state['deep_rows'])} deep-scan rows resolved in progress")
+
+    if state["scan_summary"]:
+        overview = overview_frame(current_scan_id(), state["scan_summary"])
+        listings = sum(1 for p in state["all_products"] if p["Detection Method"] != "Summary Only")
+        render_summary_metrics(overview, listings)
         st.markdown("### 🕵️ Platform Overview")
-        for summary in st.session_state.scan_summary:
-             badge_class = "badge-missing"
-             icon = "⚪"
-             if summary["Status"] == "Found": 
-                 badge_class = "badge-found"
-                 icon = "✅"
-             elif summary["Status"] == "Blocked": 
-                 badge_class = "badge-blocked"
-                 icon = "⛔"
-                 
-             st.markdown(f"""
-            <div class="result-card">
-                <div style="display:flex; justify-content:space-between; align-items:center;">
-                    <div>
-                        <span style="font-weight:700; font-size:1.1rem; color:#333;">{summary['Domain']}</span>
-                        <br>
-                        <span style="font-size:0.85rem; color:#666;">🔗 <a href="{summary['URL']}" target="_blank" style="color:#556270; text-decoration:none;">View Search Page</a></span>
-                    </div>
-                    <div style="text-align:right;">
-                        <span class="{badge_class}">{icon} {summary['Status']}</span>
-                        <div style="margin-top:5px; font-size:0.9rem; font-weight:bold; color:#555;">{summary['ProductCount']} products found</div>
-                    </div>
-                </div>
-                <div style="margin-top:0.8rem; font-size:0.9rem; color:#555;">
-                     {summary['Details']}
-                </div>
-            </div>
-            """, unsafe_allow_html=True)
+        render_platform_overview(overview, "progress_overview")
 
-        st.markdown("---")
+    rows = state["all_products"] + list(state["deep_rows"].values())
+    if rows:
         st.markdown("### 📑 Detailed Product Report")
-        
-        df_products = pd.DataFrame(st.session_state.all_products)
-        st.dataframe(df_products, use_container_width=True)
-
-        col_dl1, col_dl2 = st.columns(2)
-        
-        # CSV
-        csv = df_products.to_csv(index=False).encode('utf-8')
-        col_dl1.download_button("📥 Download CSV", csv, "brand_products.csv", "text/csv", use_container_width=True, key="csv_dl")
-        
-        # Excel
-        buffer = io.BytesIO()
-        with pd.ExcelWriter(buffer, engine='openpyxl') as writer:
-            df_products.to_excel(writer, index=False, sheet_name='Product Data')
-        
-        col_dl2.download_button(
-            label="📊 Download Excel Report",
-            data=buffer.getvalue(),
-            file_name="brand_products.xlsx",
-            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-            use_container_width=True,
-            key="xlsx_dl"
+        st.dataframe(records_to_frame(rows), use_container_width=True)
+
+    render_pipeline_stats(state.get("pipeline"))
+
+def render_pipeline_stats(stages):
+    """ Per-stage queue depth / service time, to see which stage limits throughput. """
+    if not stages:
+        return
+    with st.expander("⚙️ Pipeline Stages"):
+        st.dataframe(pd.DataFrame(stages).set_index("stage"), use_container_width=True)
+        st.caption("The bottleneck is the stage whose queue stays full while the stage before it spends time blocked; give it more workers.")
+
+def render_summary_metrics(overview, total_prods):
+    # Both counts come precomputed (platform overview table / results model)
+    blocked_cnt = int((overview[STATUS_GROUP] == "Blocked").sum())
+
+    m1, m2, m3 = st.columns(3)
+    m1.metric("Domains Scanned", len(overview))
+    m2.metric("Total Products Found", total_prods)
+    m3.metric("Blocked/Errors", blocked_cnt)
+
+OVERVIEW_PAGE_SIZE = 25
+STATUS_ICONS = {"Found": "✅", "Blocked": "⛔", "Not Found": "⚪"}
+OVERVIEW_SORTS = {
+    "Status": ([STATUS_GROUP, "Products", "Domain"], [True, False, True]),
+    "Most products": (["Products", "Domain"], [False, True]),
+    "Domain": (["Domain"], [True])
+}
+
+def render_platform_overview(overview, key, manage=False):
+    """
+    One page of the per-domain overview table: status group filter, sort and pagination,
+    so the page renders the same few elements for 4 or 400 domains.
+    manage adds a bulk "remove from targets" action for the filtered domains.
+    """
+    counts = overview[STATUS_GROUP].value_counts()
+    c1, c2 = st.columns([3, 1])
+    groups = c1.segmented_control(
+        "Status", STATUS_GROUPS, selection_mode="multi", default=list(STATUS_GROUPS), key=f"{key}_groups",
+        format_func=lambda g: f"{STATUS_ICONS[g]} {g} ({counts.get(g, 0)})"
+    )
+    sort_by = c2.selectbox("Sort by", list(OVERVIEW_SORTS), key=f"{key}_sort")
+
+    shown = overview[overview[STATUS_GROUP].isin(groups)]
+    by, ascending = OVERVIEW_SORTS[sort_by]
+    shown = shown.sort_values(by, ascending=ascending, kind="stable")
+    pages = max(1, -(-len(shown) // OVERVIEW_PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key=f"{key}_page")
+    rows = shown.iloc[(page - 1) * OVERVIEW_PAGE_SIZE:page * OVERVIEW_PAGE_SIZE].copy()
+
+    rows["Status"] = rows[STATUS_GROUP].map(STATUS_ICONS).astype(str) + " " + rows["Status"]
+    st.dataframe(
+        rows.drop(columns=[STATUS_GROUP]), hide_index=True, use_container_width=True,
+        column_config={"URL": st.column_config.LinkColumn("Search Page", display_text="View Search Page")}
+    )
+    st.caption(f"{len(shown)} of {len(overview)} domains")
+
+    if manage and len(shown) < len(overview):
+        targets = [d for d in shown["Domain"] if d in st.session_state.domains_list]
+        if targets and st.button(f"Remove these {len(targets)} domains from targets", key=f"{key}_remove"):
+            remove_domains(targets)
+            st.rerun(scope="app")
+
+def current_scan_id():
+    """ Identifies the result set on screen: job ID + last applied event. """
+    state = st.session_state.get("job_state") or {}
+    return f"{st.session_state.get('job_id', 'session')}-{state.get('cursor', 0)}"
+
+@st.cache_resource(max_entries=16)
+def overview_frame(scan_id, _scan_summary):
+    """ Platform overview table of a scan (see aggregates.platform_overview), built once per scan ID. """
+    return platform_overview(_scan_summary)
+
+@st.cache_resource(max_entries=16)
+def results_frame(scan_id, _products, collapse_duplicates=False):
+    """
+    DataFrame of a scan's product rows (with numeric prices, canonical sellers and outlier flags), built
+    once per scan ID and shared read-only by every rerun and session (_products is not hashed).
+    collapse_duplicates keeps one row per near-duplicate cluster across platforms (after seller resolution).
+    """
+    registry = get_seller_registry()
+    registry.reload()
+    # Sellers are resolved first, so collapsing compares canonical seller IDs
+    df = registry.apply_to_frame(records_to_frame(_products))
+    if collapse_duplicates:
+        df = dedupe_frame(df, fuzzy=True)
+    return flag_price_outliers(normalize_prices(df))
+
+@st.cache_resource(max_entries=16)
+def results_model(scan_id, collapse_duplicates, _df):
+    """ Aggregate cube of results_frame(scan_id, ..., collapse_duplicates), shared like the frame. """
+    return ResultsModel(_df)
+
+@st.fragment
+def render_results_dashboard():
+    """
+    Results area. Runs as a fragment so widget interactions inside it
+    only rerun this section, not the whole page.
+    """
+    scan_id = current_scan_id()
+    collapse = st.session_state.get("collapse_duplicates", False)
+    df_products = results_frame(scan_id, st.session_state.all_products, collapse)
+    model = results_model(scan_id, collapse, df_products)
+    overview = overview_frame(scan_id, st.session_state.scan_summary)
+
+    st.markdown("### 📊 Scan Summary")
+    render_summary_metrics(overview, model.total)
+
+    mix = st.session_state.get("seller_mix")
+    if mix and mix["sample_size"]:
+        st.markdown("### 🎯 Seller Mix Estimate")
+        conf = int(mix["confidence"] * 100)
+        e1, e2, e3 = st.columns(3)
+        e1.metric(
+            "Unauthorized Sellers",
+            f"{mix['unauthorized']['share']:.0%}",
+            help=f"{conf}% CI: {mix['unauthorized']['low']:.0%} – {mix['unauthorized']['high']:.0%}"
+        )
+        e2.metric(
+            "Unknown Sellers",
+            f"{mix['unknown']['share']:.0%}",
+            help=f"{conf}% CI: {mix['unknown']['low']:.0%} – {mix['unknown']['high']:.0%}"
+        )
+        e3.metric("Sample Size", f"{mix['sample_size']} / {mix['population']}")
+        st.caption(
+            f"±{mix['margin']:.1%} at {conf}% confidence"
+            f"{'' if mix['converged'] else ' (target margin not reached)'} · {mix['pages_fetched']} product pages fetched"
+        )
+
+    st.markdown("### 🕵️ Platform Overview")
+    render_platform_overview(overview, "overview", manage=True)
+
+    # Read above so the metrics already use it; the widget itself sits next to the report
+    st.toggle(
+        "Collapse near-duplicate listings", value=False, key="collapse_duplicates",
+        help="One row per cluster of near-identical titles across all platforms; \"Cluster Size\" counts the rows it stands for."
+    )
+    if collapse and CLUSTER_SIZE in df_products.columns:
+        listings = model.frame
+        st.caption(f"{len(listings)} distinct listings, {int(listings[CLUSTER_SIZE].sum()) - len(listings)} near-duplicate rows collapsed.")
+    render_price_outliers(df_products)
+    render_results_explorer(scan_id, model)
+
+    st.markdown("---")
+    st.markdown("### 📑 Detailed Product Report")
+    st.dataframe(df_products, use_container_width=True)
+
+    # Files are only generated when a button is clicked, then reused for this scan (and variant)
+    variant = "collapsed" if collapse else None
+    col_dl1, col_dl2 = st.columns(2)
+    col_dl1.download_button(
+        "📥 Download CSV", lambda: read_export(df_products, scan_id, "csv", variant),
+        download_name("csv", variant), EXPORT_FORMATS["csv"][1],
+        use_container_width=True, key="csv_dl", on_click="ignore"
+    )
+    col_dl2.download_button(
+        label="📊 Download Excel Report",
+        data=lambda: read_export(df_products, scan_id, "xlsx", variant),
+        file_name=download_name("xlsx", variant),
+        mime=EXPORT_FORMATS["xlsx"][1],
+        use_container_width=True,
+        key="xlsx_dl",
+        on_click="ignore"
+    )
+
+    render_pipeline_stats(st.session_state.get("pipeline_stats"))
+
+def render_price_outliers(df_products):
+    """ Listings priced far below the brand's typical price (robust z-score across platforms). """
+    if PRICE_OUTLIER not in df_products.columns:
+        return
+    flagged = df_products[df_products[PRICE_OUTLIER]]
+    st.markdown("### 💸 Price Outliers")
+    if flagged.empty:
+        st.caption("No listings priced far below the typical price.")
+    else:
+        st.warning(f"{len(flagged)} listings priced far below the typical price: possible counterfeits or grey-market stock.")
+        st.dataframe(flagged.sort_values(PRICE_Z), use_container_width=True)
+    with st.expander("Price statistics"):
+        st.dataframe(price_stats_table(df_products), use_container_width=True)
+
+EXPLORE_ROW_LIMIT = 500
+
+@st.fragment
+def render_results_explorer(scan_id, model):
+    """
+    Filters and pivots over the scan's cached aggregates (see aggregates.py). Runs as its own
+    fragment: changing a filter re-reads the memoized roll-ups, not the listings.
+    """
+    if not model.total:
+        return
+    st.markdown("### 🧮 Explore Results")
+
+    # Widget keys include the scan ID so a new scan starts unfiltered
+    filters = {}
+    filter_cols = st.columns(len(model.dimensions))
+    for col, dim in zip(filter_cols, model.dimensions):
+        filters[dim] = col.multiselect(dim, model.options(dim), key=f"explore_{dim}_{scan_id}")
+
+    totals = model.totals(filters)
+    currencies = model.aggregate(["Currency"], filters) if "Currency" in model.dimensions else None
+    f1, f2, f3, f4 = st.columns(4)
+    f1.metric("Listings", f"{totals['Listings']:,}")
+    f2.metric("Sellers", f"{totals['Sellers']:,}")
+    # Prices in different currencies don't average
+    if currencies is not None and len(currencies) == 1 and pd.notna(totals["Avg Price"]):
+        f3.metric("Avg Price", f"{totals['Avg Price']:,.2f} {currencies['Currency'].iloc[0]}")
+    else:
+        f3.metric("Avg Price", "—", help="Filter or pivot by a single currency to compare prices.")
+    f4.metric("Price Outliers", f"{totals['Outliers']:,}")
+
+    p1, p2, p3 = st.columns(3)
+    rows = p1.selectbox("Rows", model.dimensions, key="explore_rows")
+    columns = p2.selectbox("Columns", ["—"] + [d for d in model.dimensions if d != rows], key="explore_columns")
+    value = p3.selectbox("Value", MEASURES, key="explore_value")
+    pivot = model.pivot(rows, None if columns == "—" else columns, filters, value)
+    st.dataframe(pivot, use_container_width=True)
+    if value in ("Listings", "Sellers", "Outliers") and len(pivot):
+        # Top rows only, a chart of thousands of sellers is unreadable
+        st.bar_chart(pivot.head(30) if rows != PRICE_BAND else pivot)
+
+    matches, matched = model.rows(filters, EXPLORE_ROW_LIMIT)
+    with st.expander(f"Matching listings ({matched:,})"):
+        if matched > len(matches):
+            st.caption(f"Showing the first {len(matches):,}; download the full report below.")
+        st.dataframe(matches, use_container_width=True)
+
+@st.fragment
+def render_history_search():
+    """ Queries stored scans instead of re-scanning the marketplaces. """
+    with st.expander("🔎 Search Scan History"):
+        h1, h2, h3, h4 = st.columns([2, 2, 2, 1])
+        brand = h1.text_input("Brand", key="history_brand")
+        seller = h2.text_input("Seller", key="history_seller")
+        platform = h3.text_input("Platform", placeholder="e.g. www.amazon.in", key="history_platform")
+        days = h4.number_input("Last N days", min_value=0, value=30, key="history_days")
+        if st.button("Search History", key="history_search"):
+            started = time.time()
+            rows = get_history().query_listings(
+                brand=brand.strip() or None,
+                seller=seller.strip() or None,
+                platform=platform.strip() or None,
+                days=days or None
+            )
+            st.caption(f"{len(rows)} stored listings in {(time.time() - started) * 1000:.0f} ms")
+            if rows:
+                df_history = pd.DataFrame(rows)
+                df_history["scanned_at"] = pd.to_datetime(df_history["scanned_at"], unit="s")
+                st.dataframe(df_history, use_container_width=True)
+
+@st.fragment
+def render_archive_view():
+    """ Long-range trends straight from the Parquet archive (only the needed columns / partitions are read). """
+    with st.expander("📦 Scan Archive Trends"):
+        archive = get_archive()
+        if archive is None:
+            st.caption("Install pyarrow to enable the scan archive.")
+            return
+        parts = archive.partitions()
+        if not parts["dates"]:
+            st.caption("No archived scans yet.")
+            return
+
+        first, last = pd.to_datetime(parts["dates"][0]).date(), pd.to_datetime(parts["dates"][-1]).date()
+        a1, a2, a3 = st.columns([2, 2, 3])
+        date_range = a1.date_input("Dates", value=(first, last), min_value=first, max_value=last, key="archive_dates")
+        brand = a2.text_input("Brand", key="archive_brand")
+        platforms = a3.multiselect("Platforms", parts["platforms"], key="archive_platforms")
+        if not st.button("Load Trends", key="archive_load"):
+            return
+
+        start, end = (date_range[0], date_range[-1]) if date_range else (first, last)
+        started = time.time()
+        df_archive = archive.load(
+            columns=["date", "platform", "seller", "price_value"],
+            brands=[brand.strip()] if brand.strip() else None,
+            platforms=platforms or None,
+            start=start.isoformat(),
+            end=end.isoformat()
+        )
+        st.caption(f"{len(df_archive)} archived listings in {(time.time() - started) * 1000:.0f} ms")
+        if df_archive.empty:
+            return
+
+        daily = df_archive.groupby(["date", "platform"], observed=True)
+        st.markdown("**Listings per day**")
+        st.line_chart(daily.size().unstack("platform").fillna(0))
+        st.markdown("**Median price per day**")
+        st.line_chart(daily["price_value"].median().unstack("platform"))
+        st.markdown("**Top sellers**")
+        st.dataframe(
+            df_archive["seller"].value_counts().head(50).rename_axis("Seller").reset_index(name="Listings"),
+            use_container_width=True
         )
 
 if __name__ == "__main__":
@@ -0,0 +1,261 @@
+"""
+Append-only Parquet archive of scan output, for trend reporting over long history.
+
+Layout (hive partitioning, one file per scan + domain + platform):
+
+    scan_archive/date=2026-10-19/platform=www.amazon.in/<scan>-<id>.parquet
+
+Seller, platform, brand and the other low-cardinality columns are
+dictionary-encoded; prices are stored as numeric min / max (see prices.py)
+next to the raw text, with an ISO currency.
+load() reads only the requested columns and prunes date / platform
+partitions before touching any file. Requires pyarrow.
+"""
+import datetime
+import os
+import re
+import shutil
+import uuid
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from engine import listing_key
+from prices import PRICE_MAX, PRICE_MIN, parse_prices
+
+ARCHIVE_DIR = "scan_archive"
+# Names of the files a compaction merged, kept next to the merged file until the swap is done
+MERGED_MANIFEST = ".merged"
+
+_DICT = pa.dictionary(pa.int32(), pa.string())
+ARCHIVE_SCHEMA = pa.schema([
+    ("scan_id", pa.string()),
+    ("brand", _DICT),
+    ("domain", _DICT),
+    ("product_key", pa.string()),
+    ("product_name", pa.string()),
+    ("price", pa.string()),
+    ("price_value", pa.float64()),
+    ("price_max", pa.float64()),
+    ("currency", _DICT),
+    ("seller", _DICT),
+    ("availability", _DICT),
+    ("condition", _DICT),
+    ("url", pa.string()),
+    ("method", _DICT),
+    ("scanned_at", pa.timestamp("s", tz="UTC"))
+])
+# Partition columns (not stored inside the files)
+PARTITION_SCHEMA = pa.schema([("date", pa.string()), ("platform", pa.string())])
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+def _partition_value(value):
+    # Platform names are hostnames; keep anything else path-safe
+    return str(value or "unknown").replace("/", "_").replace("\\", "_")
+
+
+def _live_files(folder):
+    return [f for f in os.listdir(folder) if f.endswith(".parquet") and not f.startswith(".")]
+
+
+def _write_file(table, folder, name):
+    # Written under a dot-prefixed temp name (ignored by dataset discovery),
+    # so readers never see a partial file
+    tmp = os.path.join(folder, f".{name}.tmp")
+    pq.write_table(table, tmp, compression="zstd")
+    os.replace(tmp, os.path.join(folder, name))
+
+
+class ScanArchive:
+    """ Writer + loader for the partitioned Parquet archive. """
+
+    def __init__(self, root=ARCHIVE_DIR):
+        self.root = root
+
+    def _dataset(self):
+        return ds.dataset(
+            self.root, format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            schema=pa.unify_schemas([ARCHIVE_SCHEMA, PARTITION_SCHEMA])
+        )
+
+    # --- Writes ---
+
+    def append(self, scan_id, brand, domain, products, scanned_at=None):
+        """
+        Appends one domain's product rows; one new file per platform partition.
+        Returns the number of rows written.
+        """
+        scanned_at = scanned_at or datetime.datetime.now(datetime.timezone.utc)
+        by_platform = {}
+        for p in products:
+            if p["Detection Method"] != "Summary Only":
+                by_platform.setdefault(p["Platform"], []).append(p)
+
+        date = scanned_at.strftime("%Y-%m-%d")
+        for platform, rows in by_platform.items():
+            prices = parse_prices([p["Price"] for p in rows], [platform] * len(rows), [p["Currency"] for p in rows])
+            table = pa.table({
+                "scan_id": [scan_id] * len(rows),
+                "brand": [brand] * len(rows),
+                "domain": [domain] * len(rows),
+                "product_key": [listing_key(p) for p in rows],
+                "product_name": [_text(p["Product Name"]) for p in rows],
+                "price": [_text(p["Price"]) for p in rows],
+                "price_value": prices[PRICE_MIN].to_numpy(),
+                "price_max": prices[PRICE_MAX].to_numpy(),
+                "currency": prices["Currency"].astype(object).where(prices["Currency"].notna(), None).tolist(),
+                "seller": [_text(p["Seller"]) for p in rows],
+                "availability": [_text(p["Availability"]) for p in rows],
+                "condition": [_text(p["Condition"]) for p in rows],
+                "url": [_text(p["Product URL"]) for p in rows],
+                "method": [_text(p["Detection Method"]) for p in rows],
+                "scanned_at": [scanned_at] * len(rows)
+            }, schema=ARCHIVE_SCHEMA)
+            folder = os.path.join(self.root, f"date={date}", f"platform={_partition_value(platform)}")
+            os.makedirs(folder, exist_ok=True)
+            _write_file(table, folder, f"{scan_id}-{uuid.uuid4().hex[:8]}.parquet")
+        return sum(len(rows) for rows in by_platform.values())
+
+    def drop_scan(self, scan_id, since=None):
+        """
+        Removes every archived row of one scan (e.g. a job that is re-run under
+        the same ID), from the date partitions on or after `since` ("YYYY-MM-DD").
+        Returns the number of rows removed.
+        """
+        if not os.path.isdir(self.root):
+            return 0
+        own_file = re.compile(re.escape(scan_id) + r"-[0-9a-f]{8}\.parquet")
+        removed = 0
+        for day in os.listdir(self.root):
+            if not day.startswith("date=") or (since and day[5:] < str(since)):
+                continue
+            self._recover(os.path.join(self.root, day))
+            for folder in self._partitions(os.path.join(self.root, day)):
+                for f in _live_files(folder):
+                    path = os.path.join(folder, f)
+                    if own_file.fullmatch(f):
+                        removed += pq.read_metadata(path).num_rows
+                        os.remove(path)
+                    elif f.startswith("compacted-"):
+                        table = pq.read_table(path, schema=ARCHIVE_SCHEMA)
+                        kept = table.filter(pc.not_equal(table["scan_id"], scan_id))
+                        if len(kept) < len(table):
+                            removed += len(table) - len(kept)
+                            # Same name: the filtered file atomically replaces the old one
+                            _write_file(kept, folder, f)
+        return removed
+
+    def compact(self, date):
+        """
+        Merges each platform partition of one day into a single file (fewer, larger files scan faster).
+        The merged file is written to a hidden staging folder that is then swapped in for the
+        partition, so readers never see a row twice; a swap interrupted by a crash is finished
+        on the next compact / drop_scan.
+        """
+        day = os.path.join(self.root, f"date={date}")
+        if not os.path.isdir(day):
+            return 0
+        self._recover(day)
+        merged = 0
+        for folder in self._partitions(day):
+            files = _live_files(folder)
+            if len(files) < 2:
+                continue
+            table = pa.concat_tables([pq.read_table(os.path.join(folder, f), schema=ARCHIVE_SCHEMA) for f in files])
+            name = os.path.basename(folder)
+            staging, retired = os.path.join(day, f".{name}.staging"), os.path.join(day, f".{name}.retired")
+            shutil.rmtree(staging, ignore_errors=True)
+            os.makedirs(staging)
+            _write_file(table, staging, f"compacted-{uuid.uuid4().hex[:8]}.parquet")
+            with open(os.path.join(staging, MERGED_MANIFEST), "w", encoding="utf-8") as f:
+                f.write("\n".join(files))
+            os.replace(folder, retired)
+            os.replace(staging, folder)
+            self._retire(retired, folder)
+            merged += len(files)
+        return merged
+
+    def _partitions(self, day):
+        return [os.path.join(day, name) for name in os.listdir(day) if not name.startswith(".")]
+
+    def _retire(self, retired, folder):
+        # Files appended to the partition after it was read for compaction move to the live folder
+        manifest = os.path.join(folder, MERGED_MANIFEST)
+        with open(manifest, encoding="utf-8") as f:
+            merged = set(f.read().split("\n"))
+        for f in _live_files(retired):
+            if f not in merged:
+                os.replace(os.path.join(retired, f), os.path.join(folder, f))
+        shutil.rmtree(retired)
+        os.remove(manifest)
+
+    def _recover(self, day):
+        """ Finishes (or rolls back) a compaction swap that a crash interrupted. """
+        for name in os.listdir(day):
+            if not name.endswith(".retired"):
+                continue
+            partition = name[1:-len(".retired")]
+            retired, staging = os.path.join(day, name), os.path.join(day, f".{partition}.staging")
+            folder = os.path.join(day, partition)
+            if not os.path.exists(folder):
+                if not os.path.exists(staging):
+                    os.replace(retired, folder)
+                    continue
+                # Crashed between the two renames: the staged merge is complete
+                os.replace(staging, folder)
+            self._retire(retired, folder)
+        for name in os.listdir(day):
+            if name.endswith(".staging"):
+                # Crashed before the swap: the partition still holds the originals
+                shutil.rmtree(os.path.join(day, name))
+
+    # --- Reads ---
+
+    def partitions(self):
+        """ {"dates": [...], "platforms": [...]} available in the archive (from directory names only). """
+        dates, platforms = set(), set()
+        if os.path.isdir(self.root):
+            for day in os.listdir(self.root):
+                if not day.startswith("date="):
+                    continue
+                dates.add(day[5:])
+                for name in os.listdir(os.path.join(self.root, day)):
+                    if name.startswith("platform="):
+                        platforms.add(name[9:])
+        return {"dates": sorted(dates), "platforms": sorted(platforms)}
+
+    def load(self, columns=None, brands=None, platforms=None, start=None, end=None, sellers=None, as_arrow=False):
+        """
+        Loads archived rows. start / end are "YYYY-MM-DD" (inclusive) or dates;
+        date and platform filters prune partitions, brand / seller filters are
+        pushed down into the Parquet scan. Returns a DataFrame (or Arrow table).
+        """
+        if not os.path.isdir(self.root):
+            table = ARCHIVE_SCHEMA.empty_table()
+            return table if as_arrow else table.to_pandas()
+
+        conditions = []
+        if start:
+            conditions.append(ds.field("date") >= str(start))
+        if end:
+            conditions.append(ds.field("date") <= str(end))
+        if platforms:
+            conditions.append(ds.field("platform").isin([_partition_value(p) for p in platforms]))
+        if brands:
+            conditions.append(pc.field("brand").cast(pa.string()).isin(list(brands)))
+        if sellers:
+            conditions.append(pc.field("seller").cast(pa.string()).isin(list(sellers)))
+
+        expression = None
+        for c in conditions:
+            expression = c if expression is None else expression & c
+
+        table = self._dataset().to_table(columns=list(columns) if columns else None, filter=expression)
+        return table if as_arrow else table.to_pandas()
@@ -0,0 +1,298 @@
+"""
+Headless batch scanning for brand x domain matrices (nightly monitoring).
+
+Runs construct_search_url + detect_brand_products for every (brand, domain)
+pair, spread over worker processes, each running several connections in
+parallel. Product rows are streamed to JSONL or Parquet as soon as each
+chunk finishes, and a throughput summary is printed at the end.
+
+    python batch_scan.py --brands brands.txt --output results.jsonl --processes 4 --connections 8
+"""
+import argparse
+import concurrent.futures
+import json
+import os
+import sys
+import time
+import uuid
+
+import pandas as pd
+
+from engine import (
+    ScanConfig,
+    TRAFFIC,
+    construct_search_url,
+    detect_brand_products,
+    share_parse_cores,
+    summarize_domain_result
+)
+from history import ScanHistory
+from records import PRODUCT_COLUMNS
+from sellers import CANONICAL_SELLER, SELLER_ID, SellerRegistry
+
+DEFAULT_DOMAINS_FILE = "domain_config.json"
+BLOCKED_STATUSES = ("Blocked", "Blocked/Error")
+
+
+def read_list(path_or_csv):
+    """
+    Reads a list from a JSON array file, a newline-separated file,
+    or a comma-separated string.
+    """
+    if os.path.exists(path_or_csv):
+        with open(path_or_csv, "r", encoding="utf-8") as f:
+            content = f.read()
+        if content.lstrip().startswith("["):
+            return [str(x).strip() for x in json.loads(content) if str(x).strip()]
+        return [line.strip() for line in content.splitlines() if line.strip() and not line.startswith("#")]
+    return [x.strip() for x in path_or_csv.split(",") if x.strip()]
+
+
+def scan_pair(brand, domain, config):
+    """ One matrix cell: returns (summary, rows) with Brand/Scanned At columns added. """
+    search_url = construct_search_url(domain, brand)
+    try:
+        result = detect_brand_products(search_url, brand, config=config)
+    except Exception as e:
+        result = {"status": "Error", "details": str(e), "products": [], "scan_url": search_url}
+
+    summary, products = summarize_domain_result(domain, result)
+    scanned_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    summary["Brand"] = brand
+    rows = []
+    for p in products:
+        row = dict(p)
+        row["Brand"] = brand
+        row["Scan Status"] = result["status"]
+        row["Scanned At"] = scanned_at
+        rows.append(row)
+    return summary, rows
+
+
+def scan_chunk(pairs, options, connections):
+    """
+    Process-pool task: scans a chunk of (brand, domain) pairs with `connections`
+    threads. Also returns this process's cumulative traffic counters.
+    """
+    config = ScanConfig.from_options(options)
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [executor.submit(scan_pair, brand, domain, config) for brand, domain in pairs]
+        for future in concurrent.futures.as_completed(futures):
+            results.append(future.result())
+    return os.getpid(), TRAFFIC.snapshot(), results
+
+
+class JsonlSink:
+    def __init__(self, path):
+        self.f = sys.stdout if path == "-" else open(path, "w", encoding="utf-8")
+
+    def write(self, rows):
+        for row in rows:
+            self.f.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+        self.f.flush()
+
+    def close(self):
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+class ParquetSink:
+    """
+    Streams each chunk as a Parquet row group (requires pyarrow). Row groups share one schema,
+    so it is fixed up front: the report columns plus every column batch rows can carry, null
+    where a row lacks it (e.g. "Summary Only" rows).
+    """
+
+    # Text columns added to the report columns by scan_pair and the seller registry;
+    # the numeric ones (cluster size, normalized prices) are appended in __init__
+    EXTRA_COLUMNS = ("Brand", "Scan Status", "Scanned At", SELLER_ID, CANONICAL_SELLER)
+
+    def __init__(self, path):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            from dedup import CLUSTER_SIZE
+            from prices import PRICE_MAX, PRICE_MIN
+        except ImportError:
+            raise SystemExit("Parquet output requires pyarrow (pip install pyarrow)")
+        self.pa = pa
+        self.pq = pq
+        self.path = path
+        self.writer = None
+        numeric = {CLUSTER_SIZE: pa.int64(), PRICE_MIN: pa.float64(), PRICE_MAX: pa.float64()}
+        columns = PRODUCT_COLUMNS + self.EXTRA_COLUMNS + tuple(numeric)
+        self.schema = pa.schema([(col, numeric.get(col, pa.string())) for col in columns])
+        self.dropped = set()
+
+    def write(self, rows):
+        if not rows:
+            return
+        unknown = {key for row in rows for key in row} - set(self.schema.names) - self.dropped
+        if unknown:
+            print(f"Parquet output has no column for {', '.join(sorted(unknown))}: not written", file=sys.stderr)
+            self.dropped |= unknown
+        arrays = []
+        for field in self.schema:
+            values = [row.get(field.name) for row in rows]
+            if self.pa.types.is_string(field.type):
+                # Mixed raw price types (str/int) are stored as text
+                arrays.append(self.pa.array([None if v is None else str(v) for v in values], type=field.type))
+            else:
+                numbers = pd.to_numeric(pd.Series(values, dtype="object"), errors="coerce")
+                arrays.append(self.pa.array(numbers, type=field.type, from_pandas=True))
+        table = self.pa.Table.from_arrays(arrays, schema=self.schema)
+        if self.writer is None:
+            self.writer = self.pq.ParquetWriter(self.path, self.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer:
+            self.writer.close()
+
+
+def open_sink(path, fmt=None):
+    fmt = fmt or ("parquet" if path.endswith(".parquet") else "jsonl")
+    return ParquetSink(path) if fmt == "parquet" else JsonlSink(path)
+
+
+def open_archive():
+    """ The Parquet scan archive, or None (with a note) when pyarrow is missing. """
+    try:
+        from archive import ScanArchive
+    except ImportError:
+        print("pyarrow not installed: skipping the scan archive", file=sys.stderr)
+        return None
+    return ScanArchive()
+
+
+def run_batch(brands, domains, config, sink, processes=2, connections=4, on_progress=None, history=None, archive=None,
+              sellers=None):
+    """
+    Scans the full brand x domain matrix and writes every row to sink
+    (and, if given, to the ScanHistory / ScanArchive, one scan per brand).
+    With a SellerRegistry, rows get a canonical "Seller ID" and new sellers are registered.
+    Returns the throughput summary dict.
+    """
+    pairs = [(b, d) for b in brands for d in domains]
+    chunks = [pairs[i:i + connections] for i in range(0, len(pairs), connections)]
+    options = config.to_options()
+
+    batch_id = uuid.uuid4().hex[:8]
+    scan_ids = {brand: f"batch-{batch_id}-{i}" for i, brand in enumerate(brands)}
+    if history:
+        for brand in brands:
+            history.start_scan(scan_ids[brand], brand, domains, source="batch")
+
+    started = time.time()
+    traffic = {} # pid -> latest cumulative counters
+    scans = blocked = errors = product_count = 0
+
+    # Each worker process has its own parse pool (--parse-processes): split the cores between them
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, initializer=share_parse_cores,
+                                                initargs=(processes,)) as pool:
+        futures = [pool.submit(scan_chunk, chunk, options, connections) for chunk in chunks]
+        for future in concurrent.futures.as_completed(futures):
+            pid, counters, results = future.result()
+            if counters["bytes"] >= traffic.get(pid, {}).get("bytes", -1):
+                traffic[pid] = counters
+
+            for summary, rows in results:
+                scans += 1
+                if summary["Status"] in BLOCKED_STATUSES:
+                    blocked += 1
+                elif summary["Status"] == "Error":
+                    errors += 1
+                product_count += summary["ProductCount"]
+                if sellers:
+                    sellers.update_from_products(rows)
+                    sellers.tag_products(rows)
+                sink.write(rows)
+                if history:
+                    history.record_domain(scan_ids[summary["Brand"]], summary["Brand"], summary, rows)
+                if archive:
+                    archive.append(scan_ids[summary["Brand"]], summary["Brand"], summary["Domain"], rows)
+            if on_progress:
+                on_progress(scans, len(pairs))
+
+    if history:
+        for brand in brands:
+            history.finish_scan(scan_ids[brand])
+
+    elapsed = max(time.time() - started, 1e-9)
+    return {
+        "scans": scans,
+        "brands": len(brands),
+        "domains": len(domains),
+        "products": product_count,
+        "elapsed_seconds": round(elapsed, 1),
+        "scans_per_min": round(scans / elapsed * 60, 2),
+        "requests": sum(t["requests"] for t in traffic.values()),
+        "bytes": sum(t["bytes"] for t in traffic.values()),
+        "blocked": blocked,
+        "errors": errors,
+        "block_rate": round(blocked / scans, 4) if scans else 0.0
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Brand Guardian Pro headless batch scan")
+    parser.add_argument("--brands", required=True, help="Brand list file (one per line / JSON array) or comma-separated brands")
+    parser.add_argument("--domains", default=DEFAULT_DOMAINS_FILE, help="Domain list file or comma-separated domains (default: domain_config.json)")
+    parser.add_argument("--output", default="-", help="Output path (.jsonl or .parquet); '-' writes JSONL to stdout")
+    parser.add_argument("--format", choices=["jsonl", "parquet"], help="Override output format")
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 2, help="Worker processes")
+    parser.add_argument("--connections", type=int, default=4, help="Concurrent scans per process")
+    parser.add_argument("--deep-scan", action="store_true", help="Visit product pages to resolve sellers")
+    parser.add_argument("--deep-scan-source", choices=["product", "offers"], default="product")
+    parser.add_argument("--deep-scan-budget", type=float, default=None, help="Deep-scan seconds per domain")
+    parser.add_argument("--parse-processes", type=int, default=0, help="Parse pool size per worker process (0 = parse on the fetch thread)")
+    parser.add_argument("--force-refresh", action="store_true", help="Ignore shared results from recent scans")
+    parser.add_argument("--cookies", default="", help="Cookie header to send with search requests")
+    parser.add_argument("--no-history", action="store_true", help="Don't record results in the scan history database")
+    parser.add_argument("--no-archive", action="store_true", help="Don't append results to the Parquet scan archive")
+    parser.add_argument("--no-sellers", action="store_true", help="Don't resolve sellers against / update the seller registry")
+    parser.add_argument("--summary", help="Also write the throughput summary JSON to this path")
+    args = parser.parse_args(argv)
+
+    brands = read_list(args.brands)
+    domains = read_list(args.domains)
+    if not brands or not domains:
+        parser.error("Need at least one brand and one domain")
+
+    config = ScanConfig(
+        custom_cookies=args.cookies,
+        deep_scan=args.deep_scan,
+        deep_scan_source=args.deep_scan_source,
+        deep_scan_budget=args.deep_scan_budget,
+        parse_processes=args.parse_processes,
+        force_refresh=args.force_refresh
+    )
+
+    def progress(done, total):
+        print(f"\r{done}/{total} scans", end="", file=sys.stderr, flush=True)
+
+    sink = open_sink(args.output, args.format)
+    try:
+        history = None if args.no_history else ScanHistory()
+        archive = None if args.no_archive else open_archive()
+        sellers = None if args.no_sellers else SellerRegistry()
+        summary = run_batch(brands, domains, config, sink, args.processes, args.connections, progress, history, archive, sellers)
+    finally:
+        sink.close()
+
+    print(file=sys.stderr)
+    print(
+        f"{summary['scans']} scans in {summary['elapsed_seconds']}s ({summary['scans_per_min']} scans/min), "
+        f"{summary['products']} products, {summary['requests']} requests, {summary['bytes'] / 1e6:.1f} MB, "
+        f"block rate {summary['block_rate']:.1%}",
+        file=sys.stderr
+    )
+    if args.summary:
+        with open(args.summary, "w") as f:
+            json.dump(summary, f, indent=2)
+    return summary
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Near-duplicate benchmark: MinHash/LSH clustering of synthetic listing titles.
+
+    python bench_dedup.py                    # 200,000 rows, 20,000 distinct products
+    python bench_dedup.py --rows 1000000 --products 100000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from dedup import cluster_listings
+
+WORDS = (
+    "eau de parfum toilette spray perfume cologne gift set lipstick matte rouge serum cream "
+    "moisturizer mascara foundation palette bag wallet leather black red blue gold edition"
+).split()
+FILLER = ["", " New", " Sealed", " - Free Shipping", " Original", " (Authentic)"]
+SIZES = ["30ml", "50ml", "100ml", "150ml", "200ml"]
+
+
+def synthetic_titles(n, products, seed=0):
+    """ n titles, each a noisy copy of one of `products` base titles; returns (titles, product ids). """
+    rng = np.random.default_rng(seed)
+    bases = [
+        f"Brand{i % 500} " + " ".join(rng.choice(WORDS, 8, replace=False)) + f" {SIZES[i % len(SIZES)]}"
+        for i in range(products)
+    ]
+    ids = rng.integers(0, products, n)
+    titles = []
+    for i, pid in enumerate(ids):
+        title = bases[pid]
+        if rng.random() < 0.3:
+            # One word dropped
+            words = title.split()
+            del words[rng.integers(1, len(words) - 1)]
+            title = " ".join(words)
+        if rng.random() < 0.5:
+            title = title.upper() if rng.random() < 0.3 else title.replace("ml", " ml")
+        titles.append(title + FILLER[i % len(FILLER)])
+    return titles, ids
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark near-duplicate listing clustering")
+    parser.add_argument("--rows", type=int, default=200_000, help="Synthetic rows")
+    parser.add_argument("--products", type=int, default=20_000, help="Distinct products behind the rows")
+    args = parser.parse_args()
+
+    titles, ids = synthetic_titles(args.rows, args.products)
+    started = time.perf_counter()
+    labels = cluster_listings(titles)
+    elapsed = time.perf_counter() - started
+    print(f"cluster_listings: {elapsed:.2f}s  ({len(titles) / elapsed:,.0f} rows/sec)")
+
+    clusters = len(np.unique(labels))
+    # Every cluster should hold one product, and every product one cluster
+    pairs = np.unique(np.stack([labels, ids]), axis=1)
+    mixed = int((np.bincount(pairs[0]) > 1).sum())
+    print(f"{clusters:,} clusters for {len(np.unique(ids)):,} products ({mixed} clusters mixing products)")
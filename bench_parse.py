@@ -0,0 +1,70 @@
+"""
+Parse-stage benchmark: pages/sec vs. process count on the bundled fixtures.
+
+    python bench_parse.py               # 1, 2, 4 ... up to os.cpu_count()
+    python bench_parse.py --pages 96 --processes 1 4 16
+"""
+import argparse
+import concurrent.futures
+import multiprocessing
+import os
+import time
+
+from engine import parse_search_page
+
+# (fixture, url it was captured from, brand)
+FIXTURES = [
+    ("ebay_test.html", "https://www.ebay.com/sch/i.html?_nkw=Chanel", "Chanel"),
+    ("flipkart_test.html", "https://www.flipkart.com/search?q=Canon", "Canon"),
+    ("nykaa_test.html", "https://www.nykaa.com/search/result/?q=Chanel", "Chanel"),
+]
+
+
+def load_fixtures():
+    pages = []
+    for path, url, brand in FIXTURES:
+        with open(path, "rb") as f:
+            pages.append((f.read(), url, brand))
+    return pages
+
+
+def parse_one(page):
+    content, url, brand = page
+    return len(parse_search_page(content, url, brand, "utf-8")["rows"])
+
+
+def default_counts():
+    counts, n = [], 1
+    while n < (os.cpu_count() or 1):
+        counts.append(n)
+        n *= 2
+    counts.append(os.cpu_count() or 1)
+    return counts
+
+
+def bench(pages, total, processes):
+    work = [pages[i % len(pages)] for i in range(total)]
+    ctx = multiprocessing.get_context("spawn")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+        # Warm-up: start every worker and import the engine before timing
+        list(pool.map(parse_one, pages * processes))
+        started = time.perf_counter()
+        rows = sum(pool.map(parse_one, work))
+        elapsed = time.perf_counter() - started
+    return total / elapsed, rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the search-page parse stage")
+    parser.add_argument("--pages", type=int, default=48, help="Pages parsed per run")
+    parser.add_argument("--processes", type=int, nargs="+", help="Process counts to try")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    print(f"{len(pages)} fixtures, {sum(len(p[0]) for p in pages) / 1e6:.1f} MB, {os.cpu_count()} cores")
+
+    baseline = None
+    for n in args.processes or default_counts():
+        rate, rows = bench(pages, args.pages, n)
+        baseline = baseline or rate
+        print(f"{n:>3} processes: {rate:6.2f} pages/sec  x{rate / baseline:.2f}  ({rows} product rows)")
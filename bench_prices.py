@@ -0,0 +1,63 @@
+"""
+Price normalization benchmark: vectorized parse_prices vs. the per-row parser.
+
+    python bench_prices.py                      # 1,000,000 synthetic rows
+    python bench_prices.py --price-points 90000  # nearly every price string distinct
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from engine import parse_price_value
+from prices import parse_prices
+
+# Raw price shapes seen in extractor output, with their platform
+SAMPLES = [
+    ("₹{a:,}", "www.amazon.in"),
+    ("${a}.00 to ${b}.00", "www.ebay.com"),
+    ("{a}", "www.flipkart.com"),
+    ("N/A", "www.nykaa.com"),
+    ("{{'value': {a}, 'currency': 'INR'}}", "www.flipkart.com"),
+    ("US ${a}.99", "www.ebay.com"),
+    ("{a},00 €", "www.amazon.de"),
+    ("Rs. {a} - Rs. {b}", "www.nykaa.com"),
+    ("£{a}", "www.ebay.co.uk")
+]
+
+
+def synthetic_rows(n, price_points=2000, seed=0):
+    rng = np.random.default_rng(seed)
+    shapes = rng.integers(0, len(SAMPLES), n)
+    # Listings cluster on a limited set of price points (499, 1299 ...)
+    amounts = rng.choice(rng.integers(100, 99999, price_points), n)
+    prices, platforms = [], []
+    for shape, a in zip(shapes.tolist(), amounts.tolist()):
+        template, platform = SAMPLES[shape]
+        # Flipkart's Redux path yields bare numbers
+        prices.append(a if template == "{a}" else template.format(a=a, b=a * 2))
+        platforms.append(platform)
+    return pd.DataFrame({"Price": prices, "Platform": pd.Categorical(platforms)})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark batch price normalization")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Synthetic rows")
+    parser.add_argument("--price-points", type=int, default=2000, help="Distinct amounts in the synthetic data")
+    args = parser.parse_args()
+
+    df = synthetic_rows(args.rows, args.price_points)
+    print(f"{len(df):,} rows, {df['Price'].astype(str).nunique():,} distinct price strings")
+
+    started = time.perf_counter()
+    parsed = parse_prices(df["Price"], df["Platform"])
+    vectorized = time.perf_counter() - started
+    print(f"parse_prices:      {vectorized:6.2f}s  ({len(df) / vectorized:,.0f} rows/sec)")
+
+    started = time.perf_counter()
+    [parse_price_value(p) for p in df["Price"]]
+    per_row = time.perf_counter() - started
+    print(f"parse_price_value: {per_row:6.2f}s  (first amount only, no currency)")
+
+    print(f"{parsed['Price Min'].notna().mean():.1%} parsed, currencies: {parsed['Currency'].value_counts().to_dict()}")
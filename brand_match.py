@@ -0,0 +1,177 @@
+"""
+Compiled brand matcher shared by all extractors.
+
+Brand names and their aliases are normalized (Unicode NFKD, diacritics
+dropped, case-folded, punctuation split into tokens) and compiled once into
+an Aho-Corasick automaton over tokens, so a product title is matched against
+every brand of a portfolio in a single pass over its words.
+
+A title matches a brand when it contains the full brand phrase or an alias
+("L'Oréal Paris" ~ "loreal paris"), the phrase written as one word
+("Coca-Cola" ~ "CocaCola"), or, for multi-word brands, one of the
+significant words ("Hugo Boss" ~ "BOSS Bottled"), like the old per-extractor
+checks did.
+
+    matcher = compile_brands("Hugo Boss", aliases=["Boss Orange"])
+    matcher.matches("BOSS Bottled Eau de Toilette")   # True
+    compile_brands(["Chanel", "Dior"]).find("Dior Sauvage vs Chanel Bleu")   # {"Chanel": FULL, "Dior": FULL}
+"""
+import functools
+import re
+import unicodedata
+
+# Match strength
+FULL = 2 # whole brand phrase / alias
+PART = 1 # one significant word of a multi-word brand
+
+# Words shorter than this are not matched on their own
+MIN_PART_LENGTH = 3
+
+_COMBINING_MARKS = re.compile(r"[̀-ͯ]")
+_TOKEN = re.compile(r"\w+")
+
+
+def normalize_text(text):
+    """ Case-folded text without diacritics ("L’Oréal" -> "l’oreal"). """
+    text = unicodedata.normalize("NFKD", str(text))
+    return _COMBINING_MARKS.sub("", text).casefold()
+
+
+def tokenize(text):
+    # Punctuation separates tokens: "Chanel's" -> chanel, s; "L'Oréal" -> l, oreal
+    # (brands also match written as one word, so "Loreal" still finds "L'Oréal")
+    return _TOKEN.findall(normalize_text(text).replace("_", " "))
+
+
+def _glued(tokens):
+    """ Single letters split off by punctuation rejoined: l, oreal, paris -> loreal, paris. """
+    glued = []
+    pending = ""
+    for token in tokens:
+        if len(token) == 1:
+            pending += token
+        else:
+            glued.append(pending + token)
+            pending = ""
+    if pending:
+        if glued:
+            glued[-1] += pending
+        else:
+            glued.append(pending)
+    return tuple(glued)
+
+
+class BrandMatcher:
+    """
+    Token-level Aho-Corasick automaton over brand phrases.
+    brands: iterable of names, or {name: [aliases]}.
+    """
+
+    def __init__(self, brands):
+        if isinstance(brands, str):
+            brands = [brands]
+        if not isinstance(brands, dict):
+            brands = {name: () for name in brands}
+        self.brands = [name for name in brands if name and str(name).strip()]
+        self.aliases = {name: tuple(brands[name] or ()) for name in self.brands}
+
+        # Trie: goto[node] = {token: child}, out[node] = [(brand index, strength)]
+        self._goto = [{}]
+        self._out = [[]]
+        self._fail = [0]
+        for index, name in enumerate(self.brands):
+            for phrase in (name,) + self.aliases[name]:
+                tokens = tokenize(phrase)
+                for variant in {tuple(tokens), _glued(tokens)}:
+                    if not variant:
+                        continue
+                    self._add(variant, index, FULL)
+                    if len(variant) > 1:
+                        self._add(["".join(variant)], index, FULL)
+                        for token in variant:
+                            if len(token) >= MIN_PART_LENGTH:
+                                self._add([token], index, PART)
+        self._build()
+
+    @property
+    def primary(self):
+        """ The first brand (the scanned brand for single-brand scans). """
+        return self.brands[0] if self.brands else ""
+
+    def _add(self, tokens, index, strength):
+        node = 0
+        for token in tokens:
+            child = self._goto[node].get(token)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][token] = child
+                self._goto.append({})
+                self._out.append([])
+                self._fail.append(0)
+            node = child
+        self._out[node].append((index, strength))
+
+    def _build(self):
+        # Breadth-first failure links; outputs inherit the failure node's outputs
+        queue = list(self._goto[0].values())
+        while queue:
+            node = queue.pop(0)
+            for token, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and token not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(token, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def _scan(self, text):
+        goto, fail, out = self._goto, self._fail, self._out
+        node = 0
+        for token in tokenize(text):
+            while node and token not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(token, 0)
+            if out[node]:
+                yield from out[node]
+
+    def find(self, text, strength=PART):
+        """ {brand: strongest match} for every brand in text matching at least strength. """
+        found = {}
+        for index, match in self._scan(text or ""):
+            if match >= strength and match > found.get(index, 0):
+                found[index] = match
+        return {self.brands[i]: found[i] for i in sorted(found)}
+
+    def matches(self, text, strength=PART):
+        """ True if text mentions any of the brands. """
+        return any(match >= strength for _, match in self._scan(text or ""))
+
+    def best(self, text):
+        """ The brand with the strongest match in text (first brand on ties), or None. """
+        found = self.find(text)
+        return max(found, key=found.get) if found else None
+
+    def __reduce__(self):
+        # Rebuilt on unpickling (parse-pool workers, broker payloads)
+        return (BrandMatcher, ({name: list(self.aliases[name]) for name in self.brands},))
+
+    def __repr__(self):
+        return f"BrandMatcher({self.brands!r})"
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(brands, aliases):
+    return BrandMatcher({name: aliases if i == 0 else () for i, name in enumerate(brands)})
+
+
+def compile_brands(brands, aliases=()):
+    """
+    Cached matcher for a brand (or a list of brands); aliases belong to the
+    first brand. Built once per process for each distinct brand set.
+    """
+    if isinstance(brands, BrandMatcher):
+        return brands
+    if isinstance(brands, str):
+        brands = [b for b in (brands,) if b.strip()]
+    return _compile(tuple(brands), tuple(a for a in aliases if a and a.strip()))
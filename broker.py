@@ -0,0 +1,241 @@
+"""
+Task broker for distributed scanning.
+
+A coordinator publishes tasks (search pages, product pages) for a run;
+workers on any number of machines claim them, and push results back.
+Per-domain request slots are handed out by the broker as well, so every
+worker shares the same rate limit for a marketplace.
+
+Backends are pluggable and selected by URL scheme (see open_broker).
+The default SQLite backend needs nothing but a file every worker can
+reach, which also makes it easy to run several workers on one machine.
+"""
+import json
+import os
+import sqlite3
+import time
+
+from records import json_default
+
+DEFAULT_BROKER_URL = "sqlite:///scan_broker.db"
+
+# A claimed task is handed to another worker if not completed within its lease
+TASK_LEASE_SECONDS = 120
+MAX_ATTEMPTS = 3
+
+
+class Broker:
+    """
+    Backend interface. Tasks and results are plain JSON-serialisable dicts.
+    Claimed tasks: {"task_id", "run_id", "kind", "payload", "wait"} where wait is
+    the number of seconds to sleep before hitting the task's domain.
+    """
+
+    def publish(self, run_id, kind, payload, rate_key=None, rate_interval=0.0):
+        raise NotImplementedError
+
+    def claim(self, worker_id, lease=TASK_LEASE_SECONDS):
+        """ Returns the next task (see class docstring) or None. """
+        raise NotImplementedError
+
+    def complete(self, task, result):
+        raise NotImplementedError
+
+    def fail(self, task, error):
+        """ Records a failed attempt; the task is retried until MAX_ATTEMPTS. """
+        raise NotImplementedError
+
+    def results_since(self, run_id, after_seq=0):
+        """ Returns [(seq, kind, result)] in completion order. """
+        raise NotImplementedError
+
+    def purge(self, run_id):
+        """ Drops a finished run's tasks and results (they carry request secrets). """
+        raise NotImplementedError
+
+
+class SQLiteBroker(Broker):
+    """ File-backed broker. Safe to share across threads, processes and (via a shared path) hosts. """
+
+    def __init__(self, path="scan_broker.db"):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    rate_key TEXT,
+                    rate_interval REAL NOT NULL DEFAULT 0,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    created_at REAL NOT NULL,
+                    lease_until REAL,
+                    worker TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, task_id);
+                CREATE INDEX IF NOT EXISTS idx_tasks_run ON tasks (run_id);
+                CREATE TABLE IF NOT EXISTS results (
+                    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                    run_id TEXT NOT NULL,
+                    task_id INTEGER NOT NULL,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_results_run ON results (run_id, seq);
+                CREATE TABLE IF NOT EXISTS rate_limits (
+                    rate_key TEXT PRIMARY KEY,
+                    next_at REAL NOT NULL
+                );
+            """)
+
+    @classmethod
+    def from_url(cls, url):
+        # sqlite:///relative.db or sqlite:////absolute/path.db
+        return cls(url.split("://", 1)[1][1:] or "scan_broker.db")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def publish(self, run_id, kind, payload, rate_key=None, rate_interval=0.0):
+        with self._connect() as conn:
+            cur = conn.execute(
+                "INSERT INTO tasks (run_id, kind, payload, rate_key, rate_interval, status, created_at) "
+                "VALUES (?, ?, ?, ?, ?, 'queued', ?)",
+                (run_id, kind, json.dumps(payload, default=json_default), rate_key, rate_interval or 0.0, time.time())
+            )
+            return cur.lastrowid
+
+    def claim(self, worker_id, lease=TASK_LEASE_SECONDS):
+        """
+        Atomically claims the oldest runnable task, preferring domains whose
+        rate-limit slot is already open, and reserves that domain's next slot.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            now = time.time()
+            row = conn.execute(
+                "SELECT t.task_id, t.run_id, t.kind, t.payload, t.rate_key, t.rate_interval, t.attempts "
+                "FROM tasks t LEFT JOIN rate_limits r ON r.rate_key = t.rate_key "
+                "WHERE t.status = 'queued' OR (t.status = 'running' AND t.lease_until < ?) "
+                "ORDER BY COALESCE(r.next_at, 0) > ?, t.task_id LIMIT 1",
+                (now, now)
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            task_id, run_id, kind, payload, rate_key, rate_interval, attempts = row
+
+            if attempts >= MAX_ATTEMPTS:
+                # Lease expired too often (worker keeps dying on it): give up
+                conn.execute("UPDATE tasks SET status = 'failed' WHERE task_id = ?", (task_id,))
+                conn.execute(
+                    "INSERT INTO results (run_id, task_id, kind, payload) VALUES (?, ?, ?, ?)",
+                    (run_id, task_id, kind, json.dumps({"error": "Task abandoned by workers", "task": json.loads(payload)}))
+                )
+                conn.execute("COMMIT")
+                return self.claim(worker_id, lease)
+
+            wait = 0.0
+            if rate_key and rate_interval:
+                slot_row = conn.execute("SELECT next_at FROM rate_limits WHERE rate_key = ?", (rate_key,)).fetchone()
+                slot = max(now, slot_row[0] if slot_row else 0.0)
+                wait = slot - now
+                conn.execute(
+                    "INSERT OR REPLACE INTO rate_limits (rate_key, next_at) VALUES (?, ?)",
+                    (rate_key, slot + rate_interval)
+                )
+
+            conn.execute(
+                "UPDATE tasks SET status = 'running', worker = ?, attempts = attempts + 1, lease_until = ? WHERE task_id = ?",
+                (worker_id, now + wait + lease, task_id)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+        return {"task_id": task_id, "run_id": run_id, "kind": kind, "payload": json.loads(payload), "wait": wait}
+
+    def _finish(self, task, status, result):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cur = conn.execute(
+                "UPDATE tasks SET status = ? WHERE task_id = ? AND status = 'running'",
+                (status, task["task_id"])
+            )
+            # Only the first finisher reports (a slow worker may lose its lease)
+            if cur.rowcount:
+                conn.execute(
+                    "INSERT INTO results (run_id, task_id, kind, payload) VALUES (?, ?, ?, ?)",
+                    (task["run_id"], task["task_id"], task["kind"], json.dumps(result, default=json_default))
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def complete(self, task, result):
+        self._finish(task, "done", result)
+
+    def fail(self, task, error):
+        with self._connect() as conn:
+            attempts = conn.execute("SELECT attempts FROM tasks WHERE task_id = ?", (task["task_id"],)).fetchone()
+        if attempts and attempts[0] < MAX_ATTEMPTS:
+            with self._connect() as conn:
+                conn.execute(
+                    "UPDATE tasks SET status = 'queued', worker = NULL, lease_until = NULL WHERE task_id = ? AND status = 'running'",
+                    (task["task_id"],)
+                )
+            return
+        self._finish(task, "failed", {"error": str(error), "task": task["payload"]})
+
+    def results_since(self, run_id, after_seq=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, kind, payload FROM results WHERE run_id = ? AND seq > ? ORDER BY seq",
+                (run_id, after_seq)
+            ).fetchall()
+        return [(seq, kind, json.loads(payload)) for seq, kind, payload in rows]
+
+    def purge(self, run_id):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM tasks WHERE run_id = ?", (run_id,))
+            conn.execute("DELETE FROM results WHERE run_id = ?", (run_id,))
+
+    def pending(self, run_id=None):
+        """ Queued + running task count (for monitoring). """
+        with self._connect() as conn:
+            if run_id:
+                return conn.execute(
+                    "SELECT COUNT(*) FROM tasks WHERE run_id = ? AND status IN ('queued', 'running')", (run_id,)
+                ).fetchone()[0]
+            return conn.execute("SELECT COUNT(*) FROM tasks WHERE status IN ('queued', 'running')").fetchone()[0]
+
+
+# URL scheme -> Broker class with a from_url(url) classmethod
+BROKER_BACKENDS = {
+    "sqlite": SQLiteBroker
+}
+
+
+def register_broker(scheme, broker_cls):
+    """ Plugs in another backend (e.g. a Redis or AMQP broker) under a URL scheme. """
+    BROKER_BACKENDS[scheme] = broker_cls
+
+
+def open_broker(url=None):
+    """ Opens the broker for a URL such as sqlite:///scan_broker.db (default: $SCAN_BROKER_URL). """
+    url = url or os.environ.get("SCAN_BROKER_URL") or DEFAULT_BROKER_URL
+    scheme = url.split("://", 1)[0]
+    if scheme not in BROKER_BACKENDS:
+        raise ValueError(f"Unknown broker backend '{scheme}' (known: {', '.join(BROKER_BACKENDS)})")
+    return BROKER_BACKENDS[scheme].from_url(url)
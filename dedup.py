@@ -0,0 +1,395 @@
+"""
+Near-duplicate listing detection (MinHash + LSH banding).
+
+The same listing often comes back more than once: JSON-LD and the eBay DOM
+extractor both run on eBay pages, result pages overlap, and marketplaces
+reuse one title across platforms. Titles are canonicalized (accents,
+case and punctuation dropped, filler words removed, "100 ml" -> "100ml"), each
+distinct title gets a MinHash signature over its word shingles, and LSH
+banding turns signatures into bucket keys, so candidate pairs come from
+sorting keys instead of comparing every pair of rows (roughly linear in the
+number of rows). Candidates are confirmed on the estimated Jaccard
+similarity, then joined into clusters.
+
+Listings with different numbers in the title (sizes, model numbers), two
+different known sellers, or prices more than PRICE_TOLERANCE apart are
+never merged; nor are listings on one platform with different product IDs
+(canonical_product_key) while their seller is unknown: they may be
+different resellers, which only the deep scan can tell.
+
+Fuzzy merging is opt-in (fuzzy=True, e.g. the dashboard after seller
+resolution); by default only rows with the same product ID are merged, so
+the scan itself never hides a listing from the deep scan.
+
+    products = dedupe_products(products)                # same product ID: one row, "Cluster Size" on it
+    df = dedupe_frame(df, fuzzy=True)                   # near-duplicates too
+"""
+import itertools
+import zlib
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from prices import PRICE_MIN, parse_prices
+from sellers import SELLER_ID
+
+CLUSTER_SIZE = "Cluster Size"
+
+# Estimated Jaccard similarity of title shingles needed to merge two listings
+DEDUP_THRESHOLD = 0.7
+# 16 bands x 4 rows: pairs at the threshold become candidates with ~99.9% probability
+NUM_PERM = 64
+LSH_BANDS = 16
+
+# Marketing filler that differs between copies of one listing
+FILLER_WORDS = frozenset((
+    "a", "an", "and", "the", "for", "with", "of", "by", "in", "on", "to",
+    "new", "brand", "original", "authentic", "genuine", "sealed", "boxed",
+    "free", "shipping", "fast", "sale", "hot", "best", "seller", "official"
+))
+# Units glued to the number before them: "100 ml" -> "100ml"
+UNITS = frozenset(("ml", "l", "g", "kg", "mg", "oz", "fl", "lb", "cm", "mm", "m", "in", "gb", "tb", "pcs", "pc", "pack", "x"))
+
+_UNITS_RE = "|".join(sorted(UNITS, key=len, reverse=True))
+_FILLER_RE = "|".join(sorted(FILLER_WORDS))
+
+# Same title but prices further apart than this (relative): different products (e.g. sizes)
+PRICE_TOLERANCE = 0.1
+
+UNKNOWN_SELLERS = frozenset(("", "n/a", "-", "unknown", "none"))
+
+_SHINGLE_CHUNK = 1 << 18
+
+
+def canonical_titles(titles):
+    """
+    Canonical form ("tokens joined by spaces") of a batch of titles: diacritics
+    and punctuation dropped, lower-cased, filler removed, units glued to their
+    numbers. RE2 over the whole array (Arrow compute), like prices.parse_prices.
+    """
+    arr = pc.fill_null(pa.array(list(titles), type=pa.string(), from_pandas=True), "")
+    arr = pc.utf8_lower(pc.replace_substring_regex(pc.utf8_normalize(arr, "NFKD"), r"\p{Mn}+", ""))
+    # Tokens padded with two spaces each side, so neighbouring matches don't share a space
+    arr = pc.replace_substring_regex(arr, r"[^\p{L}\p{N}]+", "  ")
+    arr = pc.binary_join_element_wise("  ", arr, "  ", "")
+    arr = pc.replace_substring_regex(arr, rf"(\d)  +({_UNITS_RE}) ", r"\1\2 ")
+    arr = pc.replace_substring_regex(arr, rf" (?:{_FILLER_RE}) ", " ")
+    return pc.utf8_trim_whitespace(pc.replace_substring_regex(arr, " +", " ")).to_pylist()
+
+
+def canonical_title(name):
+    """ Title tokens with filler dropped and units glued to their numbers. """
+    return canonical_titles([name or ""])[0].split()
+
+
+def title_shingles(tokens):
+    """ Word unigrams + bigrams of a canonical title (repeats don't change a MinHash). """
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+def _numbers(tokens):
+    # Sizes / model numbers: listings that differ here are different products
+    return " ".join(sorted(t for t in tokens if not t.isalpha()))
+
+
+def _hash_permutations(num_perm, seed=1):
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, num_perm, dtype=np.uint64)
+    return a, b
+
+
+def minhash_signatures(shingle_sets, num_perm=NUM_PERM):
+    """
+    MinHash signatures (uint32, shape (len(shingle_sets), num_perm)) of collections of strings.
+    Each distinct shingle is hashed once; h_k(x) = high 32 bits of (a_k * x + b_k) mod 2^64.
+    Empty sets get all-0xFFFFFFFF signatures.
+    """
+    lengths = np.fromiter(map(len, shingle_sets), dtype=np.int64, count=len(shingle_sets))
+    flat, shingles = pd.factorize(pd.Series(list(itertools.chain.from_iterable(shingle_sets)), dtype="object"))
+    base = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles))
+    a, b = _hash_permutations(num_perm)
+    with np.errstate(over="ignore"):
+        # (num_perm, shingles): reducing along the contiguous axis is ~20x faster
+        permuted = ((a[:, None] * base[None, :] + b[:, None]) >> np.uint64(32)).astype(np.uint32)
+
+    signatures = np.full((len(shingle_sets), num_perm), np.iinfo(np.uint32).max, dtype=np.uint32)
+    starts = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+    rows = np.flatnonzero(lengths)
+    # Row chunks of ~_SHINGLE_CHUNK shingles keep the (num_perm x shingles) gather bounded
+    ends = starts[rows] + lengths[rows]
+    cuts = np.searchsorted(ends, np.arange(_SHINGLE_CHUNK, ends[-1] if len(ends) else 0, _SHINGLE_CHUNK))
+    for chunk in np.split(rows, cuts):
+        if not len(chunk):
+            continue
+        begin, end = starts[chunk[0]], starts[chunk[-1]] + lengths[chunk[-1]]
+        values = permuted.take(flat[begin:end], axis=1)
+        signatures[chunk] = np.minimum.reduceat(values, starts[chunk] - begin, axis=1).T
+    return signatures
+
+
+def _band_keys(signatures, bands, blocks):
+    """ One uint64 bucket key per (row, band); blocks (int codes) are mixed into every key. """
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    rng = np.random.default_rng(2)
+    weights = rng.integers(1, 1 << 63, (rows + 1,), dtype=np.uint64) | np.uint64(1)
+    keys = np.empty((bands, n), dtype=np.uint64)
+    with np.errstate(over="ignore"):
+        block_part = blocks.astype(np.uint64) * weights[-1]
+        for band in range(bands):
+            part = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+            keys[band] = (part * weights[:rows]).sum(axis=1) + block_part
+    return keys
+
+
+def _components(n, left, right):
+    """ Connected-component label (smallest member index) of every node, from edge arrays. """
+    labels = np.arange(n, dtype=np.int64)
+    if not len(left):
+        return labels
+    while True:
+        low = np.minimum(labels[left], labels[right])
+        before = labels.copy()
+        np.minimum.at(labels, left, low)
+        np.minimum.at(labels, right, low)
+        # Pointer jumping: labels only ever point at smaller indices
+        while True:
+            jumped = labels[labels]
+            if np.array_equal(jumped, labels):
+                break
+            labels = jumped
+        if np.array_equal(before, labels):
+            return labels
+
+
+def cluster_signatures(signatures, blocks=None, threshold=DEDUP_THRESHOLD, bands=LSH_BANDS):
+    """
+    Cluster label (smallest member index) per signature row.
+    Rows only join when they share an LSH bucket in some band, are in the same
+    block (int codes) and agree on at least threshold of their MinHash values.
+    """
+    n = len(signatures)
+    if n < 2:
+        return np.arange(n, dtype=np.int64)
+    blocks = np.zeros(n, dtype=np.int64) if blocks is None else np.asarray(blocks, dtype=np.int64)
+    empty = (signatures == np.iinfo(np.uint32).max).all(axis=1)
+
+    left, right = [], []
+    for keys in _band_keys(signatures, bands, blocks):
+        # First row of each bucket is its leader; every other member is a candidate pair
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        leader = first[inverse]
+        candidates = np.flatnonzero((leader != np.arange(n)) & ~empty)
+        if not len(candidates):
+            continue
+        others = leader[candidates]
+        similar = (signatures[candidates] == signatures[others]).mean(axis=1) >= threshold
+        left.append(candidates[similar])
+        right.append(others[similar])
+
+    if not left:
+        return np.arange(n, dtype=np.int64)
+    return _components(n, np.concatenate(left), np.concatenate(right))
+
+
+def _split_clusters(labels, groups):
+    """
+    Splits clusters whose rows fall into different groups (int codes, -1 = unknown):
+    one cluster per group, unknown rows join the cluster's most common group.
+    """
+    frame = pd.DataFrame({"label": labels, "group": groups})
+    known = frame[frame["group"] >= 0]
+    if not known.groupby("label")["group"].nunique().gt(1).any():
+        return labels
+    counts = known.groupby(["label", "group"]).size().rename("n").reset_index()
+    dominant = counts.sort_values(["label", "n"], ascending=[True, False], kind="stable").drop_duplicates("label")
+    dominant = dominant.set_index("label")["group"]
+    filled = frame["group"].where(frame["group"] >= 0, frame["label"].map(dominant).fillna(-1).astype(np.int64))
+    # New label: smallest row index per (cluster, group)
+    return _first_rows(frame.assign(group=filled).groupby(["label", "group"], sort=False).ngroup().to_numpy())
+
+
+def _seller_codes(sellers):
+    cleaned = pd.Series([str(s).strip().casefold() if not pd.isna(s) else "" for s in sellers], dtype="object")
+    codes, _ = pd.factorize(cleaned.where(~cleaned.isin(UNKNOWN_SELLERS), None))
+    return codes.astype(np.int64)
+
+
+def _price_groups(labels, prices, currencies=None):
+    """
+    Price band per row within its cluster (-1 = no price): sorted by price, a new band
+    starts at every gap wider than PRICE_TOLERANCE, or at a different currency.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    currency_codes = np.zeros(len(prices), dtype=np.int64) if currencies is None else pd.factorize(
+        pd.Series(list(currencies), dtype="object"), use_na_sentinel=False
+    )[0]
+    priced = np.flatnonzero(~np.isnan(prices))
+    order = priced[np.lexsort((prices[priced], currency_codes[priced], labels[priced]))]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = (
+        (labels[order[1:]] != labels[order[:-1]])
+        | (currency_codes[order[1:]] != currency_codes[order[:-1]])
+        | (prices[order[1:]] > prices[order[:-1]] * (1 + PRICE_TOLERANCE))
+    )
+    groups = np.full(len(prices), -1, dtype=np.int64)
+    groups[order] = np.cumsum(starts) - 1
+    return groups
+
+
+def _first_rows(groups):
+    """ Smallest row index of each row's group. """
+    first = np.full(groups.max() + 1 if len(groups) else 0, len(groups), dtype=np.int64)
+    np.minimum.at(first, groups, np.arange(len(groups)))
+    return first[groups]
+
+
+def _listing_groups(labels, sellers, platforms, keys):
+    """
+    Listing rank per row within its (cluster, platform), -1 for rows that can merge with any:
+    rows with an unknown seller and a product key keep different keys of one platform apart.
+    """
+    unknown = _seller_codes(sellers) < 0 if sellers is not None else np.ones(len(labels), dtype=bool)
+    key_codes, _ = pd.factorize(pd.Series(list(keys), dtype="object"))
+    platform_codes, _ = pd.factorize(pd.Series(list(platforms), dtype="object"), use_na_sentinel=False)
+    eligible = np.flatnonzero(unknown & (key_codes >= 0))
+    groups = np.full(len(labels), -1, dtype=np.int64)
+    if len(eligible):
+        frame = pd.DataFrame({"label": labels[eligible], "platform": platform_codes[eligible], "key": key_codes[eligible]})
+        # First key of each platform in a cluster -> 0, second -> 1, ...: rank 0 rows of
+        # different platforms still merge, two product IDs of one platform never do
+        ranks = frame.groupby(["label", "platform"], sort=False)["key"].rank(method="dense")
+        groups[eligible] = ranks.to_numpy(dtype=np.int64) - 1
+    return groups
+
+
+def cluster_listings(titles, sellers=None, prices=None, currencies=None, platforms=None, keys=None,
+                     threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM, bands=LSH_BANDS):
+    """
+    Near-duplicate cluster label per listing (label = index of the cluster's first row).
+    Titles are clustered once per distinct canonical title; clusters are then split
+    by known seller, by price band (prices: numbers, NaN = unknown) and, given platforms
+    and product keys (None = no key), by product ID among unknown-seller rows of a platform.
+    """
+    codes, uniques = pd.factorize(pd.Series(list(titles), dtype="object").fillna(""), use_na_sentinel=False)
+    canonical_codes, distinct = pd.factorize(pd.Series(canonical_titles(uniques), dtype="object"))
+    tokens = [t.split() for t in distinct]
+
+    signatures = minhash_signatures([title_shingles(t) for t in tokens], num_perm)
+    number_codes, _ = pd.factorize(pd.Series([_numbers(t) for t in tokens], dtype="object"))
+    title_labels = cluster_signatures(signatures, number_codes, threshold=threshold, bands=bands)
+
+    labels = _first_rows(title_labels[canonical_codes[codes]])
+    # Rows without a usable title are never merged
+    untitled = np.flatnonzero(np.asarray([not t for t in tokens], dtype=bool)[canonical_codes[codes]])
+    labels[untitled] = untitled
+    if sellers is not None:
+        labels = _split_clusters(labels, _seller_codes(sellers))
+    if prices is not None:
+        labels = _split_clusters(labels, _price_groups(labels, prices, currencies))
+    if keys is not None and platforms is not None:
+        labels = _split_clusters(labels, _listing_groups(labels, sellers, platforms, keys))
+    return labels
+
+
+def _key_labels(keys):
+    """ Cluster label per row: rows with the same product key together, rows without one alone. """
+    codes, _ = pd.factorize(pd.Series(list(keys), dtype="object"))
+    labels = np.arange(len(codes), dtype=np.int64)
+    keyed = codes >= 0
+    if keyed.any():
+        labels[keyed] = np.flatnonzero(keyed)[_first_rows(codes[keyed])]
+    return labels
+
+
+def _product_keys(urls):
+    # Imported here: engine imports this module lazily, from its parse workers
+    from engine import canonical_product_key
+    return [canonical_product_key(str(u)) if isinstance(u, str) else None for u in urls]
+
+
+def _representatives(labels, scores):
+    """ (representative index per cluster, cluster of each representative): best score, then first row. """
+    order = np.lexsort((np.arange(len(labels)), -scores, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order[1:]] != labels[order[:-1]]
+    reps = np.sort(order[first])
+    return reps, labels[reps]
+
+
+def _cluster_rows(names, sellers, urls, prices, platforms, currencies, weights, threshold, fuzzy):
+    """
+    Clusters listing columns; returns (representative indices in row order, their
+    cluster sizes). The representative is the copy with the most details.
+    """
+    parsed = parse_prices(prices, platforms, currencies)
+    price_min = parsed[PRICE_MIN].to_numpy(dtype=np.float64)
+    keys = _product_keys(urls)
+    if fuzzy:
+        labels = cluster_listings(
+            names, sellers, price_min, parsed["Currency"].astype(object), platforms, keys, threshold
+        )
+    else:
+        labels = _key_labels(keys)
+
+    seller_codes = _seller_codes(sellers)
+    has_url = np.array(["http" in str(u) for u in urls], dtype=bool)
+    scores = 2 * (seller_codes >= 0) + has_url + ~np.isnan(price_min)
+    reps, clusters = _representatives(labels, scores.astype(np.int64))
+    sizes = np.bincount(labels, weights=weights, minlength=len(labels))
+    return reps, sizes[clusters].astype(np.int64)
+
+
+def dedupe_products(products, fuzzy=False, threshold=DEDUP_THRESHOLD):
+    """
+    One product row per product ID (fuzzy: per near-duplicate cluster), in page order;
+    each kept row's CLUSTER_SIZE (set in place) is the number of rows it stands for;
+    sizes of rows that were already deduplicated add up. Summary rows are kept as they are.
+    """
+    listings = [i for i, p in enumerate(products) if p["Detection Method"] != "Summary Only"]
+    if len(listings) < 2:
+        return list(products)
+    rows = [products[i] for i in listings]
+    reps, sizes = _cluster_rows(
+        [p["Product Name"] for p in rows], [p["Seller"] for p in rows], [p["Product URL"] for p in rows],
+        [p["Price"] for p in rows], [p["Platform"] for p in rows], [p["Currency"] for p in rows],
+        [p.get(CLUSTER_SIZE) or 1 for p in rows], threshold, fuzzy
+    )
+    keep = set()
+    for rep, size in zip(reps.tolist(), sizes.tolist()):
+        rows[rep][CLUSTER_SIZE] = size
+        keep.add(listings[rep])
+    listing_set = set(listings)
+    return [p for i, p in enumerate(products) if i in keep or i not in listing_set]
+
+
+def dedupe_frame(df, fuzzy=False, threshold=DEDUP_THRESHOLD):
+    """
+    Copy of a product frame with one row per product ID (fuzzy: per near-duplicate cluster)
+    and a CLUSTER_SIZE column. Uses the resolved "Seller ID" when the frame has one.
+    """
+    if df.empty or "Product Name" not in df.columns:
+        return df
+    listings = (df["Detection Method"] != "Summary Only").to_numpy() if "Detection Method" in df.columns else np.ones(len(df), dtype=bool)
+    rows = df[listings]
+
+    def column(name):
+        return rows[name].astype(object).tolist() if name in rows.columns else [None] * len(rows)
+
+    weights = rows[CLUSTER_SIZE].fillna(1).to_numpy(dtype=np.float64) if CLUSTER_SIZE in rows.columns else np.ones(len(rows))
+    seller = SELLER_ID if SELLER_ID in rows.columns else "Seller"
+    reps, sizes = _cluster_rows(
+        column("Product Name"), column(seller), column("Product URL"), column("Price"),
+        column("Platform"), column("Currency"), weights, threshold, fuzzy
+    )
+    positions = np.flatnonzero(listings)[reps]
+    keep = ~listings
+    keep[positions] = True
+    all_sizes = np.ones(len(df), dtype=np.int64)
+    all_sizes[positions] = sizes
+    df = df.copy()
+    df[CLUSTER_SIZE] = all_sizes
+    return df[keep]
@@ -0,0 +1,347 @@
+"""
+Distributed scanning over a task broker (see broker.py).
+
+The coordinator publishes one "search" task per (brand, domain, page).
+Workers, on this or any other machine, fetch and parse the search page and
+publish a "product" task for every row that needs a deep-scan visit; the
+coordinator folds search and product results back into per-domain results,
+emitting the same events as engine.scan_domains. Requests to a domain are
+spaced by ScanConfig.request_interval across ALL workers.
+
+    python distributed.py worker --broker sqlite:////shared/scan_broker.db   # on each node
+    python distributed.py scan --brand Chanel --domains amazon.in,ebay.com --pages 3
+
+Scans started from the dashboard or scan_brand use this mode when
+ScanConfig.broker_url is set.
+"""
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+import uuid
+from urllib.parse import urlparse
+
+from broker import DEFAULT_BROKER_URL, open_broker
+from dedup import dedupe_products
+from records import ProductRecord, json_default
+from engine import (
+    ScanConfig,
+    apply_cached_details,
+    construct_offer_listing_url,
+    construct_search_url,
+    enrich_scan_result,
+    expand_offer_rows,
+    fetch_offer_listing,
+    fetch_product_details,
+    fetch_search_page,
+    get_product_cache,
+    plan_deep_scan,
+    run_parse,
+    store_cached_details
+)
+
+POLL_SECONDS = 0.5
+# Coordinator gives up on a run with no progress for this long (e.g. no workers running)
+STALL_TIMEOUT = 600
+
+
+def rate_key(url):
+    return urlparse(url).netloc.lower()
+
+
+# --- Worker side ---
+
+def run_search_task(broker, task):
+    """ Fetches + parses one search page and queues deep-scan visits for its rows. """
+    p = task["payload"]
+    config = ScanConfig.from_options(p["options"])
+    url = construct_search_url(p["domain"], p["brand"], p["page"])
+
+    content, encoding, error_result = fetch_search_page(url, config)
+    if error_result:
+        return {"domain": p["domain"], "page": p["page"], "result": error_result, "product_tasks": 0}
+
+    parsed = run_parse(content, url, p["brand"], encoding, config)
+    result = enrich_scan_result(parsed, url, p["brand"], config, deep_scan=False)
+
+    product_tasks = 0
+    products = result["products"]
+    if config.deep_scan and result["status"] == "Found" and products:
+        # Visits still queued past the budget are dropped unfetched (the coordinator stops waiting too)
+        deadline = time.time() + config.deep_scan_budget if config.deep_scan_budget else None
+        cache = get_product_cache() if config.use_cache else None
+        ordered, skipped = plan_deep_scan(products, p["brand"], cache, config.deep_scan_max_items, config.deep_scan_source)
+        for i in ordered:
+            offers = config.deep_scan_source == "offers" and construct_offer_listing_url(products[i]["Product URL"]) is not None
+            if cache and not offers and apply_cached_details(cache, products[i]):
+                continue
+            broker.publish(
+                task["run_id"], "product",
+                {
+                    "domain": p["domain"], "page": p["page"], "index": i, "brand": p["brand"],
+                    "url": products[i]["Product URL"], "offers": offers, "use_cache": config.use_cache,
+                    "deadline": deadline
+                },
+                rate_key=rate_key(products[i]["Product URL"]),
+                rate_interval=config.request_interval
+            )
+            product_tasks += 1
+
+    return {"domain": p["domain"], "page": p["page"], "result": result, "product_tasks": product_tasks}
+
+
+def run_product_task(broker, task):
+    """ Resolves seller/availability (or the offers view) for one product row. """
+    p = task["payload"]
+    result = {"domain": p["domain"], "page": p["page"], "index": p["index"], "seller": None, "availability": None, "offers": None}
+    if p.get("deadline") and time.time() > p["deadline"]:
+        result["expired"] = True
+        return result
+    if p["offers"]:
+        offers = fetch_offer_listing(p["url"], p["brand"])
+        if offers:
+            result["offers"] = offers
+            return result
+
+    seller, availability = fetch_product_details(p["url"], p["brand"])
+    result["seller"], result["availability"] = seller, availability
+    if p["use_cache"]:
+        store_cached_details(get_product_cache(), p["url"], seller, availability)
+    return result
+
+
+TASK_HANDLERS = {
+    "search": run_search_task,
+    "product": run_product_task
+}
+
+
+def run_worker(broker_url=None, poll_interval=POLL_SECONDS, once=False):
+    """ Worker loop: claim tasks from the broker until stopped (or until idle with once=True). """
+    broker = open_broker(broker_url)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    print(f"Distributed worker {worker_id} polling {broker_url or DEFAULT_BROKER_URL}")
+    while True:
+        task = broker.claim(worker_id)
+        if not task:
+            if once:
+                return
+            time.sleep(poll_interval)
+            continue
+
+        # Shared per-domain rate limit: the broker reserved our slot
+        if task["wait"] > 0:
+            time.sleep(task["wait"])
+
+        started = time.time()
+        try:
+            result = TASK_HANDLERS[task["kind"]](broker, task)
+            result["worker"] = worker_id
+            result["elapsed"] = round(time.time() - started, 3)
+            broker.complete(task, result)
+        except Exception as e:
+            print(f"[{worker_id}] {task['kind']} task {task['task_id']} failed: {e}")
+            broker.fail(task, e)
+
+
+# --- Coordinator side ---
+
+def merge_pages(domain, pages):
+    """ Combines the per-page results of one domain into a single domain result. """
+    ordered = [pages[n] for n in sorted(pages)]
+    # Result pages overlap: one row per product ID across all pages
+    products = dedupe_products([row for page in ordered for row in page["products"]])
+    found = [page for page in ordered if page["status"].startswith("Found")]
+    first = found[0] if found else ordered[0]
+    details = first["details"] if len(ordered) == 1 else f"{len(ordered)} pages: " + "; ".join(
+        f"p{n} {pages[n]['status']} ({len(pages[n]['products'])})" for n in sorted(pages)
+    )
+    return {
+        "status": first["status"],
+        "details": details,
+        "products": products,
+        "scan_url": ordered[0]["scan_url"],
+        "deep_scan": None
+    }
+
+
+def distributed_scan_domains(domains, brand_name, emit, config=None, broker=None):
+    """
+    Drop-in replacement for engine.scan_domains that runs on broker workers.
+    Emits deep_row / domain / pipeline events like scan_domains and returns per-task-kind stats.
+    """
+    config = config or ScanConfig()
+    broker = broker or open_broker(config.broker_url)
+    run_id = uuid.uuid4().hex[:12]
+    pages_per_domain = max(int(config.search_pages), 1)
+    options = config.to_options()
+    options["broker_url"] = "" # Workers scan locally
+
+    for domain in domains:
+        for page in range(1, pages_per_domain + 1):
+            broker.publish(
+                run_id, "search",
+                {"domain": domain, "brand": brand_name, "page": page, "options": options},
+                rate_key=rate_key(construct_search_url(domain, brand_name, page)),
+                rate_interval=config.request_interval
+            )
+
+    page_results = {d: {} for d in domains} # domain -> page -> result
+    outstanding = {d: pages_per_domain for d in domains} # search + product tasks still open
+    deadlines = {} # domain -> end of its deep-scan budget, from its first queued visit
+    finished = set()
+    stats = {kind: {"stage": kind, "processed": 0, "errors": 0, "busy_seconds": 0.0, "workers": set()} for kind in ("search", "product")}
+
+    def stats_rows():
+        return [
+            {
+                "stage": s["stage"],
+                "workers": len(s["workers"]),
+                "processed": s["processed"],
+                "errors": s["errors"],
+                "avg_service_ms": round(s["busy_seconds"] / s["processed"] * 1000, 1) if s["processed"] else 0.0,
+                "busy_seconds": round(s["busy_seconds"], 2),
+                "queue_depth": broker.pending(run_id)
+            }
+            for s in stats.values()
+        ]
+
+    def finish(domain, error=None, note=None):
+        finished.add(domain)
+        if error and not page_results[domain]:
+            result = {"status": "Error", "details": error, "products": [], "scan_url": construct_search_url(domain, brand_name)}
+        else:
+            result = merge_pages(domain, page_results[domain])
+            if note:
+                result["details"] += note
+        emit({"type": "domain", "domain": domain, "result": result})
+
+    def finish_expired(now):
+        # Deep-scan budget reached: report what has resolved, drop the visits still open
+        for domain, deadline in deadlines.items():
+            if domain not in finished and now > deadline:
+                finish(domain, note=f" [Deep Scan: time budget reached, {outstanding[domain]} visits dropped]")
+
+    # Product results can overtake the search result that queued them
+    early = {} # (domain, page) -> [product results]
+
+    def apply_result(kind, result):
+        task = result.get("task", result)
+        domain, page = task["domain"], task["page"]
+        if domain in finished:
+            return
+
+        if kind == "search":
+            if "error" in result:
+                page_results[domain][page] = {
+                    "status": "Error", "details": result["error"], "products": [],
+                    "scan_url": construct_search_url(domain, brand_name, page)
+                }
+            else:
+                page_results[domain][page] = result["result"]
+                result["result"]["products"] = [ProductRecord.from_mapping(p) for p in result["result"]["products"]]
+                outstanding[domain] += result["product_tasks"]
+                if result["product_tasks"] and config.deep_scan_budget:
+                    deadlines.setdefault(domain, time.time() + config.deep_scan_budget)
+        elif page not in page_results[domain]:
+            early.setdefault((domain, page), []).append(result)
+            return
+        elif "error" not in result and not result.get("expired"):
+            rows = page_results[domain][page]["products"]
+            index = task["index"]
+            if result["offers"]:
+                # First offer updates the listing row, every other seller becomes a new row
+                expanded = expand_offer_rows(rows[index], result["offers"])
+                rows[index] = expanded[0]
+                rows.extend(expanded[1:])
+            else:
+                if result["seller"] and result["seller"] != "N/A":
+                    rows[index]["Seller"] = result["seller"]
+                if result["availability"] and result["availability"] != "Unknown":
+                    rows[index]["Availability"] = result["availability"]
+            emit({"type": "deep_row", "domain": domain, "index": f"{page}:{index}", "product": dict(rows[index])})
+
+        outstanding[domain] -= 1
+        if kind == "search":
+            for pending_result in early.pop((domain, page), []):
+                apply_result("product", pending_result)
+        if outstanding[domain] == 0 and domain not in finished:
+            finish(domain)
+
+    cursor = 0
+    last_progress = last_report = time.time()
+    try:
+        while len(finished) < len(domains):
+            batch = broker.results_since(run_id, cursor)
+            now = time.time()
+            finish_expired(now)
+            if len(finished) == len(domains):
+                break
+            if not batch:
+                if now - last_progress > STALL_TIMEOUT:
+                    for domain in domains:
+                        if domain not in finished:
+                            finish(domain, "Timed out waiting for distributed workers")
+                    break
+                if now - last_report > 2:
+                    emit({"type": "pipeline", "stages": stats_rows()})
+                    last_report = now
+                time.sleep(POLL_SECONDS)
+                continue
+            last_progress = now
+
+            for seq, kind, result in batch:
+                cursor = seq
+                s = stats[kind]
+                s["processed"] += 1
+                s["busy_seconds"] += result.get("elapsed", 0.0)
+                if result.get("worker"):
+                    s["workers"].add(result["worker"])
+                if "error" in result:
+                    s["errors"] += 1
+                apply_result(kind, result)
+    finally:
+        broker.purge(run_id)
+
+    final = stats_rows()
+    emit({"type": "pipeline", "stages": final})
+    return final
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Brand Guardian Pro distributed scanning")
+    parser.add_argument("--broker", default=None, help=f"Broker URL (default: $SCAN_BROKER_URL or {DEFAULT_BROKER_URL})")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    worker_cmd = sub.add_parser("worker", help="Consume scan tasks")
+    worker_cmd.add_argument("--once", action="store_true", help="Exit when the broker is idle")
+
+    scan_cmd = sub.add_parser("scan", help="Coordinate one brand scan and print the results as JSON")
+    scan_cmd.add_argument("--brand", required=True)
+    scan_cmd.add_argument("--domains", required=True, help="Comma-separated domains")
+    scan_cmd.add_argument("--pages", type=int, default=1, help="Search result pages per domain")
+    scan_cmd.add_argument("--interval", type=float, default=1.0, help="Min seconds between requests to one domain")
+    scan_cmd.add_argument("--deep-scan", action="store_true")
+    args = parser.parse_args(argv)
+
+    if args.command == "worker":
+        run_worker(args.broker, once=args.once)
+        return
+
+    from engine import scan_brand
+    config = ScanConfig(
+        broker_url=args.broker or os.environ.get("SCAN_BROKER_URL") or DEFAULT_BROKER_URL,
+        search_pages=args.pages,
+        request_interval=args.interval,
+        deep_scan=args.deep_scan
+    )
+    domains = [d.strip() for d in args.domains.split(",") if d.strip()]
+    result = scan_brand(args.brand, domains, config)
+    json.dump(result, sys.stdout, indent=2, default=json_default, ensure_ascii=False)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,2357 @@
+"""
+Brand Guardian Pro scanning engine.
+
+Everything needed to fetch search/product pages, extract products and run
+deep scans, with no dependency on Streamlit. All run-time settings come in
+through an immutable ScanConfig, so scans can run in a Streamlit session,
+a job worker, a process pool or on another machine alike.
+
+    from engine import ScanConfig, scan_brand
+    result = scan_brand("Chanel", ["amazon.in", "ebay.com"], ScanConfig(deep_scan=True))
+"""
+from curl_cffi import requests
+import extruct
+from bs4 import BeautifulSoup
+import time
+import json
+import re
+from urllib.parse import quote, urlparse, unquote, parse_qs
+import google.generativeai as genai
+import concurrent.futures
+import multiprocessing
+import os
+import asyncio
+import threading
+import codecs
+import hashlib
+import random
+import statistics
+from dataclasses import dataclass, asdict, fields
+
+from product_cache import ProductDetailsCache
+from scan_cache import ScanResultCache, SCAN_RESULT_TTL
+from records import ProductRecord, PRODUCT_COLUMNS
+from brand_match import compile_brands
+from pipeline import Pipeline, Stage, STAGE_QUEUE_SIZE
+
+# --- Configuration & Constants ---
+DEFAULT_IMPERSONATE_PROFILES = ("chrome120", "chrome110", "safari15_3", "edge101")
+SEARCH_TIMEOUT = 20
+DOMAIN_WORKERS = 5
+
+# Deep Scan: streaming product-page fetch limits
+PRODUCT_PAGE_CHUNK_SIZE = 16 * 1024
+PRODUCT_PAGE_MAX_BYTES = 1024 * 1024 # Hard cap for the full-body fallback
+PRODUCT_PAGE_CONTAINER_WINDOW = 20000 # Chars parsed around a known container
+
+# Known product-page containers, in priority order (Amazon buybox variants first)
+SELLER_CONTAINER_IDS = [
+    "merchant-info",
+    "tabular-buybox",
+    "buybox-accordion",
+    "exports_desktop_qualifiedBuybox_buyNow_feature_div",
+    "fresh-merchant-info",
+    "n3_buybox"
+]
+AVAILABILITY_CONTAINER_IDS = [
+    "availability",
+    "availabilityInsideBuyBox_feature_div",
+    "outOfStock"
+]
+
+# Deep Scan planner
+DEEP_SCAN_MAX_ITEMS = 50
+DEEP_SCAN_WORKERS = 5
+
+# Relative likelihood of unauthorized resellers per marketplace (0 - 1)
+MARKETPLACE_RISK = {
+    "ebay": 1.0,
+    "depop": 1.0,
+    "amazon": 0.6,
+    "flipkart": 0.6,
+    "nykaa": 0.3
+}
+DEFAULT_MARKETPLACE_RISK = 0.5
+
+# Seller-mix sampling
+SAMPLING_TARGET_MARGIN = 0.05
+SAMPLING_CONFIDENCE = 0.95
+SAMPLING_BATCH_SIZE = 10
+SAMPLING_MAX_SAMPLES = 200
+
+@dataclass(frozen=True)
+class ScanConfig:
+    """
+    Immutable settings for one scan. Safe to share across threads and to
+    ship to other processes (see to_options / from_options).
+    """
+    custom_cookies: str = ""
+    google_api_key: str = ""
+    impersonate_profiles: tuple = DEFAULT_IMPERSONATE_PROFILES
+    request_timeout: int = SEARCH_TIMEOUT
+    domain_workers: int = DOMAIN_WORKERS
+    use_cache: bool = True
+    # Deep Scan
+    deep_scan: bool = False
+    deep_scan_source: str = "product" # "product" or "offers"
+    deep_scan_budget: float = None # Seconds per domain, None = no limit
+    deep_scan_max_items: int = DEEP_SCAN_MAX_ITEMS
+    # Seller-mix sampling
+    estimate_seller_mix: bool = False
+    authorized_sellers: tuple = ()
+    sampling_target_margin: float = SAMPLING_TARGET_MARGIN
+    # Parse stage: 0 = parse on the fetch thread, N = process pool of N workers
+    parse_processes: int = 0
+    # Scan pipeline (domain_workers = fetch stage threads)
+    classify_workers: int = 2
+    extract_workers: int = 2
+    enrich_workers: int = DOMAIN_WORKERS
+    stage_queue_size: int = STAGE_QUEUE_SIZE
+    # Distributed mode (see distributed.py): "" = scan in this process
+    broker_url: str = ""
+    search_pages: int = 1 # Result pages per domain (distributed mode)
+    request_interval: float = 1.0 # Min seconds between requests to one domain, shared by all workers
+    # Shared scan results: identical scans within the TTL (or in flight) are served once
+    result_cache_ttl: float = SCAN_RESULT_TTL # 0 = disabled
+    force_refresh: bool = False
+    # Other names the scanned brand is listed under (matched like the brand itself)
+    brand_aliases: tuple = ()
+
+    def to_options(self):
+        """ Plain JSON-serialisable dict (e.g. for the job store). """
+        return asdict(self)
+
+    @classmethod
+    def from_options(cls, options):
+        """ Rebuilds a config from to_options() output, ignoring unknown keys. """
+        known = {f.name for f in fields(cls)}
+        values = {k: v for k, v in (options or {}).items() if k in known}
+        for key in ("impersonate_profiles", "authorized_sellers", "brand_aliases"):
+            if key in values and values[key] is not None:
+                values[key] = tuple(values[key])
+        return cls(**values)
+
+
+class TrafficStats:
+    """
+    Process-wide network counters (requests made, body bytes received).
+    Thread-safe; snapshot() values only ever grow.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes = 0
+
+    def record(self, nbytes):
+        with self._lock:
+            self.requests += 1
+            self.bytes += nbytes
+
+    def snapshot(self):
+        with self._lock:
+            return {"requests": self.requests, "bytes": self.bytes}
+
+TRAFFIC = TrafficStats()
+
+# --- AI Extraction Logic ---
+def extract_with_gemini(text_content, domain, brand_name):
+    """
+    Uses Google Gemini 1.5 Flash to intelligently extract product data from raw text.
+    """
+    try:
+        model = genai.GenerativeModel('gemini-1.5-flash')
+        prompt = f"""
+        You are a product extraction expert. Analyze the following text content from a search result page on {domain} for the brand "{brand_name}".
+        
+        Extract a list of products that match the brand "{brand_name}".
+        Ignore "Sponsored" or "Recommended" items if they are clearly for other brands.
+        
+        For each product, extract:
+        - name: The full product title.
+        - price: The price with currency symbol.
+        - seller: The name of the seller or store (e.g. "Sold by XYZ", "Visit the ABC Store"). If implied to be the brand itself, use "{brand_name}".
+        - url: The product URL (relative or absolute). If not found, use "".
+        
+        Return ONLY valid JSON in the following format:
+        [
+            {{
+                "name": "Product Name",
+                "price": "$100",
+                "seller": "Seller Name",
+                "url": "/link/to/product"
+            }}
+        ]
+        
+        If no products found, return [].
+        
+        search_result_page_content_start:
+        {text_content[:30000]} 
+        search_result_page_content_end
+        """
+        
+        response = model.generate_content(prompt)
+        text_resp = response.text.strip()
+        
+        # Clean markdown
+        if text_resp.startswith("```json"):
+            text_resp = text_resp.replace("```json", "").replace("```", "")
+            
+        data = json.loads(text_resp)
+        normalized = []
+        for item in data:
+            # Post-process URL
+            u = item.get('url', '')
+            if u and not u.startswith('http'):
+                if u.startswith('/'):
+                    u = f"https://{domain}{u}"
+                else:
+                    u = f"https://{domain}/{u}"
+            
+            normalized.append(normalize_product_data({
+                "name": item.get('name'),
+                "price": item.get('price'),
+                "seller": item.get('seller', 'N/A'),
+                "url": u or f"https://{domain}",
+                "method": "AI Vision (Text)"
+            }, domain))
+            
+        return normalized
+        
+    except Exception as e:
+        print(f"Gemini Extraction Error: {e}")
+        return []
+
+# --- Helper Functions ---
+
+def construct_search_url(domain, brand_name, page=1):
+    """
+    Dynamically generates the search URL based on the domain.
+    page > 1 requests that page of the results.
+    """
+    brand_encoded = quote(brand_name)
+    
+    # Ensure protocol
+    if not domain.startswith("http"):
+        base_url = f"https://{domain}"
+    else:
+        base_url = domain
+    
+    # Clean domain for matching
+    domain_clean = urlparse(base_url).netloc.lower()
+    
+    # Domain specific logic
+    if "amazon" in domain_clean:
+         # Force www for Amazon to reduce redirects/bot checks
+        if "www." not in base_url:
+            base_url = base_url.replace("://", "://www.")
+        url, page_param = f"{base_url}/s?k={brand_encoded}", "page"
+    elif "nykaa" in domain_clean:
+        url, page_param = f"https://www.nykaa.com/search/result/?q={brand_encoded}", "page_no"
+    elif "flipkart" in domain_clean:
+         url, page_param = f"{base_url}/search?q={brand_encoded}", "page"
+    elif "ebay" in domain_clean:
+        url, page_param = f"https://www.ebay.com/sch/i.html?_nkw={brand_encoded}", "_pgn"
+    else:
+        # Default fallback
+        url, page_param = f"{base_url}/search?q={brand_encoded}", "page"
+
+    if page and page > 1:
+        url += f"&{page_param}={int(page)}"
+    return url
+
+def canonical_product_key(product_url):
+    """
+    Maps a product URL to (marketplace, product_id) so the same listing is
+    recognised across scans regardless of tracking parameters.
+    Returns None for URLs that don't point at a product.
+    """
+    if not product_url or "http" not in product_url:
+        return None
+    parsed = urlparse(product_url)
+    marketplace = parsed.netloc.lower()
+    if marketplace.startswith("www."):
+        marketplace = marketplace[4:]
+    if not marketplace:
+        return None
+
+    # Amazon: ASIN (also inside sponsored /sspa/click?url=... redirects)
+    if "amazon" in marketplace:
+        match = re.search(r"/(?:dp|gp/product|gp/aw/d|exec/obidos/ASIN)/([A-Z0-9]{10})", unquote(product_url))
+        if match:
+            return marketplace, match.group(1)
+    # eBay: item number
+    elif "ebay" in marketplace:
+        match = re.search(r"/itm/(?:[^/?]+/)?(\d{9,})", parsed.path)
+        if match:
+            return marketplace, match.group(1)
+    # Flipkart: pid query parameter
+    elif "flipkart" in marketplace:
+        pid = parse_qs(parsed.query).get("pid")
+        if pid:
+            return marketplace, pid[0]
+    # Nykaa: numeric id after /p/
+    elif "nykaa" in marketplace:
+        match = re.search(r"/p/(\d+)", parsed.path)
+        if match:
+            return marketplace, match.group(1)
+
+    # Generic: path without query/fragment
+    path = parsed.path.rstrip("/")
+    if not path:
+        return None
+    return marketplace, path
+
+def listing_key(product):
+    """ Canonical product ID of a row ("marketplace:id"), falling back to platform + name. """
+    key = canonical_product_key(product["Product URL"])
+    if key:
+        return f"{key[0]}:{key[1]}"
+    return f"name:{product['Platform']}:{str(product['Product Name']).strip().lower()}"
+
+def normalize_product_data(item, source_domain):
+    """ Standardize product record from various sources """
+    return ProductRecord(
+        platform=source_domain,
+        name=item.get("name", "Unknown Product"),
+        price=item.get("price", "N/A"),
+        currency=item.get("priceCurrency", ""),
+        seller=item.get("seller", "N/A"), # Often hard to get on search pages
+        availability=item.get("availability", "Unknown"), # e.g. InStock
+        condition=item.get("condition", ""), # e.g. New / Used (offer listings)
+        url=item.get("url", "N/A"),
+        method=item.get("method", "Generic")
+    )
+
+def brand_filter(brand_name, matcher=None):
+    """
+    Product-title predicate for the extractors, compiled once per brand set
+    (see brand_match.py). No brand = keep every product.
+    """
+    matcher = matcher or compile_brands(brand_name or ())
+    return matcher.matches if matcher.brands else (lambda name: True)
+
+def extract_from_json_ld(json_ld, domain, brand_name=None, matcher=None):
+    """
+    Extracts product list from Schema.org ItemList or Product definitions.
+    """
+    products = []
+    is_brand = brand_filter(brand_name, matcher)
+    
+    def parse_single_product(node):
+        # Flatten Schema.org product object
+        name = node.get("name")
+        image = node.get("image")
+        url = node.get("url")
+
+        # Brand Filter
+        if name and not is_brand(name):
+             return # Skip this product
+
+        # Offers (Price/Availability)
+        offers = node.get("offers", {})
+        # Offers can be a list or dict
+        if isinstance(offers, list) and offers:
+            offers = offers[0] # Take first offer
+        
+        price = offers.get("price")
+        currency = offers.get("priceCurrency")
+        availability = offers.get("availability", "").replace("http://schema.org/", "")
+        
+        seller = offers.get("seller", {}).get("name") if isinstance(offers.get("seller"), dict) else "N/A"
+        
+        # Fallback seller from brand name if explicit seller missing
+        if seller == "N/A" and brand_name and name and brand_name.lower() in name.lower():
+             seller = brand_name.title()
+        
+        if name:
+             products.append(normalize_product_data({
+                "name": name,
+                "price": price,
+                "priceCurrency": currency,
+                "availability": availability,
+                "seller": seller,
+                "url": url,
+                "method": "JSON-LD"
+             }, domain))
+
+    # Search for ItemList or Direct Products
+    # Recursive search helper could be useful but we look for specific types
+    def recursive_find_products(node):
+        if isinstance(node, dict):
+            if node.get("@type") in ["Product", "Offer"]:
+                parse_single_product(node)
+            # Handle ItemList
+            elif node.get("@type") == "ItemList" and "itemListElement" in node:
+                for item in node["itemListElement"]:
+                    recursive_find_products(item)
+                    # Sometimes item is just a wrapper like ListItem with 'item' property
+                    if isinstance(item, dict) and "item" in item:
+                         recursive_find_products(item["item"])
+            else:
+                for k, v in node.items():
+                    recursive_find_products(v)
+        elif isinstance(node, list):
+            for item in node:
+                recursive_find_products(item)
+
+    recursive_find_products(json_ld)
+    return products
+
+
+def identify_availability(card):
+    """
+    Identifies availability status from a product card or page.
+    """
+    text = card.get_text(separator=" ", strip=True).lower()
+    
+    # Positive signals
+    if re.search(r"\bin stock\b", text):
+        return "In Stock"
+    if re.search(r"\bonly \d+ left\b", text):
+        return "Low Stock"
+    if re.search(r"\bavailable\b", text):
+        return "Available"
+        
+    # Negative signals
+    if re.search(r"\bout of stock\b", text):
+        return "Out of Stock"
+    if re.search(r"\bcurrently unavailable\b", text):
+        return "Unavailable"
+    if re.search(r"\bsold out\b", text):
+        return "Sold Out"
+        
+    return "Unknown"
+
+def identify_seller_from_card(card, domain, brand_name):
+    """
+    Advanced Logic to identify the Transacting Entity (Seller).
+    Priorities:
+    1. Text nodes following 'Sold by', 'Merchant', etc.
+    2. Hyperlinks to Storefronts/Profiles.
+    3. Proximity to Price (implied by card structure).
+    """
+    seller_candidates = []
+    text_nodes = list(card.stripped_strings)
+    
+    # Regex Extraction (Priority 1 - Visual Scanning)
+    # "See through" the page text for common patterns
+    full_text = " ".join(text_nodes)
+    regex_patterns = [
+        # Priority 1: Stop before "and Fulfilled" or similar common separators
+        r"(?i)(?:sold by|seller|courtesy of|merchant|importer|marketed by)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+?)(?=\s+(?:and|is|ships|fulfilled|payment)|$)",
+        # Priority 2: Standard greedy match (fallback)
+        r"(?i)(?:sold by|seller|courtesy of|merchant|importer|marketed by)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+)",
+        r"(?i)(?:brand)[\s:-]+([A-Za-z0-9\s&'\.\-\(\),_]+)"
+    ]
+    
+    for pattern in regex_patterns:
+        match = re.search(pattern, full_text)
+        if match:
+            candidate = match.group(1).strip()
+            # Validation: Seller name shouldn't be too long or garbage
+            if 2 < len(candidate) < 60:
+                 # Clean up common garbage at the end of strings
+                 candidate = re.sub(r"(?i)(\d+(\.\d+)?\s?(stars?|ratings?|reviews?))", "", candidate).strip()
+                 # Clean up colors in parentheses (e.g. "(Black)", "(Grey)")
+                 candidate = re.sub(r"(?i)\s*\((black|grey|gray|white|blue|red|green|silver|gold)\)", "", candidate).strip()
+                 
+                 candidate_lower = candidate.lower()
+                 
+                 # --- FIX for "Seller Name Seller Name Sold by..." and "Name Name" ---
+                 # 1. Internal Keyword Cleanup
+                 for kw in ["sold by", "ships from", "distributed by"]:
+                      if kw in candidate_lower:
+                           idx = candidate_lower.find(kw)
+                           if idx > 2: # Ignore if it's at the very start
+                                candidate = candidate[:idx].strip()
+                                candidate_lower = candidate.lower()
+                                
+                 # 2. Deduplication check (e.g. "Cocoblu Retail Cocoblu Retail")
+                 words = candidate.split()
+                 if len(words) >= 4 and len(words) % 2 == 0:
+                      mid = len(words) // 2
+                      first_half = " ".join(words[:mid])
+                      second_half = " ".join(words[mid:])
+                      if first_half.lower() == second_half.lower():
+                           candidate = first_half
+                           candidate_lower = candidate.lower() # update
+                 
+                 # 0. WORD COUNT CHECK (Sellers are rarely > 6 words, Titles are long)
+                 if len(candidate.split()) > 6:
+                      continue
+
+                 # 1. START-OF-STRING BLOCKERS (Garbage text phrases)
+                 if candidate_lower.startswith(("who offers", "that you chose", "items that", "customers who", "ozone")):
+                      # Blocking "Ozone" starting match IF it's long (likely a title), but allow if short (official seller)
+                      if "ozone" in candidate_lower and len(candidate.split()) > 3:
+                           continue
+                      if candidate_lower.startswith(("who offers", "that you chose", "items that", "customers who")):
+                           continue
+
+                 # 2. SUBSTRING BLOCKERS (Common non-seller keywords)
+                 # Note: "plan" matching "Plantex" and "protection" matching generally. "protection plan" is safer.
+                 block_list_substrings = [
+                     "amazon", "available", "more buying", "details", 
+                     "installation", "add to cart", "warranty",
+                     "protection plan", "service", "get it", "tomorrow",
+                     "free delivery", "days", "replacement", "dispatched",
+                     "customer service", "that you chose", "often"
+                 ]
+                 
+                 if any(w in candidate_lower for w in block_list_substrings):
+                      continue
+                      
+                 # 3. EXACT WORD BLOCKERS (Strict blocking for short common words)
+                 block_list_exact = ["cart", "plan", "here", "brand", "unknown"]
+                 if candidate_lower in block_list_exact:
+                      continue
+
+                 return candidate.title()
+    
+    # Text Analysis (Priority 2)
+    seller_triggers = [
+        "sold by", "merchant", "importer", "vendor", "shop name", 
+        "fulfilled by", "distributed by", "dispatcher", "by "
+    ]
+    
+    # text_nodes already defined above
+    
+    for i, text in enumerate(text_nodes):
+        text_lower = text.lower()
+        
+        # 0. Direct Brand Match (DTC/Brand Check)
+        # If the brand name appears in a short text node (likely a label), assume Brand is Seller
+        if brand_name and len(text) < 50:
+             # Check for "By [Brand]" or just "[Brand]"
+             if text_lower == brand_name.lower() or text_lower == f"by {brand_name.lower()}":
+                 return brand_name.title()
+             # If brand name is in the text but not exact match, check if it looks like a brand label
+             if brand_name.lower() in text_lower:
+                  # Avoid catching the Title as the Seller
+                  # Heuristic: If text is short and contains brand, it might be "Visit the Chanel Store" or "Brand: Chanel" being split
+                  if "brand" in text_lower:
+                       return brand_name.title()
+
+        for trigger in seller_triggers:
+            if trigger in text_lower:
+                # Case A: "Sold by: SellerName"
+                if len(text) > len(trigger) + 2:
+                    candidate = text_lower.split(trigger)[-1].strip(": -").title()
+                # Case B: "Sold by" ...next node... "SellerName" (handled in next iteration effectively)
+                elif i + 1 < len(text_nodes):
+                    candidate = text_nodes[i+1].strip()
+                else:
+                    candidate = None
+                
+                if candidate:
+                    # Clean garbage again
+                    candidate = re.sub(r"(?i)(\d+(\.\d+)?\s?(stars?|ratings?|reviews?))", "", candidate).strip()
+                    if len(candidate) > 60: continue 
+                    # Filter out platform names UNLESS they are explicitly the seller (e.g. "Sold by Amazon")
+                    # If text says "Sold by Amazon", we KEEP it.
+                    # The previous logic excluded them. User wants "Transacting Entity".
+                    # If valid name, return it.
+                    return candidate
+
+
+    # Link Analysis (Priority 3)
+    links = card.find_all("a", href=True)
+    main_link_href = None
+    if links: main_link_href = links[0]['href']
+        
+    for link in links:
+        href = link['href']
+        text = link.get_text(strip=True)
+        if not text: continue
+        
+        if href == main_link_href: continue
+        
+        # Heuristics for seller links (Generic + Specific Platforms)
+        href_lower = href.lower()
+        
+        # eBay users/stores
+        if "ebay" in domain and ("/usr/" in href_lower or "/str/" in href_lower):
+             return text
+             
+        # Amazon stores
+        if "amazon" in domain and ("/ws/" in href_lower or "/stores/" in href_lower):
+             return text
+             
+        # Generic "Store" links
+        if "store" in text.lower() or "seller" in href_lower or "profile" in href_lower or "shop" in href_lower:
+            clean_text = text.replace("Visit the", "").replace("Store", "").strip()
+            return clean_text
+            
+    # Final Fallback: If we assume DTC (Direct to Consumer) site structure
+    # The domain itself might be the seller if no other info found
+    # But for marketplaces (Amazon/eBay), we return N/A if we can't find a 3rd party
+    # Final Fallback: If we assume DTC (Direct to Consumer) site structure
+    if brand_name and brand_name.lower() in domain:
+        return brand_name.title()
+
+    # User Request: Explicitly attribute to Brand if brand name appears in text
+    # This acts as a catch-all to prevent "N/A" when the brand is mentioned.
+    if brand_name:
+         # Check if brand name is in the full text of the card
+         full_text = " ".join(text_nodes).lower()
+         if brand_name.lower() in full_text:
+              return brand_name.title()
+
+    return "N/A"
+
+def extract_from_ebay_dom(soup, domain, brand_name, matcher=None):
+    products = []
+    is_brand = brand_filter(brand_name, matcher)
+    # eBay list view or grid view
+    # Common container: ul.srp-results or ul.b-list__items_nofooter
+    items = []
+    ul = soup.select_one("ul.srp-results, ul.b-list__items_nofooter")
+    if ul:
+        items = ul.find_all("li", recursive=False)
+    
+    if not items:
+         # Fallback to search all s-item (generic)
+         items = soup.find_all(class_="s-item")
+    
+    for item in items:
+        try:
+            # Skip "Shop on eBay" pseudo items
+            classes = item.get("class", [])
+            if "s-item__pl-on-bottom" in classes: continue
+            
+            # Title
+            # Could be s-item__title, s-card__title, or just h3
+            title_tag = item.select_one(".s-item__title, .s-card__title, h3.s-item__title")
+            if not title_tag:
+                 # Try finding just text in the first link?
+                 link = item.select_one("a")
+                 if link and len(link.get_text(strip=True)) > 10:
+                      pass # Potential candidate, but let's stick to title classes first
+                 else:
+                      continue
+            else:
+                 pass
+            
+            if not title_tag: continue
+            name = title_tag.get_text(strip=True)
+            if "Shop on eBay" in name: continue
+            
+            # Price
+            price_tag = item.select_one(".s-item__price, .s-card__price")
+            price = price_tag.get_text(strip=True) if price_tag else "N/A"
+            
+            # Link
+            link_tag = item.select_one("a.s-item__link, a.s-card__link, a")
+            url = link_tag.get("href") if link_tag else ""
+            
+            # Seller
+            seller = "N/A"
+            seller_tag = item.select_one(".s-item__seller-info-text, .s-item__seller-info")
+            if seller_tag:
+                 seller = seller_tag.get_text(strip=True)
+            
+            # Robust Brand Check
+            if not is_brand(name):
+                 # Maybe allow if valid structure but missed name match?
+                 # For now, strict but allow if we found a valid price
+                 if price == "N/A": continue
+                 pass 
+            
+            products.append(normalize_product_data({
+                "name": name,
+                "price": price,
+                "seller": seller,
+                "url": url,
+                "method": "eBay DOM"
+            }, domain))
+        except: continue
+        
+    return products
+
+def extract_from_hidden_data(soup, domain, brand_name, matcher=None):
+    """
+    Extracts data from <script> tags:
+    1. Manual JSON-LD parsing (backup to extruct)
+    2. Redux/State variables (window.__PRELOADED_STATE__)
+    """
+    products = []
+    is_brand = brand_filter(brand_name, matcher)
+    
+    # 1. Manual JSON-LD
+    scripts = soup.find_all('script', type='application/ld+json')
+    for script in scripts:
+        if not script.string: continue
+        try:
+            data = json.loads(script.string)
+            # JSON-LD can be a list or dict
+            if isinstance(data, list):
+                products.extend(extract_from_json_ld(data, domain, brand_name, matcher))
+            else:
+                products.extend(extract_from_json_ld([data], domain, brand_name, matcher))
+        except:
+            pass
+            
+    if products: return products
+
+    # 2. State Variables (Nykaa, Flipkart, etc.)
+    # Look for scripts containing specific keywords
+    state_scripts = soup.find_all('script')
+    for script in state_scripts:
+        if not script.string: continue
+        content = script.string
+        
+        # Nykaa / General Redux
+        if "window.__PRELOADED_STATE__" in content or "window.__INITIAL_STATE__" in content:
+            try:
+                # Extract JSON string: variable = { ... }
+                # Regex to grab the JSON object, using DOTALL for multi-line support
+                match = re.search(r"window\.__[A-Z_]+__\s*=\s*({.*});?", content, re.DOTALL)
+                if match:
+                    json_str = match.group(1)
+                    # Often ends with ; or similar, simple cleanup
+                    if json_str.endswith(";"): json_str = json_str[:-1]
+                    
+                    try:
+                        data = json.loads(json_str)
+                        print(f"DEBUG APP: Successfully loaded JSON for {domain}. Keys: {list(data.keys())[:5]}")
+                        
+                        # Direct Slot Extraction for Flipkart (bypass recursion limits)
+                        if 'pageDataV4' in data:
+                             print("DEBUG APP: Using Flipkart pageDataV4 specific extraction")
+                             pdata = data.get('pageDataV4', {}).get('page', {}).get('data', {})
+                             for slot_key, slot_val in pdata.items():
+                                  if isinstance(slot_val, list):
+                                       for widget in slot_val:
+                                            # Pattern 1: widget.widget.data.products (e.g. Recently Viewed)
+                                            ws = widget.get('widget', {}).get('data', {}).get('products', [])
+                                            
+                                            # Pattern 2: element.productInfo (Main Search Results)
+                                            # slot items might be just wrappers passed as 'widget'
+                                            if not ws and 'widget' in widget and 'data' in widget['widget']:
+                                                  # Sometimes results are in 'data' directly if it's a specific widget type?
+                                                  pass
+                                            
+                                            # Checking specific known structure from debug file:
+                                            # Slot lists contain dictionary items which have 'productInfo' inside 'element' or top level
+                                            
+                                            candidates = []
+                                            if isinstance(widget, dict):
+                                                 # Try direct productInfo
+                                                 if 'productInfo' in widget:
+                                                      candidates.append(widget)
+                                                 # Try nested in element
+                                                 elif 'element' in widget and 'productInfo' in widget['element']:
+                                                      candidates.append(widget['element'])
+                                                 
+                                            # Also check if slot_val itself is a list of product-like items?
+                                            # In debug file: "10003": [ { "productInfo": {...} }, ... ]
+                                            
+                                            for item in candidates:
+                                                p_info = item.get('productInfo', {}).get('value', {})
+                                                titles = p_info.get('titles', {})
+                                                pricing = p_info.get('pricing', {})
+                                                
+                                                name = titles.get('title')
+                                                price = None
+                                                if pricing:
+                                                     price = pricing.get('finalPrice', {}).get('value')
+                                                
+                                                # Fallback price from array
+                                                if not price and pricing and 'prices' in pricing:
+                                                     for p_opt in pricing['prices']:
+                                                          if not p_opt.get('strikeOff'):
+                                                               price = p_opt.get('value')
+                                                               break
+                                                
+                                                if name and price:
+                                                     # Brand check
+                                                     if is_brand(name):
+                                                          # URL
+                                                          slug = p_info.get('baseUrl')
+                                                          url = f"https://{domain}{slug}" if slug else ""
+                                                          
+                                                          products.append(normalize_product_data({
+                                                              "name": name,
+                                                              "price": price,
+                                                              "seller": "N/A",
+                                                              "url": url,
+                                                              "method": "Flipkart Redux V4"
+                                                          }, domain))
+
+                    except Exception as e:
+                        print(f"DEBUG APP: Failed to load JSON from {domain}: {e}")
+                        continue
+                    
+                    # Search recursively for KEYWORDS-based extraction (Backup)
+                    # Heuristic: Objects with 'name', 'price', 'imageUrl' or 'sku'
+                    
+                    def find_products_in_state(node, depth=0):
+                        found = []
+                        if depth > 100: return found # Safety
+                        if isinstance(node, dict):
+                             # Check if this node is a product
+                             # Nykaa: 'name', 'finalPrice', 'slug'
+                             # Flipkart: 'titles': {'title': '...'}, 'pricing': {'finalPrice':...}
+                             
+                             name = node.get('name') or node.get('title')
+                             if not name and 'titles' in node and isinstance(node['titles'], dict):
+                                  name = node['titles'].get('title')
+                             
+                             price = node.get('price') or node.get('finalPrice') or node.get('offerPrice') or node.get('displayPrice') or node.get('listingPrice')
+                             # Flipkart deeper nesting for price
+                             if not price and 'pricing' in node and isinstance(node['pricing'], dict):
+                                  price = node['pricing'].get('finalPrice', {}).get('value') or node['pricing'].get('displayPrice', {}).get('value')
+                             
+                             # Formatting price
+                             if isinstance(price, int) or isinstance(price, float): price = str(price)
+                             if isinstance(price, dict): price = str(price) # Fallback if price is complex object
+                             
+                             slug = node.get('slug') or node.get('productUrl')
+                             
+                             if name and price:
+                                  # Validate Brand (relaxed: any significant brand word counts)
+                                  if is_brand(name):
+                                      url = ""
+                                      if slug: 
+                                          url = f"https://{domain}/{slug}" if not slug.startswith("http") else slug
+                                      
+                                      found.append(normalize_product_data({
+                                          "name": name,
+                                          "price": price,
+                                          "seller": "N/A", # State usually has seller buried deeper, assume N/A for now
+                                          "url": url,
+                                          "method": "Hidden State (Redux)"
+                                      }, domain))
+                                        
+                             # Recurse
+                             for k, v in node.items():
+                                 found.extend(find_products_in_state(v, depth+1))
+                                 
+                        elif isinstance(node, list):
+                            for item in node:
+                                found.extend(find_products_in_state(item, depth+1))
+                        return found
+
+                    state_products = find_products_in_state(data)
+                    print(f"DEBUG APP: Found {len(state_products)} hidden products in {domain}")
+                    
+                    if not state_products:
+                         try:
+                             if brand_name and len(data) > 0:
+                                  with open(f"debug_failed_{domain}_hidden.json", "w", encoding="utf-8") as f:
+                                      json.dump(data, f, indent=2)
+                         except: pass
+
+                    products.extend(state_products)
+            except Exception as e:
+                print(f"DEBUG APP: Extraction Error: {e}")
+                pass
+
+    # Deduplicate
+    unique_products = []
+    seen = set()
+    for p in products:
+        k = p['Product Name'] + str(p['Price'])
+        if k not in seen:
+            seen.add(k)
+            unique_products.append(p)
+            
+    return unique_products
+
+def extract_from_generic_dom(soup, domain, brand_name, matcher=None):
+    """
+    Universal Extractor
+    """
+    products = []
+    is_brand = brand_filter(brand_name, matcher)
+    seen_urls = set()
+    
+    # Currency symbols to look for
+    symbols = ['₹', '$', '€', '£', 'Rs', 'USD', 'INR', 'MRP']
+    
+    # Secure Text Node Finding: Ignore Scripts/Styles
+    all_text_nodes = soup.find_all(string=True)
+    price_nodes = []
+    
+    for t in all_text_nodes:
+         if t.parent.name in ['script', 'style', 'noscript', 'head', 'meta', 'link', 'title']: continue
+         if any(s in str(t) for s in symbols):
+              clean_t = t.strip()
+              # Heuristic: Price text shouldn't be too long or look like code
+              if len(clean_t) > 40: continue 
+              if any(bad in clean_t for bad in ['{', '}', ';', 'var ', 'function', '=']): continue
+              price_nodes.append(t)
+    
+    for node in price_nodes:
+        try:
+            # Walk up to find a container with a link
+            parent = node.parent
+            card = None
+            for _ in range(7): # Reduced range to avoid grabbing too big containers
+                if parent is None or parent.name in ['body', 'html', 'header', 'footer', 'nav', 'aside']: break
+                # Check if this container looks like a header or extraneous section
+                cls = " ".join(parent.get("class", [])).lower()
+                if "header" in cls or "menu" in cls or "search-summary" in cls or "filter" in cls:
+                    break
+                    
+                if parent.find("a", href=True):
+                    card = parent
+                    break
+                parent = parent.parent
+            
+            if not card: continue
+            
+            # Validation: Product Name Validation
+            raw_title = link_node.get_text(separator=" ", strip=True)
+            
+            # Depop/Image-heavy sites often have empty link text but valid Alt text or H-tags
+            # Check for better title immediately if the raw link text is weak
+            if len(raw_title) < 4:
+                 title_tag = card.find(['h2', 'h3', 'h4', 'span'])
+                 if title_tag and len(title_tag.get_text(strip=True)) > 5:
+                      raw_title = title_tag.get_text(strip=True)
+                 else:
+                      img = card.find('img', alt=True)
+                      if img: raw_title = img['alt']
+
+            # --- Robust Title Cleaning ---
+            # 1. Check for Search Header patterns
+            clean_title_lower = raw_title.lower()
+            if re.search(r"(\d+k?|\d{1,3}(,\d{3})*) results", clean_title_lower) or "items found" in clean_title_lower:
+                  continue
+                  
+            # Filter out generic link texts
+            if len(raw_title) < 4 or clean_title_lower in ["view", "details", "shop now", "click here", "buy now"]:
+                 continue
+
+            # Double check title after fallback (Relaxed: Only block if it strictly looks like a stats line)
+            if re.search(r"^\d.*\sresults?$", raw_title.lower().strip()):
+                 continue
+
+            # 2. Container Safety Check
+            # If the 'card' text contains "Sort By", "Filter", "Refine", it's likely the whole page wrapper, NOT a product card.
+            card_text = card.get_text(separator=" ", strip=True).lower()
+            if any(x in card_text for x in ["sort by:", "filter by", "refine search", "relevant matches"]):
+                 # Use a stricter heuristic: The card text shouldn't be HUGE
+                 if len(card_text) > 2000: 
+                      continue
+            
+            href = link_node['href']
+            
+            href = link_node['href']
+            if href.startswith(("javascript:", "#")): continue
+            url = f"https://{domain}{href}" if href.startswith("/") else href
+            
+            if url in seen_urls: continue
+            
+            name = link_node.get_text(strip=True)
+            if len(name) < 3:
+                    h_tag = card.find(['h1','h2','h3','h4'])
+                    if h_tag: name = h_tag.get_text(strip=True)
+            if len(name) < 3: continue
+
+            # Quality Check: Name matches Brand
+            # This prevents capturing "Recommended" or "Ad" items inconsistent with search
+            # (multi-word brands such as "Hugo Boss" also match on one main word)
+            if not is_brand(name):
+                 continue
+
+
+            price = node.strip()
+            
+            # Identify Seller with Domain+Brand context
+            seller = identify_seller_from_card(card, domain, brand_name)
+            availability = identify_availability(card)
+            
+            products.append(normalize_product_data({
+                "name": name,
+                "price": price,
+                "seller": seller,
+                "availability": availability,
+                "url": url,
+                "method": "Generic Bottom-Up"
+            }, domain))
+            seen_urls.add(url)
+        except: continue
+
+    return products
+
+def get_product_cache():
+    """ Process-wide Deep Scan cache (created on first use). """
+    global _PRODUCT_CACHE
+    if _PRODUCT_CACHE is None:
+        try:
+            _PRODUCT_CACHE = ProductDetailsCache()
+        except Exception as e:
+            print(f"Product cache unavailable: {e}")
+            return None
+    return _PRODUCT_CACHE
+
+_PRODUCT_CACHE = None
+
+def get_scan_cache():
+    """ Process-wide handle on the shared scan-result cache (created on first use). """
+    global _SCAN_CACHE
+    if _SCAN_CACHE is None:
+        try:
+            _SCAN_CACHE = ScanResultCache()
+        except Exception as e:
+            print(f"Scan result cache unavailable: {e}")
+            return None
+    return _SCAN_CACHE
+
+_SCAN_CACHE = None
+
+def _secret_digest(secret):
+    # Cache keys are stored: they may tell secrets apart, but never contain them
+    secret = (secret or "").strip()
+    return hashlib.sha256(secret.encode("utf-8")).hexdigest()[:16] if secret else ""
+
+def scan_cache_key(url, brand_name, deep_scan, config):
+    """
+    Scans with the same key return the same result and are run once: every
+    option that changes the result is part of it (secrets only as digests).
+    """
+    source = config.deep_scan_source if deep_scan else ""
+    budget = [config.deep_scan_budget or None, config.deep_scan_max_items] if deep_scan else []
+    aliases = sorted(a.strip().lower() for a in config.brand_aliases)
+    return json.dumps(
+        [url, brand_name.strip().lower(), bool(deep_scan), source] + budget
+        + [_secret_digest(config.custom_cookies), _secret_digest(config.google_api_key)]
+        + ([aliases] if aliases else [])
+    )
+
+def shared_result_note(result):
+    """ Marks a result served from the shared cache in its details (rows come back as records). """
+    result["products"] = [ProductRecord.from_mapping(p) for p in result["products"]]
+    result["details"] += f" [Shared result from {time.strftime('%H:%M:%S', time.localtime(result['shared_at']))}]"
+    return result
+
+def apply_cached_details(cache, product):
+    """
+    Fills Seller/Availability from the cache.
+    Returns True when no product page fetch is needed anymore.
+    """
+    key = canonical_product_key(product["Product URL"])
+    if not key:
+        return False
+    try:
+        seller, availability = cache.get(*key)
+    except Exception:
+        return False
+
+    if seller:
+        product["Seller"] = seller
+    if availability:
+        product["Availability"] = availability
+    # Availability is only required if the search page didn't provide it
+    return bool(seller) and (bool(availability) or product["Availability"] != "Unknown")
+
+def store_cached_details(cache, product_url, seller, availability):
+    key = canonical_product_key(product_url)
+    if not key:
+        return
+    try:
+        cache.put(*key, seller=seller, availability=availability)
+    except Exception as e:
+        print(f"Product cache write failed: {e}")
+
+def parse_price_value(price):
+    """
+    Best-effort numeric value of a raw price ("₹1,299", "$45.00 to $60.00", 1299).
+    Returns the first amount as float, or None.
+    """
+    if isinstance(price, (int, float)) and not isinstance(price, bool):
+        return float(price)
+    if not isinstance(price, str):
+        return None
+    match = re.search(r"\d[\d,]*(?:\.\d+)?", price)
+    if not match:
+        return None
+    try:
+        return float(match.group(0).replace(",", ""))
+    except ValueError:
+        return None
+
+def marketplace_risk(domain):
+    for key, risk in MARKETPLACE_RISK.items():
+        if key in domain:
+            return risk
+    return DEFAULT_MARKETPLACE_RISK
+
+def deep_scan_priority(product, brand_name, median_price=None, is_new=False, is_outlier=False):
+    """
+    Scores how likely a row is to hide an unauthorized reseller.
+    Higher scores are deep scanned first.
+    """
+    score = 0.0
+
+    # 1. Unknown seller beats a brand placeholder
+    if product["Seller"] == "N/A":
+        score += 3.0
+    elif brand_name and product["Seller"] == brand_name.title():
+        score += 1.5
+
+    # 2. Price deviation from the brand median (cheap listings weigh double)
+    price = parse_price_value(product["Price"])
+    if price and median_price:
+        deviation = min(abs(price - median_price) / median_price, 1.0)
+        score += deviation * (2.0 if price < median_price else 1.0)
+
+    # 3. Listings never resolved before
+    if is_new:
+        score += 1.0
+
+    # 4. Priced far below the brand's typical price (outliers.py)
+    if is_outlier:
+        score += 2.5
+
+    # 5. Marketplace risk
+    score += marketplace_risk(product["Platform"])
+    return score
+
+def plan_deep_scan(found_products, brand_name, cache=None, max_items=DEEP_SCAN_MAX_ITEMS, source="product"):
+    """
+    Picks the rows that need a product-page visit and orders them by priority.
+    With source="offers", every listing with an offers view is a candidate
+    (once per canonical product), since the buybox seller is only one of many.
+    Returns (ordered_indices, skipped_indices).
+    """
+    candidates = []
+    seen_keys = set()
+    for i, p in enumerate(found_products):
+        if "http" not in p["Product URL"]:
+            continue
+        if source == "offers" and construct_offer_listing_url(p["Product URL"]):
+            key = canonical_product_key(p["Product URL"])
+            if key not in seen_keys:
+                seen_keys.add(key)
+                candidates.append(i)
+        elif p["Seller"] == "N/A" or p["Seller"] == brand_name.title():
+            candidates.append(i)
+
+    prices = sorted(v for v in (parse_price_value(p["Price"]) for p in found_products) if v)
+    median_price = prices[len(prices) // 2] if prices else None
+    # Imported here so parse-pool workers do not load pyarrow at start-up
+    from outliers import product_price_outliers
+    outliers = product_price_outliers(found_products)
+
+    scored = []
+    for i in candidates:
+        is_new = False
+        if cache:
+            key = canonical_product_key(found_products[i]["Product URL"])
+            try:
+                is_new = bool(key) and not cache.is_known(*key)
+            except Exception:
+                pass
+        # Ties keep page order
+        scored.append((-deep_scan_priority(found_products[i], brand_name, median_price, is_new, bool(outliers[i])), i))
+    scored.sort()
+
+    ordered = [i for _, i in scored]
+    return ordered[:max_items], ordered[max_items:]
+
+def run_deep_scan(found_products, brand_name, budget_seconds=None, max_items=DEEP_SCAN_MAX_ITEMS, use_cache=True, on_result=None, source="product"):
+    """
+    Resolves sellers/availability for the highest-priority rows within a wall-clock budget.
+    Rows are updated in place; on_result(index, product) is called as each one resolves.
+    source="offers" fetches the consolidated offers view where the marketplace has one
+    and appends one row per additional seller to found_products.
+    Returns stats: candidates, cached, fetched, skipped, timed_out, elapsed, offers.
+    """
+    started = time.time()
+    deadline = started + budget_seconds if budget_seconds else None
+    cache = get_product_cache() if use_cache else None
+
+    ordered, skipped = plan_deep_scan(found_products, brand_name, cache, max_items, source)
+    stats = {
+        "candidates": len(ordered) + len(skipped),
+        "cached": 0,
+        "fetched": 0,
+        "skipped": len(skipped),
+        "timed_out": False,
+        "elapsed": 0.0,
+        "offers": 0
+    }
+
+    def wants_offers(index):
+        return source == "offers" and construct_offer_listing_url(found_products[index]["Product URL"]) is not None
+
+    # Persistent Cache: only queue pages that are new or stale
+    # (the cache holds one seller per product, so it can't answer offer listings)
+    to_fetch = []
+    for i in ordered:
+        if cache and not wants_offers(i) and apply_cached_details(cache, found_products[i]):
+            stats["cached"] += 1
+            if on_result: on_result(i, found_products[i])
+        else:
+            to_fetch.append(i)
+
+    def process_item(index):
+        try:
+            p = found_products[index]
+            if wants_offers(index):
+                offers = fetch_offer_listing(p["Product URL"], brand_name)
+                if offers:
+                    return index, None, None, offers
+            new_seller, new_avail = fetch_product_details(p["Product URL"], brand_name)
+            return index, new_seller, new_avail, None
+        except:
+            return index, "N/A", "Unknown", None
+
+    # Run in parallel; the pool works through the queue in priority order
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=DEEP_SCAN_WORKERS)
+    future_to_index = {executor.submit(process_item, i): i for i in to_fetch}
+    try:
+        timeout = max(deadline - time.time(), 0) if deadline else None
+        for future in concurrent.futures.as_completed(future_to_index, timeout=timeout):
+            idx, seller_result, avail_result, offers = future.result()
+            stats["fetched"] += 1
+            if offers:
+                # First offer updates the listing row, every other seller becomes a new row
+                rows = expand_offer_rows(found_products[idx], offers)
+                found_products[idx] = rows[0]
+                if on_result: on_result(idx, rows[0])
+                for row in rows[1:]:
+                    found_products.append(row)
+                    if on_result: on_result(len(found_products) - 1, row)
+                stats["offers"] += len(rows)
+                continue
+
+            if seller_result and seller_result != "N/A":
+                found_products[idx]["Seller"] = seller_result
+            if avail_result and avail_result != "Unknown":
+                found_products[idx]["Availability"] = avail_result
+            if cache:
+                store_cached_details(cache, found_products[idx]["Product URL"], seller_result, avail_result)
+            if on_result: on_result(idx, found_products[idx])
+    except concurrent.futures.TimeoutError:
+        # Deadline reached: keep what we have, drop queued fetches
+        stats["timed_out"] = True
+    finally:
+        executor.shutdown(wait=not stats["timed_out"], cancel_futures=True)
+
+    stats["skipped"] += len(to_fetch) - stats["fetched"]
+    stats["elapsed"] = round(time.time() - started, 2)
+    return stats
+
+def classify_seller(seller, brand_name, authorized_sellers=None):
+    """
+    Buckets a resolved seller as "authorized", "unauthorized" or "unknown".
+    """
+    if not seller or seller in ("N/A", "Unknown", "-"):
+        return "unknown"
+    seller_lower = seller.lower()
+    allowed = [brand_name.lower()] if brand_name else []
+    allowed += [s.strip().lower() for s in (authorized_sellers or []) if s.strip()]
+    if any(a in seller_lower for a in allowed):
+        return "authorized"
+    return "unauthorized"
+
+def stratified_share(strata, bucket, z):
+    """
+    Stratified estimate of the share of `bucket` with its confidence interval.
+    strata: {name: {"N": population, "n": sampled, bucket: count, ...}}
+    Returns (share, margin).
+    """
+    total = sum(s["N"] for s in strata.values())
+    share = 0.0
+    variance = 0.0
+    for s in strata.values():
+        if not s["n"]:
+            continue
+        weight = s["N"] / total
+        p = s[bucket] / s["n"]
+        share += weight * p
+        # Add-one smoothing keeps 0/n and n/n strata from looking certain
+        p_adj = (s[bucket] + 1) / (s["n"] + 2)
+        fpc = 1 - s["n"] / s["N"]
+        variance += weight ** 2 * fpc * p_adj * (1 - p_adj) / s["n"]
+    return share, z * variance ** 0.5
+
+def estimate_seller_mix(products, brand_name, authorized_sellers=None, target_margin=SAMPLING_TARGET_MARGIN,
+                        confidence=SAMPLING_CONFIDENCE, batch_size=SAMPLING_BATCH_SIZE,
+                        max_samples=SAMPLING_MAX_SAMPLES, use_cache=True, seed=None):
+    """
+    Estimates the share of unauthorized and unknown sellers without visiting every product page.
+    Draws a stratified random sample per marketplace in batches (Neyman allocation),
+    resolving sellers via fetch_product_details, until both shares are within
+    target_margin at the given confidence, the population is exhausted or
+    max_samples is reached.
+    """
+    rng = random.Random(seed)
+    z = statistics.NormalDist().inv_cdf(0.5 + confidence / 2)
+    cache = get_product_cache() if use_cache else None
+
+    # Strata: one per platform, in random draw order
+    pools = {}
+    for p in products:
+        if p["Detection Method"] == "Summary Only" or "http" not in str(p["Product URL"]):
+            continue
+        pools.setdefault(p["Platform"], []).append(p)
+    for pool in pools.values():
+        rng.shuffle(pool)
+
+    strata = {
+        platform: {"N": len(pool), "n": 0, "authorized": 0, "unauthorized": 0, "unknown": 0}
+        for platform, pool in pools.items()
+    }
+    fetched = 0
+    margin = 1.0
+
+    # The extractors' "brand mentioned, seller unknown" guess: not evidence of an authorized seller
+    placeholder = brand_name.title() if brand_name else None
+
+    def resolve(product):
+        """ (seller, fetched); unresolved sellers and the brand placeholder come back as "N/A" (unknown). """
+        # Rows with a real seller from the search page need no visit
+        seller = product["Seller"]
+        if seller != "N/A" and seller != placeholder:
+            return seller, False
+        if cache:
+            key = canonical_product_key(product["Product URL"])
+            if key:
+                try:
+                    cached_seller, _ = cache.get(*key)
+                    if cached_seller and cached_seller != placeholder:
+                        return cached_seller, False
+                except Exception:
+                    pass
+        try:
+            new_seller, new_avail = fetch_product_details(product["Product URL"], brand_name)
+        except Exception:
+            new_seller, new_avail = "N/A", "Unknown"
+        if cache:
+            store_cached_details(cache, product["Product URL"], new_seller, new_avail)
+        # A failed visit must not fall back to the placeholder (it would count as authorized)
+        return (new_seller if new_seller != placeholder else "N/A"), True
+
+    while strata:
+        sampled = sum(s["n"] for s in strata.values())
+        remaining = {k: s["N"] - s["n"] for k, s in strata.items() if s["N"] > s["n"]}
+        if not remaining or sampled >= max_samples:
+            break
+
+        # Neyman allocation: weight strata by size x spread (worst case until sampled)
+        weights = {}
+        for k in remaining:
+            s = strata[k]
+            spread = 0.5
+            if s["n"] >= 2:
+                p = (s["unauthorized"] + s["unknown"] + 1) / (s["n"] + 2)
+                spread = (p * (1 - p)) ** 0.5
+            weights[k] = s["N"] * spread
+        total_weight = sum(weights.values()) or 1.0
+        budget = min(batch_size, max_samples - sampled)
+
+        batch = []
+        # Strata without two observations yet go first
+        for k in sorted(remaining, key=lambda k: (strata[k]["n"] >= 2, -weights[k])):
+            take = max(1, round(budget * weights[k] / total_weight))
+            take = min(take, remaining[k], budget - len(batch))
+            start = strata[k]["n"]
+            batch.extend((k, p) for p in pools[k][start:start + take])
+            strata[k]["n"] += take
+            if len(batch) >= budget:
+                break
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=DEEP_SCAN_WORKERS) as executor:
+            for (platform, product), (seller, was_fetched) in zip(batch, executor.map(lambda item: resolve(item[1]), batch)):
+                strata[platform][classify_seller(seller, brand_name, authorized_sellers)] += 1
+                fetched += int(was_fetched)
+
+        margin = max(
+            stratified_share(strata, "unauthorized", z)[1],
+            stratified_share(strata, "unknown", z)[1]
+        )
+        # Require a couple of observations per stratum before trusting the interval
+        if margin <= target_margin and all(s["n"] >= min(2, s["N"]) for s in strata.values()):
+            break
+
+    estimate = {
+        "population": sum(s["N"] for s in strata.values()),
+        "sample_size": sum(s["n"] for s in strata.values()),
+        "pages_fetched": fetched,
+        "confidence": confidence,
+        "margin": round(margin, 4),
+        "converged": margin <= target_margin,
+        "strata": strata
+    }
+    for bucket in ("unauthorized", "unknown"):
+        share, m = stratified_share(strata, bucket, z) if estimate["sample_size"] else (0.0, 1.0)
+        estimate[bucket] = {
+            "share": round(share, 4),
+            "low": round(max(share - m, 0.0), 4),
+            "high": round(min(share + m, 1.0), 4)
+        }
+    return estimate
+
+# --- Parse stage (process pool) ---
+# Product rows cross the process boundary as plain tuples in PRODUCT_COLUMNS order
+def pack_products(products):
+    """
+    Product records/dicts -> compact tuples (PRODUCT_COLUMNS order), plus a
+    trailing dict when a row carries extra keys (e.g. "Brand" on portfolio scans).
+    """
+    packed = []
+    for p in products:
+        p = ProductRecord.from_mapping(p) if not isinstance(p, ProductRecord) else p
+        packed.append(p.values_tuple() + ((dict(p._extra),) if p._extra else ()))
+    return packed
+
+def unpack_products(rows):
+    """ Inverse of pack_products. """
+    products = []
+    for row in rows:
+        record = ProductRecord(*row[:len(PRODUCT_COLUMNS)])
+        if len(row) > len(PRODUCT_COLUMNS):
+            record.update(row[len(PRODUCT_COLUMNS)])
+        products.append(record)
+    return products
+
+_PARSE_POOL = None
+_PARSE_POOL_SIZE = 0
+_PARSE_POOL_LOCK = threading.Lock()
+# Processes on this host that each run their own parse pool (set by multi-process runners)
+_PARSE_POOL_PEERS = 1
+
+def share_parse_cores(processes):
+    """
+    Declares how many processes (job workers, batch workers) run a parse pool
+    side by side, so each pool gets its share of the cores instead of all of them.
+    """
+    global _PARSE_POOL_PEERS
+    _PARSE_POOL_PEERS = max(1, int(processes))
+
+def parse_pool_size(processes):
+    """ Requested pool size, capped at this process's share of the cores. """
+    share = max(1, (os.cpu_count() or 1) // _PARSE_POOL_PEERS)
+    return max(1, min(int(processes), share))
+
+def submit_parse(processes, fn, *args):
+    """
+    Submits fn(*args) to the process-wide pool for the CPU-bound parse stage.
+    The pool is created on first use and recreated when a scan asks for a
+    different size (see parse_pool_size); work already submitted to a
+    replaced pool still completes. Returns the future.
+    """
+    global _PARSE_POOL, _PARSE_POOL_SIZE
+    size = parse_pool_size(processes)
+    with _PARSE_POOL_LOCK:
+        if _PARSE_POOL is not None and _PARSE_POOL_SIZE != size:
+            print(f"Resizing the parse pool from {_PARSE_POOL_SIZE} to {size} processes")
+            _PARSE_POOL.shutdown(wait=False)
+            _PARSE_POOL = None
+        if _PARSE_POOL is None:
+            # spawn: fork is unsafe once fetch threads are running
+            ctx = multiprocessing.get_context("spawn")
+            _PARSE_POOL = concurrent.futures.ProcessPoolExecutor(max_workers=size, mp_context=ctx)
+            _PARSE_POOL_SIZE = size
+        # Submitted under the lock, so a concurrent resize can't shut the pool down in between
+        return _PARSE_POOL.submit(fn, *args)
+
+def fetch_search_page(url, config):
+    """
+    I/O half of a scan: fetches the search page with profile rotation.
+    Returns (content_bytes, encoding, None) on success or (None, None, error_result).
+    """
+    # Generic "Real User" Headers
+    # Randomized standard user agents are handled by impersonate, but extra headers help
+    headers = {
+        "Accept-Language": "en-US,en;q=0.9",
+        "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
+        "Upgrade-Insecure-Requests": "1",
+        "Referer": "https://www.google.com/",
+        "Sec-Fetch-Dest": "document",
+        "Sec-Fetch-Mode": "navigate",
+        "Sec-Fetch-Site": "cross-site",
+        "Sec-Fetch-User": "?1",
+        "Cache-Control": "max-age=0"
+    }
+
+    # Implement Retry/Rotation for robust connections
+    # Use newer browser versions for better impersonation success
+    impersonate_profiles = list(config.impersonate_profiles)
+    
+    # Special Handling for known tough sites (Depop, etc)
+    if "depop" in url:
+         headers["Referer"] = "https://www.depop.com/"
+         headers["Origin"] = "https://www.depop.com"
+    
+    # Custom Cookie Injection
+    if config.custom_cookies:
+         headers["Cookie"] = config.custom_cookies.strip()
+
+    response = None
+    last_error = None
+
+    for profile in impersonate_profiles:
+        try:
+            response = requests.get(
+                url, 
+                impersonate=profile, 
+                headers=headers,
+                timeout=config.request_timeout
+            )
+            TRAFFIC.record(len(response.content))
+            # Check for soft blocks / challenges before accepting
+            if response.status_code == 200:
+                 r_text = response.text
+                 if "Pardon Our Interruption" in r_text or "Checking your browser" in r_text or "<title>Security Measure</title>" in r_text:
+                      last_error = "Soft Block (Challenge)"
+                      time.sleep(2)
+                      continue
+                 break # Success
+        except Exception as e:
+            last_error = e
+            time.sleep(1) # Brief pause before retry
+            continue
+    
+    # Final check for block state to avoid downstream parsing errors
+    if response and response.status_code == 200:
+          if "Pardon Our Interruption" in response.text or "Checking your browser" in response.text:
+               return None, None, {
+                    "status": "Blocked",
+                    "details": "Access Denied by Anti-Bot (Challenge Page)",
+                    "products": [],
+                    "scan_url": url
+               }
+
+    if not response or response.status_code != 200:
+        error_details = f"HTTP {response.status_code}" if response else str(last_error)
+        return None, None, {
+            "status": "Blocked/Error",
+            "details": f"Failed after retries: {error_details}",
+            "products": [],
+            "scan_url": url
+        }
+
+    return response.content, response.encoding, None
+
+def classify_search_page(content, url, encoding=None):
+    """
+    Classification step: decodes the page and checks for explicit "no results" pages.
+    Returns (page, None) where page holds the parsed soup/text for extraction,
+    or (None, verdict) when the page can be classified without extraction.
+    """
+    html = content.decode(encoding or "utf-8", errors="replace") if isinstance(content, bytes) else content
+
+    soup = BeautifulSoup(html, 'html.parser')
+    text_content = soup.get_text(separator=' ', strip=True).lower()
+
+    # 0. Early Negative Signal Check
+    # If the page explicitly says "No results", stop immediately to avoid scraping "Recommendations"
+    # Use regex to avoid false positives like "1,000 results for" matching "0 results for"
+    negative_signals = [
+        r"no results found", 
+        r"did not match any products", 
+        r"\b0 results for", 
+        r"we couldn't find any results",
+        r"nothing matches your search"
+    ]
+    
+    if any(re.search(ns, text_content) for ns in negative_signals):
+         return None, {"status": "Not Found", "details": "Page explicitly states no results found.", "rows": []}
+
+    return {"url": url, "domain": urlparse(url).netloc, "html": html, "soup": soup, "text": text_content}, None
+
+def extract_search_page(page, brand_name, google_api_key="", brand_aliases=()):
+    """
+    Extraction step: AI / extractor cascade / text fallback on a classified page.
+    brand_name may also be a list of brands (or a BrandMatcher): the page is then
+    matched against all of them in one pass and each row gets a "Brand".
+    Returns {"status", "details", "rows"} with rows packed by pack_products.
+    """
+    soup, domain, text_content = page["soup"], page["domain"], page["text"]
+    found_products = []
+    matcher = compile_brands(brand_name, brand_aliases)
+    brand_name = matcher.primary
+        
+    # --- AI Simplification ---
+    # If API Key is present, use AI to parse text instead of complex DOM logic
+    if google_api_key:
+         genai.configure(api_key=google_api_key)
+         ai_products = extract_with_gemini(text_content, domain, brand_name)
+         if ai_products:
+              return {
+                "status": "Found (AI)",
+                "details": f"AI Extracted {len(ai_products)} products.",
+                "rows": pack_products(ai_products)
+            }
+         # If AI fails, fall back to standard logic below
+         
+    # 1. Strategy A: Structured Data (JSON-LD)
+    try:
+        data = extruct.extract(page["html"], base_url=page["url"], syntaxes=['json-ld'])
+        json_ld_list = data.get('json-ld', [])
+        found_products.extend(extract_from_json_ld(json_ld_list, domain, brand_name, matcher))
+    except Exception:
+        pass
+
+    if not found_products:
+         found_products.extend(extract_from_amazon_containers(soup, domain, brand_name, matcher))
+
+    # 1.5 Strategy A2: Manual Script/State Extraction (For SPA sites like Nykaa/Flipkart)
+    if not found_products:
+         found_products.extend(extract_from_hidden_data(soup, domain, brand_name, matcher))
+    
+    # 1.6 Strategy A3: eBay Specific DOM
+    if "ebay" in domain:
+         found_products.extend(extract_from_ebay_dom(soup, domain, brand_name, matcher))
+
+    # 2. Strategy B: Generic DOM Clustering / Bottom Up (Combined)
+    if not found_products:
+         # Scan using generic methods, passing brand name for better context
+         found_products.extend(extract_from_generic_dom(soup, domain, brand_name, matcher))
+
+    # Portfolio scans: tag each row with the brand it matched
+    if len(matcher.brands) > 1:
+         for p in found_products:
+              p["Brand"] = matcher.best(p["Product Name"])
+
+    if found_products:
+        # Several extractors can return the same listing (e.g. JSON-LD + eBay DOM):
+        # keep one row per product ID, so the deep scan visits it once. Only exact IDs:
+        # look-alike listings may be different resellers the deep scan has to see.
+        # Imported here so parse-pool workers do not load pyarrow at start-up
+        from dedup import dedupe_products
+        extracted = len(found_products)
+        found_products = dedupe_products(found_products)
+        merged = extracted - len(found_products)
+        note = f" (duplicates merged: {merged})" if merged else ""
+        return {"status": "Found", "details": f"Extracted {len(found_products)} products{note}.", "rows": pack_products(found_products)}
+
+    # 3. Strategy C: Text Fallback (Status determination only)
+    # For long search queries, exact match of the whole string usually fails.
+    # Check for token overlap instead.
+    tokens = [t for t in brand_name.lower().split() if len(t) > 2]
+    token_match = False
+    if tokens:
+         # If significant number of tokens are present
+         present_count = sum(1 for t in tokens if t in text_content)
+         if present_count / len(tokens) >= 0.5: # 50% match
+              token_match = True
+    elif brand_name.lower() in text_content:
+         token_match = True
+
+    if token_match:
+        return {
+            "status": "Text Match",
+            "details": "Brand name/tokens found in text, but product cards could not be identified automatically.",
+            "rows": []
+        }
+    return {"status": "Not Found", "details": "Brand name not found in visible text.", "rows": []}
+
+def parse_search_page(content, url, brand_name, encoding=None, google_api_key="", brand_aliases=()):
+    """
+    CPU half of a scan: classification + extraction on raw page bytes.
+    Pure function of its arguments, so it can run in a process pool.
+    Returns {"status", "details", "rows"} with rows packed by pack_products.
+    """
+    page, verdict = classify_search_page(content, url, encoding)
+    if verdict:
+        return verdict
+    return extract_search_page(page, brand_name, google_api_key, brand_aliases)
+
+def run_parse(content, url, brand_name, encoding, config):
+    """ parse_search_page, in the parse pool when config.parse_processes > 0. """
+    args = (content, url, brand_name, encoding, config.google_api_key, config.brand_aliases)
+    if config.parse_processes > 0:
+        return submit_parse(config.parse_processes, parse_search_page, *args).result()
+    return parse_search_page(*args)
+
+def enrich_scan_result(parsed, url, brand_name, config, deep_scan=None, on_deep_result=None):
+    """
+    Enrichment step: unpacks parsed rows and runs the deep scan on a "Found" result.
+    Returns the detect_brand_products result dict.
+    """
+    if deep_scan is None:
+        deep_scan = config.deep_scan
+
+    status_summary = parsed["status"]
+    details = parsed["details"]
+    found_products = unpack_products(parsed["rows"])
+    deep_stats = None
+
+    # --- Deep Scan Logic (Prioritized, Time-Boxed) ---
+    if status_summary == "Found" and deep_scan and found_products:
+         deep_stats = run_deep_scan(
+              found_products, brand_name,
+              budget_seconds=config.deep_scan_budget,
+              max_items=config.deep_scan_max_items,
+              use_cache=config.use_cache,
+              on_result=on_deep_result,
+              source=config.deep_scan_source
+         )
+         offer_note = f", {deep_stats['offers']} offer rows" if deep_stats["offers"] else ""
+         details += (
+              f" [Deep Scan: {deep_stats['fetched']} fetched, {deep_stats['cached']} from cache,"
+              f" {deep_stats['skipped']} skipped{' (time budget reached)' if deep_stats['timed_out'] else ''}{offer_note}]"
+         )
+
+    return {
+        "status": status_summary,
+        "details": details,
+        "products": found_products,
+        "scan_url": url,
+        "deep_scan": deep_stats
+    }
+
+def detect_brand_products(url, brand_name, deep_scan=None, config=None, on_deep_result=None):
+    """
+    Scans URL and returns a LIST of products found.
+    Generic implementation for ANY website.
+    All settings come from config (ScanConfig); deep_scan, if given, overrides config.deep_scan.
+    Runs fetch -> parse -> enrich inline for one URL; scan_domains runs the
+    same steps as a staged pipeline. Identical concurrent / recent scans
+    (any session or process) are served from the shared scan cache.
+    """
+    config = config or ScanConfig()
+    if deep_scan is None:
+        deep_scan = config.deep_scan
+
+    cache = get_scan_cache() if config.result_cache_ttl else None
+    if cache is None:
+        return scan_search_url(url, brand_name, deep_scan, config, on_deep_result)
+
+    key = scan_cache_key(url, brand_name, deep_scan, config)
+    shared = cache.acquire(key, force=config.force_refresh)
+    if shared is not None:
+        return shared_result_note(shared)
+
+    result = None
+    try:
+        result = scan_search_url(url, brand_name, deep_scan, config, on_deep_result)
+    finally:
+        cache.release(key, result, config.result_cache_ttl)
+    return result
+
+def scan_search_url(url, brand_name, deep_scan, config, on_deep_result=None):
+    """ Uncached fetch -> parse -> enrich for one search URL. """
+    content, encoding, error_result = fetch_search_page(url, config)
+    if error_result:
+        return error_result
+            
+    try:
+        parsed = run_parse(content, url, brand_name, encoding, config)
+        return enrich_scan_result(parsed, url, brand_name, config, deep_scan, on_deep_result)
+    except Exception as e:
+        return {"status": "Error", "details": str(e), "products": [], "scan_url": url}
+
+def fetch_product_details(product_url, brand_name, streaming=True):
+    """
+    Visits the product page to find the seller and availability.
+    Returns: (seller, availability)
+
+    With streaming=True (default) the page is read in chunks and scanned
+    incrementally for the known buybox containers; reading stops as soon as
+    seller and availability are resolved. streaming=False parses the full page.
+    """
+    if streaming:
+        return fetch_product_details_streaming(product_url, brand_name)
+
+    try:
+        # Same headers/impersonation
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+            "Referer": "https://www.google.com/"
+        }
+        response = requests.get(product_url, impersonate="chrome110", headers=headers, timeout=10)
+        TRAFFIC.record(len(response.content))
+        if response.status_code != 200: return "N/A", "Unknown"
+        
+        soup = BeautifulSoup(response.text, 'html.parser')
+        domain = urlparse(product_url).netloc
+        
+        seller = "N/A"
+        
+        # 1. Target Specific Boxes (Amazon)
+        buybox = soup.find(id="merchant-info")
+        if buybox:
+             s = identify_seller_from_card(buybox, domain, brand_name)
+             if s != "N/A": seller = s
+
+        if seller == "N/A":
+             tabular = soup.find(id="tabular-buybox")
+             if tabular:
+                  s = identify_seller_from_card(tabular, domain, brand_name)
+                  if s != "N/A": seller = s
+             
+             # New "Accordion" style buyboxes
+             if seller == "N/A":
+                  for bid in ["buybox-accordion", "exports_desktop_qualifiedBuybox_buyNow_feature_div", "fresh-merchant-info", "n3_buybox"]:
+                       box = soup.find(id=bid)
+                       if box:
+                            s = identify_seller_from_card(box, domain, brand_name)
+                            if s != "N/A": 
+                                 seller = s
+                                 break
+
+        # 2. Generic: Scan Full Body Content (Fallback)
+        if seller == "N/A" and soup.body:
+             s = identify_seller_from_card(soup.body, domain, brand_name)
+             if s != "N/A": seller = s
+
+        # 3. Identify Availability
+        availability = "Unknown"
+        if soup.body:
+             availability = identify_availability(soup.body)
+
+        return seller, availability
+    except:
+        return "N/A", "Unknown"
+
+
+def locate_container(html, container_id, search_from=0):
+    """
+    Returns the offset of the opening tag carrying id=container_id, or -1.
+    """
+    pattern = re.compile(r"""\bid\s*=\s*["']%s["']""" % re.escape(container_id))
+    marker = pattern.search(html, search_from)
+    if not marker:
+        return -1
+    return html.rfind("<", 0, marker.start())
+
+def parse_container_fragment(html, container_id, tag_start, complete=False):
+    """
+    Parses the element with the given id from a partially downloaded page.
+    Returns None while the element's window has not been fully received.
+    """
+    # Wait for a full window after the opening tag unless the stream has ended
+    if not complete and len(html) - tag_start < PRODUCT_PAGE_CONTAINER_WINDOW:
+        return None
+
+    fragment = BeautifulSoup(html[tag_start:tag_start + PRODUCT_PAGE_CONTAINER_WINDOW], 'html.parser')
+    return fragment.find(id=container_id)
+
+def fetch_product_details_streaming(product_url, brand_name):
+    """
+    Early-terminating variant of fetch_product_details.
+    Streams the product page and checks the known seller/availability containers
+    after every chunk. Only when the stream ends without a seller does it fall back
+    to a full-body scan, bounded to PRODUCT_PAGE_MAX_BYTES.
+    Returns: (seller, availability)
+    """
+    response = None
+    bytes_read = 0
+    try:
+        headers = {
+            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+            "Referer": "https://www.google.com/"
+        }
+        response = requests.get(product_url, impersonate="chrome110", headers=headers, timeout=10, stream=True)
+        if response.status_code != 200: return "N/A", "Unknown"
+
+        domain = urlparse(product_url).netloc
+        decoder = codecs.getincrementaldecoder(response.encoding or "utf-8")(errors="replace")
+
+        seller = "N/A"
+        availability = "Unknown"
+        # Container id -> offset of its opening tag (None until seen in the stream)
+        seller_boxes = {bid: None for bid in SELLER_CONTAINER_IDS}
+        availability_boxes = {aid: None for aid in AVAILABILITY_CONTAINER_IDS}
+
+        html = ""
+        scanned_upto = 0
+        complete = False
+        chunks = response.iter_content(chunk_size=PRODUCT_PAGE_CHUNK_SIZE)
+
+        while True:
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                chunk = None
+
+            if chunk:
+                bytes_read += len(chunk)
+                html += decoder.decode(chunk)
+            if chunk is None or bytes_read >= PRODUCT_PAGE_MAX_BYTES:
+                html += decoder.decode(b"", final=True)
+                complete = True
+
+            # Only search the newly received text (with overlap for split markers)
+            search_from = max(0, scanned_upto - 200)
+            for boxes in (seller_boxes, availability_boxes):
+                for box_id, tag_start in boxes.items():
+                    if tag_start is None:
+                        pos = locate_container(html, box_id, search_from)
+                        if pos != -1:
+                            boxes[box_id] = pos
+            scanned_upto = len(html)
+
+            # 1. Known buybox containers (checked as soon as they are fully received)
+            if seller == "N/A":
+                for bid, tag_start in list(seller_boxes.items()):
+                    if tag_start is None:
+                        continue
+                    box = parse_container_fragment(html, bid, tag_start, complete)
+                    if box is None:
+                        continue
+                    del seller_boxes[bid]
+                    s = identify_seller_from_card(box, domain, brand_name)
+                    if s != "N/A":
+                        seller = s
+                        break
+
+            # 2. Known availability containers
+            if availability == "Unknown":
+                for aid, tag_start in list(availability_boxes.items()):
+                    if tag_start is None:
+                        continue
+                    box = parse_container_fragment(html, aid, tag_start, complete)
+                    if box is None:
+                        continue
+                    del availability_boxes[aid]
+                    a = identify_availability(box)
+                    if a != "Unknown":
+                        availability = a
+                        break
+
+            # Early termination: everything we need is already here
+            if seller != "N/A" and availability != "Unknown":
+                return seller, availability
+            if complete:
+                break
+
+        # 3. Bounded Fallback: Scan what we have read of the body
+        soup = BeautifulSoup(html, 'html.parser')
+        body = soup.body or soup
+        if seller == "N/A":
+            s = identify_seller_from_card(body, domain, brand_name)
+            if s != "N/A": seller = s
+        if availability == "Unknown":
+            availability = identify_availability(body)
+
+        return seller, availability
+    except:
+        return "N/A", "Unknown"
+    finally:
+        if response is not None:
+            TRAFFIC.record(bytes_read)
+            try:
+                response.close()
+            except:
+                pass
+
+
+
+def construct_offer_listing_url(product_url):
+    """
+    Returns the consolidated "all sellers" view for a product, or None if the
+    marketplace has none we can parse.
+    - Amazon: the All Offers Display (AOD) fragment for the ASIN
+    - eBay: the catalogue product page (/p/<epid>) listing every seller's item
+    """
+    key = canonical_product_key(product_url)
+    if not key:
+        return None
+    marketplace, product_id = key
+
+    if "amazon" in marketplace and re.fullmatch(r"[A-Z0-9]{10}", product_id):
+        return f"https://www.{marketplace}/gp/product/ajax/aodAjaxMain/?asin={product_id}&pc=dp"
+    if "ebay" in marketplace:
+        match = re.search(r"/p/(\d+)", urlparse(product_url).path)
+        if match:
+            return f"https://www.{marketplace}/p/{match.group(1)}"
+        # Item pages link to their catalogue product; resolved in fetch_offer_listing
+        if re.fullmatch(r"\d{9,}", product_id):
+            return product_url
+    return None
+
+def extract_offers_amazon(soup, domain, brand_name):
+    """
+    Parses the AOD fragment: pinned (buybox) offer first, then every other offer.
+    """
+    offers = []
+    for offer in soup.select("#aod-pinned-offer, #aod-offer"):
+        price = "N/A"
+        price_tag = offer.select_one(".a-price .a-offscreen") or offer.select_one(".a-price")
+        if price_tag:
+            price = price_tag.get_text(strip=True)
+
+        condition = ""
+        condition_tag = offer.select_one("#aod-offer-heading h5") or offer.select_one("#aod-offer-heading")
+        if condition_tag:
+            condition = " ".join(condition_tag.get_text(separator=" ", strip=True).split())
+
+        seller = "N/A"
+        seller_tag = offer.select_one("#aod-offer-soldBy a") or offer.select_one("#aod-offer-soldBy .a-col-right")
+        if seller_tag and seller_tag.get_text(strip=True):
+            seller = seller_tag.get_text(strip=True)
+        else:
+            seller = identify_seller_from_card(offer, domain, brand_name)
+
+        if seller == "N/A" and price == "N/A":
+            continue
+        offers.append({"seller": seller, "price": price, "condition": condition})
+    return offers
+
+def extract_offers_ebay(soup, domain, brand_name):
+    """
+    Parses the listings section of an eBay catalogue product page.
+    """
+    offers = []
+    for item in soup.select("li.s-item"):
+        title_tag = item.select_one(".s-item__title")
+        if title_tag and "Shop on eBay" in title_tag.get_text():
+            continue
+
+        price_tag = item.select_one(".s-item__price")
+        condition_tag = item.select_one(".SECONDARY_INFO")
+        seller_tag = item.select_one(".s-item__seller-info-text, .s-item__seller-info")
+        link_tag = item.select_one("a.s-item__link")
+        if not price_tag:
+            continue
+
+        offers.append({
+            "seller": seller_tag.get_text(strip=True) if seller_tag else "N/A",
+            "price": price_tag.get_text(strip=True),
+            "condition": condition_tag.get_text(strip=True) if condition_tag else "",
+            "url": link_tag.get("href") if link_tag else None
+        })
+    return offers
+
+EBAY_CATALOGUE_RE = re.compile(r"^(?:https?://(?:www\.)?ebay\.[a-z.]+)?/p/(\d+)")
+
+def find_ebay_catalogue_url(soup, domain):
+    """
+    Catalogue product page (/p/<epid>) of an eBay item page, read from the
+    item's own JSON-LD Product or its "See all" listings link. Other /p/
+    links on the page (carousels, related products) are ignored; None if
+    the item has no catalogue entry.
+    """
+    def catalogue(href):
+        match = EBAY_CATALOGUE_RE.match((href or "").strip())
+        return f"https://{domain}/p/{match.group(1)}" if match else None
+
+    for script in soup.find_all('script', type='application/ld+json'):
+        try:
+            data = json.loads(script.string or "")
+        except ValueError:
+            continue
+        for item in (data if isinstance(data, list) else [data]):
+            if not isinstance(item, dict) or item.get("@type") != "Product":
+                continue
+            variant_of = item.get("isVariantOf")
+            links = [item.get("url"), variant_of.get("url") if isinstance(variant_of, dict) else None]
+            same_as = item.get("sameAs")
+            links.extend(same_as if isinstance(same_as, list) else [same_as])
+            for link in links:
+                url = catalogue(link if isinstance(link, str) else None)
+                if url:
+                    return url
+
+    for anchor in soup.find_all('a', href=True):
+        if anchor.get_text(" ", strip=True).lower().startswith("see all"):
+            url = catalogue(anchor["href"])
+            if url:
+                return url
+    return None
+
+def fetch_offer_listing(product_url, brand_name):
+    """
+    Fetches the consolidated offers view for a product and returns every
+    seller/price/condition offer found in it (one request per product,
+    two for eBay item pages that first need their catalogue link).
+    Returns [] when the view is unavailable, so callers can fall back to
+    fetch_product_details.
+    """
+    offers_url = construct_offer_listing_url(product_url)
+    if not offers_url:
+        return []
+
+    headers = {
+        "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/110.0.0.0 Safari/537.36",
+        "Referer": product_url
+    }
+    domain = urlparse(product_url).netloc
+    try:
+        if "ebay" in domain and offers_url == product_url:
+            # Item page -> catalogue product page
+            response = requests.get(product_url, impersonate="chrome110", headers=headers, timeout=10)
+            TRAFFIC.record(len(response.content))
+            if response.status_code != 200: return []
+            offers_url = find_ebay_catalogue_url(BeautifulSoup(response.text, 'html.parser'), domain)
+            if not offers_url: return []
+
+        response = requests.get(offers_url, impersonate="chrome110", headers=headers, timeout=10)
+        TRAFFIC.record(len(response.content))
+        if response.status_code != 200: return []
+        soup = BeautifulSoup(response.text, 'html.parser')
+
+        if "amazon" in domain:
+            return extract_offers_amazon(soup, domain, brand_name)
+        if "ebay" in domain:
+            return extract_offers_ebay(soup, domain, brand_name)
+    except Exception as e:
+        print(f"Offer listing fetch failed for {product_url}: {e}")
+    return []
+
+def expand_offer_rows(product, offers):
+    """
+    Turns one listing row + its offers into one row per seller offer.
+    """
+    rows = []
+    for offer in offers:
+        row = product.copy()
+        row["Seller"] = offer.get("seller") or "N/A"
+        row["Price"] = offer.get("price") or product["Price"]
+        row["Condition"] = offer.get("condition", "")
+        if offer.get("url"):
+            row["Product URL"] = offer["url"]
+        row["Detection Method"] = "Offer Listing"
+        rows.append(row)
+    return rows
+
+def extract_from_amazon_containers(soup, domain, brand_name, matcher=None):
+    """
+    Dedicated strategy for Amazon search results using reliable data attributes.
+    """
+    products = []
+    is_brand = brand_filter(brand_name, matcher)
+    # Search for standard result containers
+    cards = soup.find_all("div", attrs={"data-component-type": "s-search-result"})
+    
+    for card in cards:
+        try:
+            # Title extraction:
+            # 1. Try finding link inside h2 (standard)
+            # 2. Try identifying 'a-text-normal' link (often used for titles)
+            title_node = None
+            link_node = None
+            
+            # Strategy 1: Link inside H2
+            h2_candidates = card.find_all("h2")
+            for h2 in h2_candidates:
+                possible_link = h2.find("a", href=True)
+                if possible_link:
+                    link_node = possible_link
+                    break
+            
+            # Strategy 2: Look for standard title class if H2 failed
+            if not link_node:
+                 link_node = card.find("a", class_=lambda x: x and "a-text-normal" in x, href=True)
+            
+            # Strategy 3: Look for link containing span with a-text-normal
+            if not link_node:
+                 span_text = card.find("span", class_=lambda x: x and "a-text-normal" in x)
+                 if span_text and span_text.parent.name == "a":
+                      link_node = span_text.parent
+
+            if not link_node: continue
+            
+            name = link_node.get_text(strip=True)
+            if len(name) < 5: continue # Too short to be a title
+
+            href = link_node['href']
+            url = f"https://{domain}{href}" if href.startswith("/") else href
+            
+            # Quality Check: Name matches Brand (borrowed from generic)
+            if not is_brand(name):
+                 continue
+
+            # Price extraction (look for a-price)
+            price = "N/A"
+            price_node = card.find(class_="a-price")
+            if price_node:
+                offscreen = price_node.find(class_="a-offscreen")
+                if offscreen:
+                    price = offscreen.get_text(strip=True)
+                else:
+                    price = price_node.get_text(separator="", strip=True) 
+            
+            # Seller identification
+            seller = identify_seller_from_card(card, domain, brand_name)
+            availability = identify_availability(card)
+            
+            products.append(normalize_product_data({
+                "name": name,
+                "price": price,
+                "seller": seller,
+                "availability": availability,
+                "url": url,
+                "method": "Amazon Structure"
+            }, domain))
+        except:
+            continue
+            
+    return products
+
+def summarize_domain_result(domain, result):
+    """
+    Splits a detect_brand_products result into the platform summary row
+    and the product rows shown in the report.
+    """
+    summary = {
+        "Domain": domain,
+        "Status": result["status"],
+        "Details": result["details"],
+        "URL": result["scan_url"],
+        "ProductCount": len(result["products"])
+    }
+    if result["products"]:
+        products = list(result["products"])
+    else:
+        products = [normalize_product_data({
+            "name": f"Scan Summary: {result['status']}",
+            "price": "-",
+            "seller": "-",
+            "url": result["scan_url"],
+            "method": "Summary Only"
+        }, domain)]
+    return summary, products
+
+def scan_domains(domains, brand_name, emit, config=None):
+    """
+    Scans every domain through the staged pipeline
+    (fetch -> classify -> extract -> enrich -> sink, see pipeline.py)
+    and reports progress through emit(event) as it happens:
+    - {"type": "deep_row", "domain", "index", "product"} whenever a deep-scan row resolves
+    - {"type": "domain", "domain", "result"} when a domain (incl. its deep scan) finishes
+    - {"type": "pipeline", "stages": [...]} periodically, with per-stage queue depth / service time
+    emit is called from worker threads, so it must be thread-safe (e.g. queue.Queue.put).
+    Returns the final per-stage stats.
+    """
+    config = config or ScanConfig()
+
+    # Each domain travels through the stages as one dict; once "result" is set,
+    # the remaining stages pass it straight to the sink.
+    def pending(task):
+        return "result" not in task
+
+    cache = get_scan_cache() if config.result_cache_ttl else None
+
+    def fetch(task):
+        task["url"] = construct_search_url(task["domain"], brand_name)
+        if cache:
+            # Single flight: waits here while another session scans the same URL
+            task["cache_key"] = scan_cache_key(task["url"], brand_name, config.deep_scan, config)
+            shared = cache.acquire(task["cache_key"], force=config.force_refresh)
+            if shared is not None:
+                task["result"] = shared_result_note(shared)
+                return task
+            task["owner"] = True
+        content, encoding, error_result = fetch_search_page(task["url"], config)
+        if error_result:
+            task["result"] = error_result
+        else:
+            task["content"], task["encoding"] = content, encoding
+        return task
+
+    def classify(task):
+        content = task.pop("content")
+        if config.parse_processes > 0:
+            # Soup objects can't cross processes, so the pool classifies and extracts in one go
+            task["parsed"] = run_parse(content, task["url"], brand_name, task["encoding"], config)
+            return task
+        page, verdict = classify_search_page(content, task["url"], task["encoding"])
+        if verdict:
+            task["parsed"] = verdict
+        else:
+            task["page"] = page
+        return task
+
+    def extract(task):
+        task["parsed"] = extract_search_page(task.pop("page"), brand_name, config.google_api_key, config.brand_aliases)
+        return task
+
+    def enrich(task):
+        domain = task["domain"]
+
+        def on_deep_result(index, product):
+            emit({"type": "deep_row", "domain": domain, "index": index, "product": dict(product)})
+
+        task["result"] = enrich_scan_result(task.pop("parsed"), task["url"], brand_name, config, on_deep_result=on_deep_result)
+        return task
+
+    def sink(task):
+        try:
+            if task.get("owner"):
+                cache.release(task["cache_key"], task["result"], config.result_cache_ttl)
+        except Exception as e:
+            # Not shared, but this scan still reports it; give up the lease so waiters scan themselves
+            print(f"Could not share the scan result for {task['domain']}: {e}")
+            try:
+                cache.release(task["cache_key"], None)
+            except Exception:
+                pass
+        emit({"type": "domain", "domain": task["domain"], "result": task["result"]})
+
+    def on_sink_error(task, e):
+        # emit failed (e.g. the result could not be stored): report the domain as failed instead
+        try:
+            emit({"type": "domain", "domain": task["domain"], "result": on_error(task, e)["result"]})
+        except Exception as e2:
+            print(f"Could not report {task['domain']}: {e2}")
+
+    def on_error(task, e):
+        # Drop any buffered page data and report the domain as failed
+        for key in ("content", "page", "parsed"):
+            task.pop(key, None)
+        task["result"] = {
+            "status": "Error", "details": str(e), "products": [],
+            "scan_url": task.get("url") or construct_search_url(task["domain"], brand_name)
+        }
+        return task
+
+    size = config.stage_queue_size
+    # With the parse pool on, each classify worker waits on one pooled parse: one worker per pool process
+    classify_workers = config.classify_workers
+    if config.parse_processes > 0:
+        classify_workers = max(classify_workers, parse_pool_size(config.parse_processes))
+    pipe = Pipeline([
+        Stage("fetch", fetch, config.domain_workers, size, when=pending, on_error=on_error),
+        Stage("classify", classify, classify_workers, size, when=pending, on_error=on_error),
+        Stage("extract", extract, config.extract_workers, size, when=lambda task: "page" in task, on_error=on_error),
+        Stage("enrich", enrich, config.enrich_workers, size, when=pending, on_error=on_error),
+        Stage("sink", sink, 1, size, on_error=on_sink_error)
+    ])
+    return pipe.run(
+        ({"domain": domain} for domain in domains),
+        on_stats=lambda stages: emit({"type": "pipeline", "stages": stages})
+    )
+
+def scan_brand(brand_name, domains, config=None, emit=None):
+    """
+    Runs a complete brand scan and returns structured results:
+    {"brand", "summaries": [...], "products": [...], "seller_mix": dict or None, "pipeline": [...]}
+    emit, if given, receives the same progress events as scan_domains
+    (plus {"type": "seller_mix", "estimate"}) while the scan runs.
+    """
+    config = config or ScanConfig()
+    summaries = []
+    products = []
+
+    def collect(event):
+        if event["type"] == "domain":
+            summary, rows = summarize_domain_result(event["domain"], event["result"])
+            summaries.append(summary)
+            products.extend(rows)
+        if emit:
+            emit(event)
+
+    if config.broker_url:
+        # Imported lazily: distributed mode is optional
+        from distributed import distributed_scan_domains
+        pipeline_stats = distributed_scan_domains(domains, brand_name, collect, config)
+    else:
+        pipeline_stats = scan_domains(domains, brand_name, collect, config)
+
+    seller_mix = None
+    if config.estimate_seller_mix:
+        seller_mix = estimate_seller_mix(
+            products, brand_name,
+            authorized_sellers=list(config.authorized_sellers),
+            target_margin=config.sampling_target_margin,
+            use_cache=config.use_cache
+        )
+        if emit:
+            emit({"type": "seller_mix", "estimate": seller_mix})
+
+    return {"brand": brand_name, "summaries": summaries, "products": products, "seller_mix": seller_mix, "pipeline": pipeline_stats}
+
+async def scan_brand_async(brand_name, domains, config=None, emit=None):
+    """ asyncio wrapper around scan_brand (runs in a worker thread). """
+    return await asyncio.to_thread(scan_brand, brand_name, domains, config, emit)
@@ -0,0 +1,93 @@
+"""
+Report exports (CSV / Excel), generated on demand and memoized per scan.
+
+Files are written once per (scan ID, variant, format) into EXPORT_DIR and
+reused by every later download, in any session. The variant names the frame
+the scan was turned into (e.g. "collapsed" near-duplicates). Both writers stream rows to disk, so
+memory use does not grow with the size of the report.
+"""
+import math
+import os
+import time
+import uuid
+
+from openpyxl import Workbook
+
+EXPORT_DIR = "exports"
+EXPORT_CHUNK_ROWS = 5000
+# Exports older than this are removed when a new one is written
+EXPORT_MAX_AGE = 24 * 3600
+
+EXPORT_FORMATS = {
+    "csv": ("brand_products.csv", "text/csv"),
+    "xlsx": ("brand_products.xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+}
+
+
+def export_path(scan_id, fmt, export_dir=EXPORT_DIR, variant=None):
+    name = f"{scan_id}-{variant}" if variant else scan_id
+    return os.path.join(export_dir, f"{name}.{fmt}")
+
+
+def download_name(fmt, variant=None):
+    """ File name offered to the browser. """
+    name, _ = EXPORT_FORMATS[fmt]
+    if not variant:
+        return name
+    stem, ext = os.path.splitext(name)
+    return f"{stem}_{variant}{ext}"
+
+
+def write_csv(df, path):
+    df.to_csv(path, index=False, chunksize=EXPORT_CHUNK_ROWS)
+
+
+def write_xlsx(df, path, sheet_name="Product Data"):
+    """ Constant-memory workbook: rows go straight to disk (openpyxl write-only mode). """
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(sheet_name)
+    ws.append([str(c) for c in df.columns])
+    for row in df.itertuples(index=False, name=None):
+        ws.append([None if isinstance(v, float) and math.isnan(v) else v for v in row])
+    wb.save(path)
+
+
+WRITERS = {
+    "csv": write_csv,
+    "xlsx": write_xlsx
+}
+
+
+def purge_exports(export_dir=EXPORT_DIR, max_age=EXPORT_MAX_AGE):
+    cutoff = time.time() - max_age
+    for name in os.listdir(export_dir):
+        path = os.path.join(export_dir, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def export_report(df, scan_id, fmt, export_dir=EXPORT_DIR, variant=None):
+    """
+    Returns the path of the scan's export in fmt, writing it on first request.
+    Written to a temp file and renamed, so concurrent requests never see a partial file.
+    """
+    path = export_path(scan_id, fmt, export_dir, variant)
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(export_dir, exist_ok=True)
+    purge_exports(export_dir)
+    # Unique per writer: sessions share one process, so a PID alone would collide
+    tmp = f"{path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+    WRITERS[fmt](df, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def read_export(df, scan_id, fmt, variant=None):
+    """ Export file contents, for a deferred download button (read on click, file closed after). """
+    with open(export_report(df, scan_id, fmt, variant=variant), "rb") as f:
+        return f.read()
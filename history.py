@@ -0,0 +1,186 @@
+"""
+Scan history: every scan's platform summaries and product listings in SQLite.
+
+Listings are indexed by (brand, platform), canonical product ID, seller and
+scan time, so questions like "all listings of brand X sold by Y in the last
+30 days" are answered from stored data instead of re-scanning marketplaces.
+Rows are written in one transaction per domain as each domain finishes.
+
+    history = ScanHistory()
+    rows = history.query_listings(brand="Chanel", seller="Cocoblu Retail", days=30)
+"""
+import json
+import sqlite3
+import time
+
+from engine import listing_key
+from prices import PRICE_MIN, parse_prices
+
+HISTORY_FILE = "scan_history.db"
+QUERY_LIMIT = 5000
+
+LISTING_COLUMNS = (
+    "scan_id", "brand", "platform", "domain", "product_key", "product_name", "price", "price_value",
+    "currency", "seller", "availability", "condition", "url", "method", "scanned_at"
+)
+
+
+class ScanHistory:
+    """ SQLite store of past scans. Safe to share across threads and processes. """
+
+    def __init__(self, path=HISTORY_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS scans (
+                    scan_id TEXT PRIMARY KEY,
+                    brand TEXT NOT NULL,
+                    domains TEXT NOT NULL,
+                    source TEXT,
+                    status TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL
+                );
+                CREATE INDEX IF NOT EXISTS idx_scans_brand ON scans (brand COLLATE NOCASE, started_at);
+                CREATE TABLE IF NOT EXISTS domain_results (
+                    scan_id TEXT NOT NULL,
+                    domain TEXT NOT NULL,
+                    status TEXT,
+                    details TEXT,
+                    url TEXT,
+                    product_count INTEGER,
+                    scanned_at REAL NOT NULL,
+                    PRIMARY KEY (scan_id, domain)
+                );
+                CREATE TABLE IF NOT EXISTS listings (
+                    scan_id TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    platform TEXT,
+                    domain TEXT,
+                    product_key TEXT,
+                    product_name TEXT,
+                    price TEXT,
+                    price_value REAL,
+                    currency TEXT,
+                    seller TEXT,
+                    availability TEXT,
+                    condition TEXT,
+                    url TEXT,
+                    method TEXT,
+                    scanned_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_listings_brand_platform ON listings (brand COLLATE NOCASE, platform);
+                CREATE INDEX IF NOT EXISTS idx_listings_product ON listings (product_key);
+                CREATE INDEX IF NOT EXISTS idx_listings_seller ON listings (seller COLLATE NOCASE, scanned_at);
+                CREATE INDEX IF NOT EXISTS idx_listings_time ON listings (scanned_at);
+                CREATE INDEX IF NOT EXISTS idx_listings_scan ON listings (scan_id);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # --- Writes ---
+
+    def start_scan(self, scan_id, brand, domains, source=None):
+        """ Registers a scan; a restarted scan (same ID) starts over with no rows. """
+        with self._connect() as conn:
+            conn.execute("DELETE FROM listings WHERE scan_id = ?", (scan_id,))
+            conn.execute("DELETE FROM domain_results WHERE scan_id = ?", (scan_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO scans (scan_id, brand, domains, source, status, started_at) VALUES (?, ?, ?, ?, 'running', ?)",
+                (scan_id, brand, json.dumps(list(domains)), source, time.time())
+            )
+
+    def record_domain(self, scan_id, brand, summary, products):
+        """ Writes one domain's summary and listings in a single transaction. """
+        now = time.time()
+        products = [p for p in products if p["Detection Method"] != "Summary Only"]
+        prices = parse_prices(
+            [p["Price"] for p in products], [p["Platform"] for p in products], [p["Currency"] for p in products]
+        )
+        values = [None if v != v else v for v in prices[PRICE_MIN].tolist()]
+        currencies = prices["Currency"].astype(object).where(prices["Currency"].notna(), None).tolist()
+        rows = [
+            (
+                scan_id, brand, p["Platform"], summary["Domain"], listing_key(p), p["Product Name"],
+                None if p["Price"] is None else str(p["Price"]), value,
+                currency, p["Seller"], p["Availability"], p["Condition"], p["Product URL"],
+                p["Detection Method"], now
+            )
+            for p, value, currency in zip(products, values, currencies)
+        ]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO domain_results (scan_id, domain, status, details, url, product_count, scanned_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (scan_id, summary["Domain"], summary["Status"], summary["Details"], summary["URL"], summary["ProductCount"], now)
+            )
+            conn.executemany(
+                f"INSERT INTO listings ({', '.join(LISTING_COLUMNS)}) VALUES ({', '.join('?' * len(LISTING_COLUMNS))})",
+                rows
+            )
+
+    def finish_scan(self, scan_id, status="done"):
+        with self._connect() as conn:
+            conn.execute("UPDATE scans SET status = ?, finished_at = ? WHERE scan_id = ?", (status, time.time(), scan_id))
+
+    # --- Queries ---
+
+    def query_listings(self, brand=None, seller=None, platform=None, product_key=None, days=None, since=None, limit=QUERY_LIMIT):
+        """
+        Stored listings matching every given filter, newest first.
+        brand / seller match case-insensitively; days (or since, epoch seconds) bounds scan time.
+        """
+        clauses, args = [], []
+        if brand:
+            clauses.append("brand = ? COLLATE NOCASE")
+            args.append(brand)
+        if seller:
+            clauses.append("seller = ? COLLATE NOCASE")
+            args.append(seller)
+        if platform:
+            clauses.append("platform = ?")
+            args.append(platform)
+        if product_key:
+            clauses.append("product_key = ?")
+            args.append(product_key)
+        if days:
+            since = max(since or 0, time.time() - days * 86400)
+        if since:
+            clauses.append("scanned_at >= ?")
+            args.append(since)
+
+        query = f"SELECT {', '.join(LISTING_COLUMNS)} FROM listings"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY scanned_at DESC LIMIT ?"
+        args.append(limit)
+
+        with self._connect() as conn:
+            rows = conn.execute(query, args).fetchall()
+        return [dict(zip(LISTING_COLUMNS, r)) for r in rows]
+
+    def seller_counts(self, brand, days=None):
+        """ {seller: listing count} for a brand, optionally over the last N days. """
+        query = "SELECT seller, COUNT(*) FROM listings WHERE brand = ? COLLATE NOCASE"
+        args = [brand]
+        if days:
+            query += " AND scanned_at >= ?"
+            args.append(time.time() - days * 86400)
+        with self._connect() as conn:
+            rows = conn.execute(query + " GROUP BY seller ORDER BY COUNT(*) DESC", args).fetchall()
+        return dict(rows)
+
+    def scans(self, brand=None, limit=50):
+        query = "SELECT scan_id, brand, domains, source, status, started_at, finished_at FROM scans"
+        args = []
+        if brand:
+            query += " WHERE brand = ? COLLATE NOCASE"
+            args.append(brand)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY started_at DESC LIMIT ?", args + [limit]).fetchall()
+        return [
+            {"scan_id": r[0], "brand": r[1], "domains": json.loads(r[2]), "source": r[3], "status": r[4], "started_at": r[5], "finished_at": r[6]}
+            for r in rows
+        ]
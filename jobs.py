@@ -0,0 +1,395 @@
+"""
+Background scan jobs.
+
+Scans are queued in a local SQLite store and executed by worker processes
+(`python jobs.py worker`), so they keep running across Streamlit reruns,
+browser refreshes and disconnects. Workers write progress and results back
+to the store as an ordered event log; any session or tab can follow a job
+by its ID.
+"""
+import argparse
+import datetime
+import json
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import uuid
+
+from records import ProductRecord, json_default
+
+JOBS_FILE = "scan_jobs.db"
+
+# Worker processes started by the dashboard
+JOB_WORKERS = 2
+JOB_POLL_SECONDS = 1.0
+# A running job / worker is considered dead after this long without a heartbeat
+HEARTBEAT_SECONDS = 10
+STALE_SECONDS = 60
+
+# Options that must not outlive the job in the store
+SECRET_OPTIONS = ("custom_cookies", "google_api_key")
+
+
+class JobStore:
+    """ SQLite-backed job queue + event log. Safe to share across threads and processes. """
+
+    def __init__(self, path=JOBS_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    brand TEXT NOT NULL,
+                    domains TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    started_at REAL,
+                    finished_at REAL,
+                    heartbeat_at REAL,
+                    worker TEXT,
+                    error TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+                CREATE TABLE IF NOT EXISTS job_events (
+                    job_id TEXT NOT NULL,
+                    seq INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    payload TEXT NOT NULL,
+                    PRIMARY KEY (job_id, seq)
+                );
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    pid INTEGER,
+                    host TEXT,
+                    heartbeat_at REAL,
+                    current_job TEXT
+                );
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    # --- Queue ---
+
+    def submit(self, brand, domains, options=None):
+        job_id = uuid.uuid4().hex[:12]
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, brand, domains, options, status, created_at) VALUES (?, ?, ?, ?, 'queued', ?)",
+                (job_id, brand, json.dumps(list(domains)), json.dumps(options or {}), time.time())
+            )
+        return job_id
+
+    def claim_next(self, worker_id):
+        """
+        Atomically moves the oldest queued job (or a running job whose worker died) to 'running'.
+        Returns the job dict or None.
+        """
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT job_id FROM jobs WHERE status = 'queued' "
+                "OR (status = 'running' AND heartbeat_at < ?) ORDER BY created_at LIMIT 1",
+                (time.time() - STALE_SECONDS,)
+            ).fetchone()
+            if not row:
+                conn.execute("COMMIT")
+                return None
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'running', worker = ?, started_at = ?, heartbeat_at = ? WHERE job_id = ?",
+                (worker_id, now, now, row[0])
+            )
+            # A re-claimed job starts over with a clean event log
+            conn.execute("DELETE FROM job_events WHERE job_id = ?", (row[0],))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return self.get_job(row[0])
+
+    def heartbeat(self, job_id):
+        with self._connect() as conn:
+            conn.execute("UPDATE jobs SET heartbeat_at = ? WHERE job_id = ?", (time.time(), job_id))
+
+    def finish(self, job_id, status="done", error=None):
+        job = self.get_job(job_id)
+        options = {k: v for k, v in (job["options"] if job else {}).items() if k not in SECRET_OPTIONS}
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ?, options = ? WHERE job_id = ?",
+                (status, error, time.time(), json.dumps(options), job_id)
+            )
+
+    def get_job(self, job_id):
+        with self._connect() as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if not row:
+            return None
+        job = dict(row)
+        job["domains"] = json.loads(job["domains"])
+        job["options"] = json.loads(job["options"])
+        return job
+
+    def recent_jobs(self, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT job_id, brand, status, created_at FROM jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,)
+            ).fetchall()
+        return [{"job_id": r[0], "brand": r[1], "status": r[2], "created_at": r[3]} for r in rows]
+
+    # --- Event log ---
+
+    def append_event(self, job_id, event):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            seq = conn.execute(
+                "SELECT COALESCE(MAX(seq), 0) + 1 FROM job_events WHERE job_id = ?", (job_id,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT INTO job_events (job_id, seq, created_at, payload) VALUES (?, ?, ?, ?)",
+                (job_id, seq, time.time(), json.dumps(event, default=json_default))
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return seq
+
+    def events_since(self, job_id, after_seq=0):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT seq, payload FROM job_events WHERE job_id = ? AND seq > ? ORDER BY seq",
+                (job_id, after_seq)
+            ).fetchall()
+        return [(seq, json.loads(payload)) for seq, payload in rows]
+
+    # --- Workers ---
+
+    def worker_heartbeat(self, worker_id, current_job=None):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO workers (worker_id, pid, host, heartbeat_at, current_job) VALUES (?, ?, ?, ?, ?)",
+                (worker_id, os.getpid(), socket.gethostname(), time.time(), current_job)
+            )
+
+    def reserve_workers(self, count):
+        """
+        Registers placeholder rows for the workers missing up to `count` live ones and returns
+        their IDs. A placeholder counts as live until it goes stale, so workers that are still
+        starting up (importing pandas etc.) are not spawned again by the next call.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            live = conn.execute("SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?", (now - STALE_SECONDS,)).fetchone()[0]
+            reserved = [f"pending:{uuid.uuid4().hex[:12]}" for _ in range(max(count - live, 0))]
+            conn.executemany(
+                "INSERT INTO workers (worker_id, pid, host, heartbeat_at, current_job) VALUES (?, NULL, ?, ?, NULL)",
+                [(worker_id, socket.gethostname(), now) for worker_id in reserved]
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+        return reserved
+
+    def spawned_worker(self, reserved_id, pid):
+        """ Renames a placeholder to the ID the started worker heartbeats under (see run_worker). """
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE workers SET worker_id = ?, pid = ? WHERE worker_id = ?",
+                (f"{socket.gethostname()}:{pid}", pid, reserved_id)
+            )
+
+    def live_workers(self):
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE heartbeat_at >= ?", (time.time() - STALE_SECONDS,)
+            ).fetchone()[0]
+
+
+def replay_events(events, state=None):
+    """
+    Folds job events into the dashboard state:
+    scan_summary, all_products, deep_rows (rows of unfinished domains), seller_mix,
+    pipeline (latest per-stage stats), cursor.
+    Pass the previous state back in to apply only new events.
+    """
+    if state is None:
+        state = {"scan_summary": [], "all_products": [], "deep_rows": {}, "seller_mix": None, "pipeline": None, "cursor": 0}
+
+    for seq, event in events:
+        kind = event.get("type")
+        if kind == "deep_row":
+            state["deep_rows"][f"{event['domain']}#{event['index']}"] = ProductRecord.from_mapping(event["product"])
+        elif kind == "domain":
+            state["scan_summary"].append(event["summary"])
+            # Compact records instead of one JSON dict per row
+            state["all_products"].extend(ProductRecord.from_mapping(p) for p in event["products"])
+            prefix = f"{event['domain']}#"
+            state["deep_rows"] = {k: v for k, v in state["deep_rows"].items() if not k.startswith(prefix)}
+        elif kind == "seller_mix":
+            state["seller_mix"] = event["estimate"]
+        elif kind == "pipeline":
+            state["pipeline"] = event["stages"]
+        state["cursor"] = seq
+    return state
+
+
+def execute_job(store, job, worker_id):
+    """ Runs one scan job, streaming its events into the store. """
+    # Imported lazily so the store can be used without the scanning stack
+    from engine import ScanConfig, scan_brand, summarize_domain_result
+    from history import ScanHistory
+
+    job_id = job["job_id"]
+    config = ScanConfig.from_options(job["options"])
+    done = threading.Event()
+
+    # Every job is kept in the scan history (best effort: never fails the job)
+    try:
+        history = ScanHistory()
+        history.start_scan(job_id, job["brand"], job["domains"], source="job")
+    except Exception as e:
+        print(f"Scan history unavailable: {e}")
+        history = None
+    # ... and appended to the Parquet archive for long-range analytics (needs pyarrow)
+    try:
+        from archive import ScanArchive
+        archive = ScanArchive()
+    except Exception as e:
+        print(f"Scan archive unavailable: {e}")
+        archive = None
+    if archive:
+        # A re-claimed job runs again under the same ID: drop what its earlier run archived
+        created = datetime.datetime.fromtimestamp(job["created_at"], datetime.timezone.utc)
+        try:
+            archive.drop_scan(job_id, since=created.strftime("%Y-%m-%d"))
+        except Exception as e:
+            print(f"Scan archive cleanup failed: {e}")
+    # Sellers seen in the scan extend the seller registry
+    try:
+        from sellers import SellerRegistry
+        sellers = SellerRegistry()
+    except Exception as e:
+        print(f"Seller registry unavailable: {e}")
+        sellers = None
+
+    def keep_alive():
+        while not done.wait(HEARTBEAT_SECONDS):
+            store.heartbeat(job_id)
+            store.worker_heartbeat(worker_id, job_id)
+
+    def emit(event):
+        if event["type"] == "domain":
+            summary, products = summarize_domain_result(event["domain"], event["result"])
+            event = {"type": "domain", "domain": event["domain"], "summary": summary, "products": products}
+            if history:
+                try:
+                    history.record_domain(job_id, job["brand"], summary, products)
+                except Exception as e:
+                    print(f"Scan history write failed: {e}")
+            if archive:
+                try:
+                    archive.append(job_id, job["brand"], summary["Domain"], products)
+                except Exception as e:
+                    print(f"Scan archive write failed: {e}")
+            if sellers:
+                try:
+                    sellers.update_from_products(products)
+                except Exception as e:
+                    print(f"Seller registry update failed: {e}")
+        store.append_event(job_id, event)
+
+    pulse = threading.Thread(target=keep_alive, daemon=True)
+    pulse.start()
+    status = "done"
+    try:
+        scan_brand(job["brand"], job["domains"], config, emit)
+        store.finish(job_id, "done")
+    except Exception as e:
+        status = "failed"
+        store.finish(job_id, "failed", str(e))
+    finally:
+        done.set()
+        if history:
+            try:
+                history.finish_scan(job_id, status)
+            except Exception:
+                pass
+
+
+def run_worker(path=JOBS_FILE, poll_interval=JOB_POLL_SECONDS, once=False):
+    """ Worker loop: claim jobs from the store and execute them one at a time. """
+    from engine import share_parse_cores
+    store = JobStore(path)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    # Every worker runs its own parse pool: split the cores between them
+    share_parse_cores(JOB_WORKERS)
+    print(f"Scan worker {worker_id} polling {path}")
+    while True:
+        store.worker_heartbeat(worker_id)
+        job = store.claim_next(worker_id)
+        if job:
+            print(f"[{worker_id}] Running job {job['job_id']} ({job['brand']})")
+            execute_job(store, job, worker_id)
+            continue
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+def ensure_workers(count=JOB_WORKERS, path=JOBS_FILE):
+    """
+    Starts worker processes until `count` live workers are registered.
+    Workers are detached, so they outlive the Streamlit script run that started them.
+    """
+    path = os.path.abspath(path)
+    store = JobStore(path)
+    # Reserved before spawning, so concurrent / repeated calls see them as live right away
+    reserved = store.reserve_workers(count)
+    script = os.path.abspath(__file__)
+    for reserved_id in reserved:
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, script, "worker", "--db", path],
+                cwd=os.path.dirname(script),
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+                start_new_session=True
+            )
+        except OSError as e:
+            print(f"Could not start scan worker: {e}")
+            continue
+        store.spawned_worker(reserved_id, proc.pid)
+    return len(reserved)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Brand Guardian Pro scan job worker")
+    sub = parser.add_subparsers(dest="command", required=True)
+    worker_cmd = sub.add_parser("worker", help="Process queued scan jobs")
+    worker_cmd.add_argument("--db", default=JOBS_FILE, help="Job store path")
+    worker_cmd.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    if args.command == "worker":
+        run_worker(args.db, once=args.once)
@@ -0,0 +1,366 @@
+"""
+Scheduled brand monitoring with snapshot diffs.
+
+Each monitored brand is re-scanned on its interval. Every run is stored as
+a snapshot keyed by canonical product ID (see engine.listing_key)
+and compared with the previous one by hashing each listing's search-page
+fields. Only new or changed listings get a deep scan; unchanged listings
+keep the seller/availability resolved on an earlier run. The diff (new,
+removed, price and seller changes) is stored per run.
+
+    python monitor.py add --brand Chanel --every 6
+    python monitor.py run                  # scheduler loop
+    python monitor.py changes --brand Chanel
+"""
+import argparse
+import dataclasses
+import hashlib
+import json
+import sqlite3
+import time
+import uuid
+from urllib.parse import urlparse
+
+from records import json_default
+from engine import (
+    ScanConfig,
+    listing_key,
+    parse_price_value,
+    run_deep_scan,
+    scan_brand
+)
+
+MONITOR_FILE = "monitor.db"
+DEFAULT_INTERVAL_HOURS = 6
+SCHEDULER_POLL_SECONDS = 60
+
+# Search-page fields that define a listing's state; any change triggers a deep scan
+HASHED_FIELDS = ("Product Name", "Price", "Currency", "Seller", "Availability", "Condition")
+# Scan statuses that mean the platform's listings were actually seen
+# (a blocked platform must not report all its listings as removed)
+COMPLETE_STATUSES = ("Found", "Found (AI)", "Not Found")
+
+
+def listing_hash(product, fields=HASHED_FIELDS):
+    raw = json.dumps([str(product.get(f, "")) for f in fields], ensure_ascii=False)
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def known(value):
+    return value not in (None, "", "N/A", "Unknown", "-")
+
+
+class MonitorStore:
+    """ SQLite store of monitors, latest listings, per-run snapshots and diffs. """
+
+    def __init__(self, path=MONITOR_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS monitors (
+                    brand TEXT PRIMARY KEY,
+                    domains TEXT NOT NULL,
+                    options TEXT NOT NULL,
+                    interval_seconds REAL NOT NULL,
+                    next_run_at REAL NOT NULL,
+                    last_run_id TEXT
+                );
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    brand TEXT NOT NULL,
+                    started_at REAL NOT NULL,
+                    finished_at REAL NOT NULL,
+                    stats TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_runs_brand ON runs (brand, started_at);
+                CREATE TABLE IF NOT EXISTS listings (
+                    brand TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    platform TEXT,
+                    search_hash TEXT NOT NULL,
+                    row TEXT NOT NULL,
+                    first_seen REAL NOT NULL,
+                    last_seen REAL NOT NULL,
+                    present INTEGER NOT NULL DEFAULT 1,
+                    PRIMARY KEY (brand, product_key)
+                );
+                CREATE TABLE IF NOT EXISTS snapshot_items (
+                    run_id TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    row_hash TEXT NOT NULL,
+                    PRIMARY KEY (run_id, product_key)
+                );
+                CREATE TABLE IF NOT EXISTS changes (
+                    run_id TEXT NOT NULL,
+                    brand TEXT NOT NULL,
+                    product_key TEXT NOT NULL,
+                    change TEXT NOT NULL,
+                    old_value TEXT,
+                    new_value TEXT,
+                    product TEXT
+                );
+                CREATE INDEX IF NOT EXISTS idx_changes_brand ON changes (brand, run_id);
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30)
+
+    # --- Monitors ---
+
+    def add_monitor(self, brand, domains, interval_hours=DEFAULT_INTERVAL_HOURS, options=None):
+        """ Adds (or updates) a monitor; its first run is due immediately. """
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO monitors (brand, domains, options, interval_seconds, next_run_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (brand) DO UPDATE SET domains = excluded.domains, options = excluded.options, "
+                "interval_seconds = excluded.interval_seconds",
+                (brand, json.dumps(list(domains)), json.dumps(options or {}), interval_hours * 3600, time.time())
+            )
+
+    def remove_monitor(self, brand):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM monitors WHERE brand = ?", (brand,))
+
+    def monitors(self, due_only=False):
+        query = "SELECT brand, domains, options, interval_seconds, next_run_at, last_run_id FROM monitors"
+        args = ()
+        if due_only:
+            query += " WHERE next_run_at <= ?"
+            args = (time.time(),)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY next_run_at", args).fetchall()
+        return [
+            {
+                "brand": r[0], "domains": json.loads(r[1]), "options": json.loads(r[2]),
+                "interval_seconds": r[3], "next_run_at": r[4], "last_run_id": r[5]
+            }
+            for r in rows
+        ]
+
+    def schedule_next(self, brand, next_run_at):
+        with self._connect() as conn:
+            conn.execute("UPDATE monitors SET next_run_at = ? WHERE brand = ?", (next_run_at, brand))
+
+    # --- Snapshots ---
+
+    def previous_listings(self, brand):
+        """ {product_key: {"search_hash", "platform", "row"}} for listings present in the last run. """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT product_key, search_hash, platform, row FROM listings WHERE brand = ? AND present = 1",
+                (brand,)
+            ).fetchall()
+        return {r[0]: {"search_hash": r[1], "platform": r[2], "row": json.loads(r[3])} for r in rows}
+
+    def record_run(self, run_id, brand, started_at, current, removed, diff, stats):
+        """
+        current: {product_key: (search_hash, row)}; removed: product keys no longer listed.
+        Writes the snapshot, the latest listing state and the diff in one transaction.
+        """
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT INTO listings (brand, product_key, platform, search_hash, row, first_seen, last_seen, present) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, 1) "
+                "ON CONFLICT (brand, product_key) DO UPDATE SET platform = excluded.platform, "
+                "search_hash = excluded.search_hash, row = excluded.row, last_seen = excluded.last_seen, present = 1",
+                [
+                    (brand, key, row["Platform"], search_hash, json.dumps(row, ensure_ascii=False, default=json_default), now, now)
+                    for key, (search_hash, row) in current.items()
+                ]
+            )
+            conn.executemany(
+                "UPDATE listings SET present = 0 WHERE brand = ? AND product_key = ?",
+                [(brand, key) for key in removed]
+            )
+            conn.executemany(
+                "INSERT INTO snapshot_items (run_id, product_key, row_hash) VALUES (?, ?, ?)",
+                [(run_id, key, listing_hash(row)) for key, (_, row) in current.items()]
+            )
+            conn.executemany(
+                "INSERT INTO changes (run_id, brand, product_key, change, old_value, new_value, product) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (run_id, brand, d["key"], d["change"], d.get("old"), d.get("new"), json.dumps(d["product"], ensure_ascii=False, default=json_default))
+                    for d in diff
+                ]
+            )
+            conn.execute(
+                "INSERT INTO runs (run_id, brand, started_at, finished_at, stats) VALUES (?, ?, ?, ?, ?)",
+                (run_id, brand, started_at, now, json.dumps(stats))
+            )
+            conn.execute("UPDATE monitors SET last_run_id = ? WHERE brand = ?", (run_id, brand))
+
+    def runs(self, brand, limit=20):
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT run_id, started_at, finished_at, stats FROM runs WHERE brand = ? ORDER BY started_at DESC LIMIT ?",
+                (brand, limit)
+            ).fetchall()
+        return [{"run_id": r[0], "started_at": r[1], "finished_at": r[2], **json.loads(r[3])} for r in rows]
+
+    def changes(self, brand, run_id=None):
+        """ Diff rows of one run (default: the latest run of the brand). """
+        if run_id is None:
+            latest = self.runs(brand, limit=1)
+            if not latest:
+                return []
+            run_id = latest[0]["run_id"]
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT product_key, change, old_value, new_value, product FROM changes WHERE run_id = ?",
+                (run_id,)
+            ).fetchall()
+        return [
+            {"key": r[0], "change": r[1], "old": r[2], "new": r[3], "product": json.loads(r[4])}
+            for r in rows
+        ]
+
+
+def diff_listing(key, row, prev):
+    """ Field-level changes between the stored and the current state of one listing. """
+    changes = []
+    old = prev["row"]
+    old_price, new_price = parse_price_value(old.get("Price")), parse_price_value(row.get("Price"))
+    if old_price and new_price:
+        price_changed = old_price != new_price
+    else:
+        price_changed = str(old.get("Price")) != str(row.get("Price"))
+    if price_changed:
+        changes.append({"key": key, "change": "price", "old": str(old.get("Price")), "new": str(row.get("Price")), "product": row})
+    if known(row.get("Seller")) and known(old.get("Seller")) and str(row["Seller"]).strip().lower() != str(old["Seller"]).strip().lower():
+        changes.append({"key": key, "change": "seller", "old": old["Seller"], "new": row["Seller"], "product": row})
+    return changes
+
+
+def run_monitor(store, monitor):
+    """
+    Runs one monitoring pass: search-page scan, hash diff against the previous
+    snapshot, deep scan of new/changed listings only, then stores the snapshot.
+    Returns the run stats.
+    """
+    brand = monitor["brand"]
+    started = time.time()
+    run_id = uuid.uuid4().hex[:12]
+    config = ScanConfig.from_options(monitor["options"])
+
+    # Search pages only; deep scans are limited to churn below
+    result = scan_brand(brand, monitor["domains"], dataclasses.replace(config, deep_scan=False, estimate_seller_mix=False))
+    scanned_platforms = {
+        urlparse(s["URL"]).netloc for s in result["summaries"] if s["Status"] in COMPLETE_STATUSES
+    }
+
+    previous = store.previous_listings(brand)
+    current = {}
+    churn = []
+    churn_keys = []
+    for row in result["products"]:
+        if row["Detection Method"] == "Summary Only":
+            continue
+        key = listing_key(row)
+        search_hash = listing_hash(row)
+        prev = previous.get(key)
+        if prev and prev["search_hash"] == search_hash:
+            # Unchanged: keep what earlier deep scans resolved
+            for field in ("Seller", "Availability"):
+                if not known(row.get(field)) and known(prev["row"].get(field)):
+                    row[field] = prev["row"][field]
+        else:
+            churn.append(row)
+            churn_keys.append(key)
+        current[key] = (search_hash, row)
+
+    deep_stats = None
+    if config.deep_scan and churn:
+        listed = len(churn)
+        deep_stats = run_deep_scan(
+            churn, brand,
+            budget_seconds=config.deep_scan_budget,
+            max_items=config.deep_scan_max_items,
+            use_cache=config.use_cache,
+            source=config.deep_scan_source
+        )
+        # The deep scan may swap a churn row for a resolved copy (offers view): re-read it
+        for key, row in zip(churn_keys, churn):
+            current[key] = (current[key][0], row)
+        # Offers views append one row per additional seller
+        for row in churn[listed:]:
+            current[f"{listing_key(row)}|{str(row['Seller']).strip().lower()}"] = (listing_hash(row), row)
+
+    diff = []
+    for key, (_, row) in current.items():
+        prev = previous.get(key)
+        if prev is None:
+            diff.append({"key": key, "change": "new", "product": row})
+        else:
+            diff.extend(diff_listing(key, row, prev))
+    removed = [key for key, prev in previous.items() if key not in current and prev["platform"] in scanned_platforms]
+    diff.extend({"key": key, "change": "removed", "product": previous[key]["row"]} for key in removed)
+
+    stats = {
+        "listings": len(current),
+        "churn": len(churn),
+        "deep_scanned": deep_stats["fetched"] + deep_stats["cached"] if deep_stats else 0,
+        "new": sum(1 for d in diff if d["change"] == "new"),
+        "removed": len(removed),
+        "price_changes": sum(1 for d in diff if d["change"] == "price"),
+        "seller_changes": sum(1 for d in diff if d["change"] == "seller"),
+        "platforms": [{"Domain": s["Domain"], "Status": s["Status"]} for s in result["summaries"]]
+    }
+    store.record_run(run_id, brand, started, current, removed, diff, stats)
+    return {"run_id": run_id, "brand": brand, **stats}
+
+
+def run_scheduler(path=MONITOR_FILE, poll_interval=SCHEDULER_POLL_SECONDS, once=False):
+    """ Scheduler loop: runs every due monitor, then sleeps. """
+    store = MonitorStore(path)
+    print(f"Monitor scheduler polling {path}")
+    while True:
+        for monitor in store.monitors(due_only=True):
+            # Reschedule first so a failing brand can't spin
+            store.schedule_next(monitor["brand"], time.time() + monitor["interval_seconds"])
+            try:
+                stats = run_monitor(store, monitor)
+                print(
+                    f"[{monitor['brand']}] {stats['listings']} listings, {stats['new']} new, {stats['removed']} removed, "
+                    f"{stats['price_changes']} price / {stats['seller_changes']} seller changes, {stats['deep_scanned']} deep-scanned"
+                )
+            except Exception as e:
+                print(f"[{monitor['brand']}] Monitoring run failed: {e}")
+        if once:
+            return
+        time.sleep(poll_interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Brand Guardian Pro monitoring scheduler")
+    parser.add_argument("--db", default=MONITOR_FILE, help="Monitor store path")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    add_cmd = sub.add_parser("add", help="Monitor a brand")
+    add_cmd.add_argument("--brand", required=True)
+    add_cmd.add_argument("--domains", default="domain_config.json", help="Domain list file or comma-separated domains")
+    add_cmd.add_argument("--every", type=float, default=DEFAULT_INTERVAL_HOURS, help="Interval in hours")
+    add_cmd.add_argument("--deep-scan", action="store_true", help="Deep-scan new/changed listings")
+
+    remove_cmd = sub.add_parser("remove", help="Stop monitoring a brand")
+    remove_cmd.add_argument("--brand", required=True)
+
+    run_cmd = sub.add_parser("run", help="Run the scheduler")
+    run_cmd.add_argument("--once", action="store_true", help="Run due monitors once and exit")
+
+    changes_cmd = sub.add_parser("changes", help="Print the latest diff of a brand")
+    changes_cmd.add_argument("--brand", required=True)
+    args = parser.parse_args()
+
+    store = MonitorStore(args.db)
+    if args.command == "add":
+        from batch_scan import read_list
+        store.add_monitor(args.brand, read_list(args.domains), args.every, ScanConfig(deep_scan=args.deep_scan).to_options())
+    elif args.command == "remove":
+        store.remove_monitor(args.brand)
+    elif args.command == "run":
+        run_scheduler(args.db, once=args.once)
+    elif args.command == "changes":
+        for d in store.changes(args.brand):
+            print(json.dumps({k: v for k, v in d.items() if k != "product"}, ensure_ascii=False))
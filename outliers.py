@@ -0,0 +1,172 @@
+"""
+Price-outlier detection for counterfeit triage.
+
+Listings priced far below what the same brand sells for elsewhere are the
+usual counterfeit / grey-market signal. Per group (brand, category if
+present, and currency, across all platforms) we compute robust statistics,
+median, MAD and quantiles, vectorized over all groups at once: rows are
+sorted by (group, price) so every group is a contiguous slice and each
+quantile is an index lookup (MAD repeats this on the deviations). A listing
+is flagged when its robust z-score 0.6745 * (x - median) / MAD, on log
+prices, is below -OUTLIER_Z.
+
+    df = flag_price_outliers(normalize_prices(records_to_frame(products)))
+    df[df["Price Outlier"]]
+"""
+import numpy as np
+import pandas as pd
+
+from prices import PRICE_MIN, parse_prices
+
+# Iglewicz & Hoaglin's cut-off for the modified z-score
+OUTLIER_Z = 3.5
+# Groups smaller than this get statistics but no flags
+MIN_GROUP_SIZE = 5
+STAT_QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+TYPICAL_PRICE = "Typical Price"
+PRICE_Z = "Price Z"
+PRICE_OUTLIER = "Price Outlier"
+
+
+def _group_order(values, codes, n_groups):
+    """ Permutation sorting by (group, value): value argsort, then a stable sort on the codes. """
+    order = np.argsort(values)
+    # Small integer keys get NumPy's radix sort
+    dtype = np.uint16 if n_groups <= np.iinfo(np.uint16).max else np.int64
+    return order[np.argsort(codes[order].astype(dtype), kind="stable")]
+
+
+def _group_quantiles(values, codes, n_groups, quantiles):
+    """
+    Linear-interpolated quantiles of values per group code, shape (n_groups, len(quantiles)).
+    values must not contain NaN; empty groups give NaN.
+    """
+    ordered = values[_group_order(values, codes, n_groups)]
+    counts = np.bincount(codes, minlength=n_groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+    q = np.asarray(quantiles, dtype=np.float64)
+    pos = starts[:, None] + q[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(pos).astype(np.int64)
+    upper = np.minimum(lower + 1, starts[:, None] + np.maximum(counts - 1, 0)[:, None])
+    if not len(ordered):
+        return np.full((n_groups, len(q)), np.nan)
+    lower = np.minimum(lower, len(ordered) - 1)
+    upper = np.minimum(upper, len(ordered) - 1)
+    result = ordered[lower] + (pos - lower) * (ordered[upper] - ordered[lower])
+    result[counts == 0] = np.nan
+    return result
+
+
+def robust_price_stats(prices, codes, n_groups=None, quantiles=STAT_QUANTILES):
+    """
+    Per-group statistics of prices (NaN prices ignored).
+    Returns {"count", "median", "mad", "quantiles"} arrays indexed by group code
+    ("quantiles" has one column per entry of quantiles).
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    n_groups = int(codes.max()) + 1 if n_groups is None and len(codes) else (n_groups or 0)
+
+    valid = ~np.isnan(prices) & (codes >= 0)
+    values, groups = prices[valid], codes[valid]
+    counts = np.bincount(groups, minlength=n_groups)
+
+    quantile_values = _group_quantiles(values, groups, n_groups, tuple(quantiles) + (0.5,))
+    median = quantile_values[:, -1]
+    deviations = np.abs(values - median[groups])
+    mad = _group_quantiles(deviations, groups, n_groups, (0.5,))[:, 0]
+    # All-equal majority (MAD 0): fall back to the scaled mean absolute deviation
+    mean_ad = np.bincount(groups, weights=deviations, minlength=n_groups) / np.maximum(counts, 1)
+    mad = np.where(mad > 0, mad, mean_ad * 1.2533 * 0.6745)
+
+    return {"count": counts, "median": median, "mad": mad, "quantiles": quantile_values[:, :-1]}
+
+
+def score_price_outliers(prices, codes, threshold=OUTLIER_Z, min_group_size=MIN_GROUP_SIZE):
+    """
+    Robust z-score of every price (log scale) against its group, plus the low-price flag.
+    Returns (z, flagged, typical) arrays aligned with prices; typical is the group median price.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    codes = np.asarray(codes, dtype=np.int64)
+    # Prices spread multiplicatively (a 10x discount matters at any price level): score log prices
+    with np.errstate(divide="ignore", invalid="ignore"):
+        logs = np.where(prices > 0, np.log(prices), np.nan)
+    stats = robust_price_stats(logs, codes, quantiles=())
+    if not len(stats["count"]):
+        empty = np.full(len(prices), np.nan)
+        return empty, np.zeros(len(prices), dtype=bool), empty
+
+    safe = np.maximum(codes, 0)
+    center = np.where(codes >= 0, stats["median"][safe], np.nan)
+    mad = stats["mad"][safe]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z = np.where(mad > 0, 0.6745 * (logs - center) / mad, 0.0)
+    z[np.isnan(logs) | (codes < 0)] = np.nan
+    typical = np.exp(center)
+
+    enough = stats["count"][safe] >= min_group_size
+    flagged = enough & (z <= -threshold)
+    return z, flagged, typical
+
+
+def product_price_outliers(products, threshold=OUTLIER_Z, min_group_size=MIN_GROUP_SIZE):
+    """ Low-price flags (bool array) for raw product rows, grouped by currency (and "Brand" if set). """
+    if not products:
+        return np.zeros(0, dtype=bool)
+    parsed = parse_prices(
+        [p["Price"] for p in products], [p["Platform"] for p in products], [p["Currency"] for p in products]
+    )
+    parsed["Brand"] = [p.get("Brand") for p in products]
+    codes = _group_codes(parsed, ["Brand", "Currency"])
+    return score_price_outliers(parsed[PRICE_MIN].to_numpy(), codes, threshold, min_group_size)[1]
+
+
+def outlier_groups(df, by=None):
+    """ Grouping columns present in df: brand and category (if any), always currency. """
+    if by is not None:
+        return [c for c in by if c in df.columns]
+    return [c for c in ("Brand", "Category", "Currency") if c in df.columns]
+
+
+def _group_codes(df, by):
+    if not by:
+        return np.zeros(len(df), dtype=np.int64)
+    return df.groupby(by, observed=True, sort=False, dropna=False).ngroup().to_numpy(dtype=np.int64)
+
+
+def flag_price_outliers(df, by=None, threshold=OUTLIER_Z, min_group_size=MIN_GROUP_SIZE):
+    """
+    Copy of a normalized product frame (see prices.normalize_prices) with
+    TYPICAL_PRICE (group median), PRICE_Z and the boolean PRICE_OUTLIER column.
+    """
+    if df.empty or PRICE_MIN not in df.columns:
+        return df
+    z, flagged, typical = score_price_outliers(
+        df[PRICE_MIN].to_numpy(dtype=np.float64), _group_codes(df, outlier_groups(df, by)), threshold, min_group_size
+    )
+    df = df.copy()
+    df[TYPICAL_PRICE] = np.round(typical, 2)
+    df[PRICE_Z] = np.round(z, 2)
+    df[PRICE_OUTLIER] = flagged
+    return df
+
+
+def price_stats_table(df, by=None):
+    """ One row of robust price statistics per group (for the dashboard). """
+    by = outlier_groups(df, by)
+    if df.empty or PRICE_MIN not in df.columns:
+        return pd.DataFrame()
+    codes = _group_codes(df, by)
+    stats = robust_price_stats(df[PRICE_MIN].to_numpy(dtype=np.float64), codes)
+    keys = df[by].assign(_code=codes).drop_duplicates("_code").sort_values("_code") if by else pd.DataFrame(index=[0])
+    table = keys.drop(columns="_code", errors="ignore").reset_index(drop=True)
+    table["Listings"] = stats["count"]
+    table["Median"] = stats["median"]
+    table["MAD"] = stats["mad"]
+    for i, q in enumerate(STAT_QUANTILES):
+        if q != 0.5:
+            table[f"P{int(q * 100)}"] = stats["quantiles"][:, i]
+    return table[table["Listings"] > 0].reset_index(drop=True)
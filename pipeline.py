@@ -0,0 +1,179 @@
+"""
+Staged pipelines connected by bounded queues.
+
+Each Stage runs its own pool of worker threads and hands its output to the
+next stage's queue. Queues are bounded, so a slow stage blocks the stages
+in front of it (backpressure) instead of letting them buffer unbounded work
+(e.g. raw HTML) in memory. Every stage records queue depth, service time
+and time spent blocked on the next stage, which shows where throughput is lost.
+
+    pipe = Pipeline([Stage("fetch", fetch, workers=5), Stage("parse", parse, workers=2)])
+    stats = pipe.run(items)
+"""
+import queue
+import threading
+import time
+
+STAGE_QUEUE_SIZE = 4
+STATS_INTERVAL = 2.0
+
+_STOP = object()
+
+
+class Stage:
+    """
+    One pipeline step: func(item) -> item for the next stage (None drops it).
+    Items for which when(item) is False are passed through untouched.
+    If func raises, on_error(item, exc) supplies the item to forward (None drops it).
+    """
+
+    def __init__(self, name, func, workers=1, queue_size=STAGE_QUEUE_SIZE, when=None, on_error=None):
+        self.name = name
+        self.func = func
+        self.workers = max(int(workers), 1)
+        self.queue = queue.Queue(maxsize=max(int(queue_size), 1))
+        self.when = when
+        self.on_error = on_error
+        self.next = None # Downstream Stage, set by Pipeline
+
+        self._lock = threading.Lock()
+        self._threads = []
+        self._running = 0
+        self.processed = 0
+        self.passed = 0
+        self.errors = 0
+        self.busy_seconds = 0.0
+        self.blocked_seconds = 0.0 # Waiting for room in the next stage's queue
+        self.max_depth = 0
+
+    def put(self, item):
+        self.queue.put(item)
+        depth = self.queue.qsize()
+        if depth > self.max_depth:
+            with self._lock:
+                self.max_depth = max(self.max_depth, depth)
+
+    def start(self):
+        self._running = self.workers
+        for i in range(self.workers):
+            t = threading.Thread(target=self._work, name=f"{self.name}-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        """ Lets the workers drain the queue and exit. """
+        for _ in range(self.workers):
+            self.queue.put(_STOP)
+
+    def join(self):
+        for t in self._threads:
+            t.join()
+
+    def _forward(self, item):
+        if item is None or self.next is None:
+            return
+        started = time.perf_counter()
+        self.next.put(item)
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.blocked_seconds += waited
+
+    def _work(self):
+        while True:
+            item = self.queue.get()
+            if item is _STOP:
+                break
+
+            if self.when is not None and not self.when(item):
+                with self._lock:
+                    self.passed += 1
+                self._forward(item)
+                continue
+
+            started = time.perf_counter()
+            failed = False
+            try:
+                out = self.func(item)
+            except Exception as e:
+                failed = True
+                out = self.on_error(item, e) if self.on_error else None
+                if not self.on_error:
+                    print(f"Pipeline stage {self.name} dropped an item: {e}")
+            elapsed = time.perf_counter() - started
+
+            with self._lock:
+                self.processed += 1
+                self.busy_seconds += elapsed
+                if failed:
+                    self.errors += 1
+            self._forward(out)
+
+        # Last worker out shuts down the next stage
+        with self._lock:
+            self._running -= 1
+            last = self._running == 0
+        if last and self.next is not None:
+            self.next.stop()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "stage": self.name,
+                "workers": self.workers,
+                "queue_depth": self.queue.qsize(),
+                "max_depth": self.max_depth,
+                "queue_size": self.queue.maxsize,
+                "processed": self.processed,
+                "passed": self.passed,
+                "errors": self.errors,
+                "avg_service_ms": round(self.busy_seconds / self.processed * 1000, 1) if self.processed else 0.0,
+                "busy_seconds": round(self.busy_seconds, 2),
+                "blocked_seconds": round(self.blocked_seconds, 2)
+            }
+
+
+class Pipeline:
+    """ Stages chained in order; the first stage's queue is the pipeline input. """
+
+    def __init__(self, stages):
+        self.stages = list(stages)
+        for upstream, downstream in zip(self.stages, self.stages[1:]):
+            upstream.next = downstream
+
+    def stats(self):
+        return [stage.stats() for stage in self.stages]
+
+    def run(self, items, on_stats=None, stats_interval=STATS_INTERVAL):
+        """
+        Feeds items through every stage and waits until all are done.
+        on_stats(stats), if given, is called every stats_interval seconds and once at the end.
+        Returns the final per-stage stats.
+        """
+        for stage in self.stages:
+            stage.start()
+
+        done = threading.Event()
+        reporter = None
+        if on_stats:
+            def report():
+                while not done.wait(stats_interval):
+                    on_stats(self.stats())
+            reporter = threading.Thread(target=report, daemon=True)
+            reporter.start()
+
+        try:
+            # put() blocks while the first stage is saturated
+            for item in items:
+                self.stages[0].put(item)
+        finally:
+            self.stages[0].stop()
+            for stage in self.stages:
+                stage.join()
+            done.set()
+            if reporter:
+                reporter.join()
+
+        final = self.stats()
+        if on_stats:
+            on_stats(final)
+        return final
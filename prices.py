@@ -0,0 +1,215 @@
+"""
+Price normalization over whole result batches.
+
+The Price column holds whatever an extractor saw: "₹1,299", "$45.00 to $60.00",
+raw numbers from the Flipkart Redux path, "N/A", or a stringified dict from
+find_products_in_state. parse_prices() turns a batch of those into numeric
+min / max plus an ISO currency with array-at-a-time regex operations
+(Arrow compute; each distinct price string is parsed once), falling back
+to the platform's default currency.
+
+    df = normalize_prices(records_to_frame(products))
+    df.sort_values("Price Min")
+"""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+PRICE_MIN = "Price Min"
+PRICE_MAX = "Price Max"
+
+# Marketplaces whose domain doesn't tell the currency
+DOMAIN_CURRENCIES = {
+    "nykaa.com": "INR",
+    "flipkart.com": "INR",
+    "myntra.com": "INR",
+    "ajio.com": "INR",
+    "tatacliq.com": "INR",
+    "meesho.com": "INR",
+    "snapdeal.com": "INR",
+    "purplle.com": "INR"
+}
+
+# Domain suffix -> currency, most specific first
+TLD_CURRENCIES = (
+    (".co.uk", "GBP"), (".uk", "GBP"),
+    (".com.au", "AUD"), (".au", "AUD"),
+    (".co.jp", "JPY"), (".jp", "JPY"),
+    (".in", "INR"), (".ca", "CAD"), (".sg", "SGD"), (".ae", "AED"),
+    (".de", "EUR"), (".fr", "EUR"), (".it", "EUR"), (".es", "EUR"),
+    (".nl", "EUR"), (".ie", "EUR"), (".at", "EUR"), (".be", "EUR"),
+    (".com", "USD")
+)
+
+ISO_CODES = ("USD", "INR", "GBP", "EUR", "AUD", "CAD", "JPY", "SGD", "AED", "CNY")
+
+# Currency marker in the price text -> ISO code. "$" / "¥" are ambiguous and
+# resolve to the platform's currency when it uses that symbol.
+SYMBOL_CURRENCIES = {
+    "US$": "USD", "AU$": "AUD", "A$": "AUD", "CA$": "CAD", "C$": "CAD", "S$": "SGD",
+    "₹": "INR", "RS": "INR", "£": "GBP", "€": "EUR", "$": "$", "¥": "¥"
+}
+DOLLAR_CURRENCIES = frozenset(("USD", "AUD", "CAD", "SGD"))
+YEN_CURRENCIES = frozenset(("JPY", "CNY"))
+
+_AMOUNT = r"\d[\d,.]*\d|\d"
+_CURRENCY = r"US\s?\$|AU\s?\$|A\$|CA\s?\$|C\$|S\$|₹|Rs\.?|£|€|\$|¥|\b(?:" + "|".join(ISO_CODES) + r")\b"
+# One pass per string: marker before, first amount, range end ("$45.00 to $60.00"), marker after
+_PRICE_RE = (
+    rf"(?P<pre>{_CURRENCY})?\s*(?P<low>{_AMOUNT})"
+    rf"(?:\s*(?:-|–|to)\s*\D{{0,4}}?(?P<high>{_AMOUNT}))?"
+    rf"(?:\s*(?P<post>{_CURRENCY}))?"
+)
+# Stringified price objects: "{'value': 1299, 'currency': 'INR'}"
+_DICT_AMOUNT_RE = r"'(?:value|decimalValue|amount|price|finalPrice|sellingPrice)':\s*'?(?P<v>[\d.,]+)"
+_DICT_CURRENCY_RE = r"'currency(?:Code)?':\s*'(?P<v>[A-Z]{3})'"
+# 1.299,00 (decimal comma) vs 1,299.00
+_DECIMAL_COMMA_RE = r"^\d{1,3}(?:\.\d{3})*,\d{1,2}$"
+# 1.299 / 12.500.000: dot thousands grouping without decimals ("1.299 €" on amazon.de).
+# None of ISO_CODES has three decimals, so a dot before exactly three digits is never a decimal point.
+_DOT_GROUPING_RE = r"^[1-9]\d{0,2}(?:\.\d{3})+$"
+
+
+def domain_currency(platform):
+    """ Default ISO currency of a marketplace hostname (None if unknown). """
+    host = str(platform or "").lower().split(":")[0]
+    if host.startswith("www."):
+        host = host[4:]
+    if host in DOMAIN_CURRENCIES:
+        return DOMAIN_CURRENCIES[host]
+    for suffix, currency in TLD_CURRENCIES:
+        if host.endswith(suffix):
+            return currency
+    return None
+
+
+def _empty_to_null(strings):
+    return pc.if_else(pc.equal(strings, ""), pa.scalar(None, pa.string()), strings)
+
+
+def _to_number(amounts):
+    """ Amount strings -> float64 array (NaN if none), handling 1,299.00, 1.299,00 and 1.299. """
+    cleaned = pc.replace_substring(amounts, ",", "")
+    dot_grouping = pc.fill_null(pc.match_substring_regex(amounts, _DOT_GROUPING_RE), False)
+    if pc.any(dot_grouping).as_py():
+        cleaned = pc.replace_with_mask(cleaned, dot_grouping, pc.replace_substring(amounts.filter(dot_grouping), ".", ""))
+    decimal_comma = pc.fill_null(pc.match_substring_regex(amounts, _DECIMAL_COMMA_RE), False)
+    if pc.any(decimal_comma).as_py():
+        european = pc.replace_substring(pc.replace_substring(amounts.filter(decimal_comma), ".", ""), ",", ".")
+        cleaned = pc.replace_with_mask(cleaned, decimal_comma, european)
+    valid = pc.match_substring_regex(cleaned, r"^\d+(?:\.\d+)?$")
+    numbers = pc.cast(pc.if_else(valid, cleaned, pa.scalar(None, pa.string())), pa.float64())
+    return numbers.to_numpy(zero_copy_only=False)
+
+
+def _parse_texts(texts):
+    """ (min, max, currency) arrays for distinct price strings; RE2 over the whole array. """
+    arr = pa.array(texts, type=pa.string())
+    parts = pc.extract_regex(arr, _PRICE_RE)
+    # Unmatched optional groups come back as ""
+    low, high, pre, post = (_empty_to_null(pc.struct_field(parts, name)) for name in ("low", "high", "pre", "post"))
+    marker = pc.coalesce(pre, post)
+
+    # Stringified price objects are rare: parsed separately
+    dicts = pc.indices_nonzero(pc.fill_null(pc.starts_with(arr, "{"), False))
+    if len(dicts):
+        subset = arr.take(dicts)
+        mask = pc.fill_null(pc.starts_with(arr, "{"), False)
+        low = pc.replace_with_mask(low, mask, pc.struct_field(pc.extract_regex(subset, _DICT_AMOUNT_RE), [0]))
+        high = pc.replace_with_mask(high, mask, pa.nulls(len(dicts), pa.string()))
+        marker = pc.replace_with_mask(marker, mask, pc.struct_field(pc.extract_regex(subset, _DICT_CURRENCY_RE), [0]))
+
+    price_min = _to_number(low)
+    price_max = _to_number(high)
+    price_max = np.where(np.isnan(price_max), price_min, price_max)
+
+    # Few distinct markers: resolve each once
+    marker = pc.dictionary_encode(marker)
+    labels = pc.utf8_upper(pc.replace_substring_regex(marker.dictionary, r"[\s.]", "")).to_pylist()
+    lookup = np.array([SYMBOL_CURRENCIES.get(m, m) for m in labels] + [None], dtype=object)
+    indices = pc.fill_null(marker.indices, len(labels)).to_numpy(zero_copy_only=False)
+    found = lookup[indices]
+    # Ranges written high-to-low
+    return np.fmin(price_min, price_max), np.fmax(price_min, price_max), found
+
+
+def resolve_currency(found, default, given=None):
+    """
+    ISO currency of one price: a valid given code, else the marker found in
+    the text ("$" / "¥" take the platform's currency if it uses that symbol),
+    else the platform default.
+    """
+    if isinstance(given, str) and len(given.strip()) == 3 and given.strip().isalpha():
+        return given.strip().upper()
+    if found == "$":
+        return default if default in DOLLAR_CURRENCIES else "USD"
+    if found == "¥":
+        return default if default in YEN_CURRENCIES else "JPY"
+    return found if isinstance(found, str) and found else default
+
+
+def _factorize(values, n):
+    # (codes, uniques) with missing values as a regular code
+    if values is None:
+        return np.zeros(n, dtype=np.int64), np.array([None], dtype=object)
+    codes, uniques = pd.factorize(pd.Series(values).set_axis(range(n)), use_na_sentinel=False)
+    return codes.astype(np.int64), np.asarray(uniques, dtype=object)
+
+
+def parse_prices(prices, platforms=None, currencies=None):
+    """
+    Vectorized parse of a batch of raw prices.
+    Returns a DataFrame (same index) with PRICE_MIN, PRICE_MAX (float, NaN if
+    no amount) and a categorical "Currency" (ISO code, missing if no amount).
+    See resolve_currency for how currencies / platforms are used.
+    """
+    raw = pd.Series(prices, dtype="object")
+    n = len(raw)
+
+    # Each distinct price string is parsed once; bare numbers (Redux / JSON) parse as text
+    codes, uniques = pd.factorize(raw.to_numpy(dtype=object), use_na_sentinel=False)
+    unique_min, unique_max, unique_found = _parse_texts(pd.Series(uniques, dtype="object").astype("string[pyarrow]"))
+
+    # Currency depends on (text marker, has amount, platform, given currency): few distinct
+    # combinations, each resolved once
+    found_codes, found_uniques = _factorize(unique_found, len(unique_found))
+    priced = (~np.isnan(unique_min)).astype(np.int64)
+    platform_codes, platform_uniques = _factorize(platforms, n)
+    given_codes, given_uniques = _factorize(currencies, n)
+    key = ((found_codes * 2 + priced)[codes] * len(platform_uniques) + platform_codes) * len(given_uniques) + given_codes
+    key_codes, keys = pd.factorize(key)
+    labels = []
+    for k in keys.tolist():
+        rest, g = divmod(k, len(given_uniques))
+        rest, p = divmod(rest, len(platform_uniques))
+        f, has_amount = divmod(rest, 2)
+        # Only amounts get a currency
+        labels.append(
+            resolve_currency(found_uniques[f], domain_currency(platform_uniques[p]), given_uniques[g])
+            if has_amount else None
+        )
+    label_codes, categories = pd.factorize(pd.Series(labels, dtype="object"))
+
+    return pd.DataFrame({
+        PRICE_MIN: unique_min[codes],
+        PRICE_MAX: unique_max[codes],
+        "Currency": pd.Categorical.from_codes(label_codes[key_codes], categories=categories)
+    }, index=raw.index)
+
+
+def normalize_prices(df, categorical=True):
+    """
+    Copy of a product frame with numeric PRICE_MIN / PRICE_MAX columns (after
+    "Price") and "Currency" filled with ISO codes.
+    """
+    if df.empty or "Price" not in df.columns:
+        return df
+    parsed = parse_prices(df["Price"], df.get("Platform"), df.get("Currency"))
+    df = df.copy()
+    df["Currency"] = parsed["Currency"] if categorical else parsed["Currency"].astype(object)
+    at = df.columns.get_loc("Price") + 1
+    df.insert(at, PRICE_MIN, parsed[PRICE_MIN])
+    df.insert(at + 1, PRICE_MAX, parsed[PRICE_MAX])
+    return df
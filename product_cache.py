@@ -0,0 +1,107 @@
+"""
+Persistent cache for Deep Scan results (seller / availability per product page).
+
+Entries are keyed by marketplace + canonical product ID (see
+app.canonical_product_key). Seller and availability carry their own
+timestamps so they can expire independently: sellers change rarely,
+stock status changes often.
+"""
+import sqlite3
+import time
+
+CACHE_FILE = "product_cache.db"
+
+# Default freshness windows (seconds)
+SELLER_TTL = 7 * 24 * 3600
+AVAILABILITY_TTL = 6 * 3600
+
+
+class ProductDetailsCache:
+    """ SQLite store of fetch_product_details results. Safe to share across threads. """
+
+    def __init__(self, path=CACHE_FILE, seller_ttl=SELLER_TTL, availability_ttl=AVAILABILITY_TTL):
+        self.path = path
+        self.seller_ttl = seller_ttl
+        self.availability_ttl = availability_ttl
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS product_details (
+                    marketplace TEXT NOT NULL,
+                    product_id TEXT NOT NULL,
+                    seller TEXT,
+                    seller_checked_at REAL,
+                    availability TEXT,
+                    availability_checked_at REAL,
+                    PRIMARY KEY (marketplace, product_id)
+                )
+            """)
+
+    def _connect(self):
+        # One short-lived connection per call keeps the cache usable from worker threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def get(self, marketplace, product_id, now=None):
+        """
+        Returns (seller, availability). Each value is None when missing or expired.
+        """
+        now = now or time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT seller, seller_checked_at, availability, availability_checked_at "
+                "FROM product_details WHERE marketplace = ? AND product_id = ?",
+                (marketplace, product_id)
+            ).fetchone()
+        if not row:
+            return None, None
+
+        seller, seller_at, availability, availability_at = row
+        if seller_at is None or now - seller_at > self.seller_ttl:
+            seller = None
+        if availability_at is None or now - availability_at > self.availability_ttl:
+            availability = None
+        return seller, availability
+
+    def is_known(self, marketplace, product_id):
+        """ True if this listing has been resolved in any earlier scan (fresh or not). """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT 1 FROM product_details WHERE marketplace = ? AND product_id = ?",
+                (marketplace, product_id)
+            ).fetchone()
+        return row is not None
+
+    def put(self, marketplace, product_id, seller=None, availability=None, now=None):
+        """
+        Stores resolved values. Unresolved ones ("N/A" / "Unknown" / None) leave the
+        existing entry untouched so a failed fetch never overwrites good data.
+        """
+        now = now or time.time()
+        if seller in (None, "N/A"):
+            seller = None
+        if availability in (None, "Unknown"):
+            availability = None
+        if seller is None and availability is None:
+            return
+
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR IGNORE INTO product_details (marketplace, product_id) VALUES (?, ?)",
+                (marketplace, product_id)
+            )
+            if seller is not None:
+                conn.execute(
+                    "UPDATE product_details SET seller = ?, seller_checked_at = ? "
+                    "WHERE marketplace = ? AND product_id = ?",
+                    (seller, now, marketplace, product_id)
+                )
+            if availability is not None:
+                conn.execute(
+                    "UPDATE product_details SET availability = ?, availability_checked_at = ? "
+                    "WHERE marketplace = ? AND product_id = ?",
+                    (availability, now, marketplace, product_id)
+                )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM product_details")
@@ -0,0 +1,185 @@
+"""
+Compact product records.
+
+ProductRecord stores the nine report columns in __slots__ instead of a
+per-row dict, and interns the low-cardinality strings (platform, seller,
+currency, availability, condition, detection method) so every row of a
+marketplace shares one string object. It still behaves like the old dict
+(row["Seller"], row.get(...), dict(row), keys/items), so extractors and
+the dashboard use it unchanged. records_to_frame / records_to_arrow build
+column arrays straight from the slots, with categorical columns for the
+interned fields.
+"""
+import sys
+from collections.abc import Mapping, MutableMapping
+
+import pandas as pd
+
+# Report column -> slot name, in report order
+PRODUCT_FIELDS = (
+    ("Platform", "platform"),
+    ("Product Name", "name"),
+    ("Price", "price"),
+    ("Currency", "currency"),
+    ("Seller", "seller"),
+    ("Availability", "availability"),
+    ("Condition", "condition"),
+    ("Product URL", "url"),
+    ("Detection Method", "method")
+)
+PRODUCT_COLUMNS = tuple(label for label, _ in PRODUCT_FIELDS)
+_SLOTS = dict(PRODUCT_FIELDS)
+
+# Few distinct values per scan: interned in records, categorical in frames
+CATEGORICAL_COLUMNS = ("Platform", "Currency", "Seller", "Availability", "Condition", "Detection Method")
+_INTERNED_SLOTS = frozenset(_SLOTS[c] for c in CATEGORICAL_COLUMNS)
+
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class ProductRecord(MutableMapping):
+    """
+    One product row. Mapping interface over the report columns; any other
+    key (e.g. "Brand" added by the batch CLI) goes to a small overflow dict.
+    """
+    __slots__ = tuple(slot for _, slot in PRODUCT_FIELDS) + ("_extra",)
+
+    def __init__(self, platform="", name="Unknown Product", price="N/A", currency="", seller="N/A",
+                 availability="Unknown", condition="", url="N/A", method="Generic"):
+        self.platform = _intern(platform)
+        self.name = name
+        self.price = price
+        self.currency = _intern(currency)
+        self.seller = _intern(seller)
+        self.availability = _intern(availability)
+        self.condition = _intern(condition)
+        self.url = url
+        self.method = _intern(method)
+        self._extra = None
+
+    @classmethod
+    def from_mapping(cls, data):
+        """ Record from a product dict (e.g. rows read back from JSON). """
+        if isinstance(data, ProductRecord):
+            return data.copy()
+        record = cls(*(data.get(label) for label in PRODUCT_COLUMNS))
+        for key, value in data.items():
+            if key not in _SLOTS:
+                record[key] = value
+        return record
+
+    def __getitem__(self, key):
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            return getattr(self, slot)
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        slot = _SLOTS.get(key)
+        if slot is not None:
+            setattr(self, slot, _intern(value) if slot in _INTERNED_SLOTS else value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in _SLOTS:
+            raise KeyError(f"{key} is a fixed product column")
+        if not self._extra or key not in self._extra:
+            raise KeyError(key)
+        del self._extra[key]
+
+    def __iter__(self):
+        yield from PRODUCT_COLUMNS
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return len(PRODUCT_COLUMNS) + (len(self._extra) if self._extra else 0)
+
+    def __contains__(self, key):
+        return key in _SLOTS or bool(self._extra and key in self._extra)
+
+    def __eq__(self, other):
+        if isinstance(other, Mapping):
+            return dict(self.items()) == dict(other.items())
+        return NotImplemented
+
+    def __repr__(self):
+        return f"ProductRecord({dict(self.items())!r})"
+
+    def values_tuple(self):
+        """ The report columns as a tuple (PRODUCT_COLUMNS order). """
+        return (self.platform, self.name, self.price, self.currency, self.seller,
+                self.availability, self.condition, self.url, self.method)
+
+    def copy(self):
+        record = ProductRecord(*self.values_tuple())
+        if self._extra:
+            record._extra = dict(self._extra)
+        return record
+
+
+def json_default(obj):
+    """ json.dumps(default=...) hook: records serialise as plain objects. """
+    if isinstance(obj, Mapping):
+        return dict(obj.items())
+    return str(obj)
+
+
+def _columns(records):
+    columns = list(PRODUCT_COLUMNS)
+    seen = set(columns)
+    for r in records:
+        extra = r._extra if isinstance(r, ProductRecord) else r
+        if extra:
+            for key in extra:
+                if key not in seen:
+                    seen.add(key)
+                    columns.append(key)
+    return columns
+
+
+def records_to_columns(records):
+    """ {column: [values]} straight from the record slots. """
+    data = {}
+    for label in _columns(records):
+        slot = _SLOTS.get(label)
+        if slot and all(type(r) is ProductRecord for r in records):
+            data[label] = [getattr(r, slot) for r in records]
+        else:
+            data[label] = [r.get(label) for r in records]
+    return data
+
+
+def records_to_frame(records, categorical=True):
+    """ DataFrame of product rows (records or dicts), low-cardinality columns as categoricals. """
+    if not records:
+        return pd.DataFrame(columns=list(PRODUCT_COLUMNS))
+    data = records_to_columns(records)
+    if categorical:
+        for col in CATEGORICAL_COLUMNS:
+            values = data.get(col)
+            if values is not None and all(v is None or type(v) is str for v in values):
+                data[col] = pd.Categorical(values)
+    return pd.DataFrame(data)
+
+
+def records_to_arrow(records):
+    """ pyarrow Table of product rows, dictionary-encoding the categorical columns (requires pyarrow). """
+    import pyarrow as pa
+
+    data = records_to_columns(records)
+    arrays = {}
+    for col, values in data.items():
+        if col in CATEGORICAL_COLUMNS and all(v is None or type(v) is str for v in values):
+            arrays[col] = pa.array(values, type=pa.string()).dictionary_encode()
+        else:
+            # Raw prices mix numbers and text
+            arrays[col] = pa.array([None if v is None else str(v) for v in values], type=pa.string())
+    return pa.table(arrays)
@@ -0,0 +1,169 @@
+"""
+Shared search-scan results with single-flight coalescing.
+
+Every session's scan runs in a job worker process, so coalescing has to work
+across processes: the first caller for a key takes ownership (a 'pending'
+row with a lease) and runs the scan; concurrent callers for the same key
+wait for that row to turn 'done' and get the same result. Finished results
+are served to everyone until they expire.
+
+The owner's lease is renewed in the background for as long as it holds the
+key, however long the (deep) scan takes; only a lease whose owner died
+runs out and is taken over.
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from records import json_default
+
+SCAN_CACHE_FILE = "scan_cache.db"
+
+SCAN_RESULT_TTL = 15 * 60
+# Blocked / failed scans are shared with concurrent callers but retried soon after
+FAILED_RESULT_TTL = 60
+# A pending scan whose owner went away is taken over after this long;
+# live owners renew their lease every SCAN_LEASE_RENEW_SECONDS
+SCAN_LEASE_SECONDS = 2 * 60
+SCAN_LEASE_RENEW_SECONDS = 30
+SINGLE_FLIGHT_POLL = 0.2
+
+FAILED_STATUSES = ("Blocked", "Blocked/Error", "Error")
+
+
+class ScanResultCache:
+    """ SQLite-backed result cache + in-flight registry. Safe to share across threads and processes. """
+
+    def __init__(self, path=SCAN_CACHE_FILE):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS scan_results (
+                    cache_key TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    owner TEXT,
+                    lease_until REAL,
+                    result TEXT,
+                    finished_at REAL,
+                    expires_at REAL
+                )
+            """)
+        self._held = set()
+        self._held_lock = threading.Lock()
+        self._renewer = None
+        self.purge_expired()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def acquire(self, key, force=False, timeout=None):
+        """
+        Returns the shared result for key, waiting for an in-flight scan if there is one
+        (as long as its owner keeps the lease alive, or up to timeout seconds).
+        Returns None when the caller now owns the key and must run the scan,
+        then call release(key, result).
+        force=True skips fresh results (but still joins a scan already in flight).
+        """
+        owner = f"{os.getpid()}:{threading.get_ident()}"
+        deadline = time.time() + timeout if timeout is not None else float("inf")
+        while True:
+            conn = self._connect()
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                now = time.time()
+                row = conn.execute(
+                    "SELECT status, lease_until, result, finished_at, expires_at FROM scan_results WHERE cache_key = ?",
+                    (key,)
+                ).fetchone()
+                if row and row[0] == "done" and row[4] > now and not force:
+                    conn.execute("COMMIT")
+                    result = json.loads(row[2])
+                    result["shared_at"] = row[3]
+                    return result
+                if row and row[0] == "pending" and row[1] > now and time.time() < deadline:
+                    # Someone else is scanning this right now: wait for it
+                    conn.execute("COMMIT")
+                    force = False # Their result is as fresh as ours would be
+                    time.sleep(SINGLE_FLIGHT_POLL)
+                    continue
+                conn.execute(
+                    "INSERT OR REPLACE INTO scan_results (cache_key, status, owner, lease_until) VALUES (?, 'pending', ?, ?)",
+                    (key, owner, now + SCAN_LEASE_SECONDS)
+                )
+                conn.execute("COMMIT")
+                self._hold(key)
+                return None
+            except Exception:
+                # Only if BEGIN got through; otherwise the original error is what matters
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+    # --- Lease renewal ---
+
+    def _hold(self, key):
+        with self._held_lock:
+            self._held.add(key)
+            if self._renewer is None:
+                self._renewer = threading.Thread(target=self._renew_leases, name="scan-lease-renewer", daemon=True)
+                self._renewer.start()
+
+    def _renew_leases(self):
+        """ Extends the lease of every key this process holds, until the process exits. """
+        while True:
+            time.sleep(SCAN_LEASE_RENEW_SECONDS)
+            with self._held_lock:
+                keys = list(self._held)
+            if keys:
+                try:
+                    self.renew(keys)
+                except Exception as e:
+                    print(f"Scan lease renewal failed: {e}")
+
+    def renew(self, keys):
+        """ Pushes back the lease of pending keys (owned by the caller). """
+        until = time.time() + SCAN_LEASE_SECONDS
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE scan_results SET lease_until = ? WHERE cache_key = ? AND status = 'pending'",
+                [(until, key) for key in keys]
+            )
+
+    def release(self, key, result=None, ttl=SCAN_RESULT_TTL):
+        """
+        Publishes the owner's result (shared for ttl seconds); waiters pick it up on their next poll.
+        result=None gives up ownership without storing anything (e.g. the scan crashed).
+        """
+        with self._held_lock:
+            self._held.discard(key)
+        now = time.time()
+        with self._connect() as conn:
+            if result is None:
+                conn.execute("DELETE FROM scan_results WHERE cache_key = ? AND status = 'pending'", (key,))
+                return
+            if result.get("status") in FAILED_STATUSES:
+                ttl = min(ttl, FAILED_RESULT_TTL)
+            conn.execute(
+                "INSERT OR REPLACE INTO scan_results (cache_key, status, owner, lease_until, result, finished_at, expires_at) "
+                "VALUES (?, 'done', NULL, NULL, ?, ?, ?)",
+                (key, json.dumps(result, default=json_default), now, now + ttl)
+            )
+        # Expired and failed results would otherwise only go when their key is scanned again
+        self.purge_expired()
+
+    def purge_expired(self):
+        """ Drops expired results (incl. short-lived failed ones) and abandoned pending rows. """
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM scan_results WHERE (status = 'done' AND expires_at < ?) OR (status = 'pending' AND lease_until < ?)",
+                (time.time(), time.time())
+            )
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM scan_results")
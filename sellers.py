@@ -0,0 +1,359 @@
+"""
+Seller registry: resolves the many spellings of a seller to one canonical seller ID.
+
+Extracted seller names carry title-casing artifacts, repetitions ("Cocoblu
+Retail Cocoblu Retail"), store / legal suffixes and "Visit the X Store"
+wrappers, and every platform spells the same seller differently. Raw names
+go through seller_key() (case, accents, punctuation, wrappers, suffixes and
+repetitions removed) and are looked up in a token trie of known aliases.
+Only an exact alias resolves to a seller: names that merely start with a
+known seller ("Cloudtail India" vs "Cloudtail") are distinct resellers and
+get their own entry. Longest-prefix matches are only shown as a hint
+(`python sellers.py resolve`); add_alias / merge fold spellings together.
+
+The registry is a JSON file like domain_config.json, updated incrementally
+after every scan (new sellers and spellings are added, listings counted).
+Job workers, batch runs and the dashboard update it concurrently: every
+read-modify-write holds a lock file next to it (POSIX).
+
+    registry = SellerRegistry()
+    registry.resolve("Visit the COCOBLU RETAIL Store")   # "cocoblu-retail"
+    df = registry.apply_to_frame(df)                     # adds "Seller ID" / "Canonical Seller"
+
+    python sellers.py list --top 20
+    python sellers.py merge --into cocoblu-retail --from cocoblu
+"""
+import argparse
+import contextlib
+import json
+import os
+import re
+import time
+import uuid
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent writers are not serialized
+    fcntl = None
+
+import pandas as pd
+
+from brand_match import normalize_text
+
+SELLER_REGISTRY_FILE = "seller_registry.json"
+
+SELLER_ID = "Seller ID"
+CANONICAL_SELLER = "Canonical Seller"
+
+UNKNOWN_SELLERS = frozenset(("", "n/a", "na", "-", "unknown", "none"))
+
+# Wrappers around the name: "Visit the X Store", "Sold by: X", "by X", "Seller: X".
+# Labels only count with a colon: "Brand Factory" is a seller.
+_PREFIX_RE = re.compile(r"^(?:(?:visit\s+the|sold\s+by|ships\s+from|by)\b|(?:seller|merchant|brand)\s*:)[\s:\-]*")
+# Rating / feedback garbage after the name: "4.5 out of 5 stars", "99.5% positive", "(12,345)"
+_GARBAGE_RE = re.compile(r"\d+(?:[.,]\d+)*\s*(?:%|out of|stars?|ratings?|reviews?|positive|feedback).*$|\(\s*[\d,.]+\s*\)")
+# Suffixes dropped from the end of the name, repeatedly
+SUFFIX_TOKENS = frozenset((
+    "store", "stores", "shop", "official", "storefront",
+    "pvt", "private", "ltd", "limited", "llc", "llp", "inc", "corp", "co", "gmbh", "plc"
+))
+_TOKEN = re.compile(r"\w+")
+
+# A trie hit that is only a prefix of the name must cover at least this share of its tokens
+MIN_PREFIX_SHARE = 0.5
+
+
+def seller_key(raw):
+    """ Normalized seller name ("tokens joined by spaces"), or None for unknown sellers. """
+    if raw is None:
+        return None
+    text = normalize_text(raw).strip()
+    if text in UNKNOWN_SELLERS:
+        return None
+    text = _PREFIX_RE.sub("", text)
+    text = _GARBAGE_RE.sub(" ", text)
+    tokens = _TOKEN.findall(text.replace("_", " "))
+
+    # Store / legal suffixes ("... Official Store", "... Pvt Ltd"), unless nothing else is left
+    end = len(tokens)
+    while end > 1 and tokens[end - 1] in SUFFIX_TOKENS:
+        end -= 1
+    tokens = tokens[:end]
+
+    # Repetitions: "cocoblu retail cocoblu retail" -> "cocoblu retail"
+    n = len(tokens)
+    for period in range(1, n // 2 + 1):
+        if n % period == 0 and tokens == tokens[:period] * (n // period):
+            tokens = tokens[:period]
+            break
+
+    key = " ".join(tokens)
+    return key if key and key not in UNKNOWN_SELLERS else None
+
+
+def seller_slug(key):
+    """ Seller ID for a normalized key. """
+    return key.replace(" ", "-")
+
+
+class SellerTrie:
+    """ Token trie of normalized aliases -> seller ID, with longest-prefix lookup. """
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, key, seller_id):
+        tokens = key.split()
+        # Also reachable written as one word ("cocobluretail")
+        for variant in (tokens, ["".join(tokens)]):
+            node = self.root
+            for token in variant:
+                node = node.setdefault(token, {})
+            node[None] = seller_id
+
+    def lookup(self, key, exact=False):
+        """
+        Seller ID of the longest alias that prefixes key (see MIN_PREFIX_SHARE), or None.
+        exact: only an alias equal to key.
+        """
+        tokens = key.split()
+        node = self.root
+        found, depth = None, 0
+        for i, token in enumerate(tokens):
+            node = node.get(token)
+            if node is None:
+                break
+            if None in node:
+                found, depth = node[None], i + 1
+        if found is None or (depth < len(tokens) and (exact or depth < len(tokens) * MIN_PREFIX_SHARE)):
+            return None
+        return found
+
+
+class SellerRegistry:
+    """
+    Canonical sellers persisted as JSON:
+    {"sellers": {seller_id: {"name", "aliases": [keys], "platforms": {platform: listings},
+    "listings", "first_seen", "last_seen"}}}
+    """
+
+    def __init__(self, path=SELLER_REGISTRY_FILE):
+        self.path = path
+        self.sellers = {}
+        self._mtime = None
+        self._trie = SellerTrie()
+        self.reload()
+
+    # --- Persistence ---
+
+    def reload(self, force=False):
+        """ Re-reads the file if another process changed it (force: in any case). """
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime and not force:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.sellers = json.load(f).get("sellers", {})
+        except Exception as e:
+            print(f"Seller registry unreadable ({self.path}): {e}")
+            return
+        self._mtime = mtime
+        self._rebuild()
+
+    def save(self):
+        # Written to a temp file (one per writer) and renamed, so readers never see a partial file
+        tmp = f"{self.path}.{os.getpid()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"sellers": self.sellers}, f, ensure_ascii=False, indent=1)
+        os.replace(tmp, self.path)
+        self._mtime = os.path.getmtime(self.path)
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Read-modify-write under the registry lock: re-reads the file, yields, saves.
+        Other processes' changes made in between are never overwritten.
+        """
+        with open(f"{self.path}.lock", "a") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.reload(force=True)
+                yield self
+                self.save()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _rebuild(self):
+        self._trie = SellerTrie()
+        for seller_id, seller in self.sellers.items():
+            for key in seller["aliases"]:
+                self._trie.add(key, seller_id)
+
+    # --- Lookups ---
+
+    def resolve(self, raw):
+        """ Canonical seller ID of a raw seller name: its exact alias, else its own slug (None for unknown sellers). """
+        key = seller_key(raw)
+        if key is None:
+            return None
+        return self._trie.lookup(key, exact=True) or seller_slug(key)
+
+    def closest(self, raw):
+        """ Known seller whose alias is the longest prefix of the name (display hint only, never stored). """
+        key = seller_key(raw)
+        return self._trie.lookup(key) if key else None
+
+    def name(self, seller_id):
+        """ Display name of a seller ID (unregistered IDs are title-cased). """
+        if seller_id is None:
+            return None
+        seller = self.sellers.get(seller_id)
+        return seller["name"] if seller else seller_id.replace("-", " ").title()
+
+    def resolve_many(self, raw_values):
+        """ (seller IDs, canonical names) lists for a batch; each distinct raw value is resolved once. """
+        codes, uniques = pd.factorize(pd.Series(list(raw_values), dtype="object"), use_na_sentinel=False)
+        ids = [None if u is None or u != u else self.resolve(u) for u in uniques]
+        names = [self.name(i) for i in ids]
+        return [ids[c] for c in codes], [names[c] for c in codes]
+
+    def apply_to_frame(self, df):
+        """ Copy of a product frame with SELLER_ID and CANONICAL_SELLER (categorical) after "Seller". """
+        if df.empty or "Seller" not in df.columns:
+            return df
+        ids, names = self.resolve_many(df["Seller"].astype(object))
+        df = df.copy()
+        at = df.columns.get_loc("Seller") + 1
+        df.insert(at, SELLER_ID, pd.Categorical(ids))
+        df.insert(at + 1, CANONICAL_SELLER, pd.Categorical(names))
+        return df
+
+    # --- Updates ---
+
+    def observe(self, raw, platform=None, listings=1, now=None):
+        """
+        Records a sighting of a raw seller name: new sellers are registered, listings are
+        counted for the seller it resolves to (see resolve). Returns the seller ID (None if unknown).
+        Call save() afterwards.
+        """
+        key = seller_key(raw)
+        if key is None:
+            return None
+        now = now or time.time()
+        seller_id = self.resolve(raw)
+        seller = self.sellers.get(seller_id)
+        if seller is None:
+            seller = self.sellers[seller_id] = {
+                "name": " ".join(key.split()).title(), "aliases": [], "platforms": {},
+                "listings": 0, "first_seen": now, "last_seen": now
+            }
+        if key not in seller["aliases"]:
+            seller["aliases"].append(key)
+            self._trie.add(key, seller_id)
+        seller["listings"] += listings
+        seller["last_seen"] = now
+        if platform:
+            seller["platforms"][platform] = seller["platforms"].get(platform, 0) + listings
+        return seller_id
+
+    def update_from_products(self, products):
+        """ Registers the sellers of a scan's product rows and saves. Returns the number of new sellers. """
+        counts = {}
+        for p in products:
+            if p["Detection Method"] != "Summary Only":
+                pair = (p["Seller"], p["Platform"])
+                counts[pair] = counts.get(pair, 0) + 1
+        if not counts:
+            return 0
+        with self.transaction():
+            before = len(self.sellers)
+            now = time.time()
+            for (raw, platform), listings in counts.items():
+                self.observe(raw, platform, listings, now)
+        return len(self.sellers) - before
+
+    def tag_products(self, products):
+        """ Sets SELLER_ID on every product row (in place). """
+        ids, _ = self.resolve_many([p["Seller"] for p in products])
+        for p, seller_id in zip(products, ids):
+            p[SELLER_ID] = seller_id
+        return products
+
+    def add_alias(self, seller_id, raw):
+        """ Maps another spelling to an existing seller. """
+        key = seller_key(raw)
+        if key is None or seller_id not in self.sellers:
+            return False
+        for other in self.sellers.values():
+            if key in other["aliases"]:
+                other["aliases"].remove(key)
+        self.sellers[seller_id]["aliases"].append(key)
+        self._rebuild()
+        return True
+
+    def merge(self, into, other):
+        """ Folds seller `other` (aliases, counts) into seller `into`. """
+        if into == other or into not in self.sellers or other not in self.sellers:
+            return False
+        source, target = self.sellers.pop(other), self.sellers[into]
+        target["aliases"] += [a for a in source["aliases"] if a not in target["aliases"]]
+        target["listings"] += source["listings"]
+        for platform, n in source["platforms"].items():
+            target["platforms"][platform] = target["platforms"].get(platform, 0) + n
+        target["first_seen"] = min(target["first_seen"], source["first_seen"])
+        target["last_seen"] = max(target["last_seen"], source["last_seen"])
+        self._rebuild()
+        return True
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Brand Guardian Pro seller registry")
+    parser.add_argument("--path", default=SELLER_REGISTRY_FILE, help="Registry file")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    list_cmd = sub.add_parser("list", help="Print sellers by listing count")
+    list_cmd.add_argument("--top", type=int, default=50)
+
+    resolve_cmd = sub.add_parser("resolve", help="Resolve a raw seller name")
+    resolve_cmd.add_argument("name")
+
+    alias_cmd = sub.add_parser("alias", help="Map a spelling to a seller")
+    alias_cmd.add_argument("--seller", required=True, help="Seller ID")
+    alias_cmd.add_argument("--name", required=True, help="Raw seller name")
+
+    merge_cmd = sub.add_parser("merge", help="Merge one seller into another")
+    merge_cmd.add_argument("--into", required=True, help="Seller ID to keep")
+    merge_cmd.add_argument("--from", dest="other", required=True, help="Seller ID to fold in")
+
+    rename_cmd = sub.add_parser("rename", help="Set a seller's display name")
+    rename_cmd.add_argument("--seller", required=True, help="Seller ID")
+    rename_cmd.add_argument("--name", required=True)
+    args = parser.parse_args()
+
+    registry = SellerRegistry(args.path)
+    if args.command == "list":
+        ranked = sorted(registry.sellers.items(), key=lambda item: -item[1]["listings"])
+        for seller_id, seller in ranked[:args.top]:
+            print(f"{seller['listings']:>7}  {seller_id:<40} {seller['name']}  ({len(seller['aliases'])} spellings, {len(seller['platforms'])} platforms)")
+    elif args.command == "resolve":
+        seller_id = registry.resolve(args.name)
+        print(f"{seller_id}  {registry.name(seller_id)}" + ("" if seller_id in registry.sellers else "  (not registered)"))
+        closest = registry.closest(args.name)
+        if closest and closest != seller_id:
+            print(f"Starts with known seller {closest} ({registry.name(closest)}); `alias` or `merge` if they are the same")
+    else:
+        # Edits hold the lock, so a scan saving at the same time can't undo them
+        with registry.transaction():
+            if args.command == "alias" and not registry.add_alias(args.seller, args.name):
+                raise SystemExit(f"Unknown seller {args.seller} or empty name")
+            if args.command == "merge" and not registry.merge(args.into, args.other):
+                raise SystemExit("Both sellers must exist and differ")
+            if args.command == "rename":
+                if args.seller not in registry.sellers:
+                    raise SystemExit(f"Unknown seller {args.seller}")
+                registry.sellers[args.seller]["name"] = args.name